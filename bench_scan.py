@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from file_format import HEADER_SIZE, open_store, pack_header
+from schema import PROGRAMS
+from scanner import read_chunks, scan_rows, scan_views
+
+# layout ของ books.dat ใน test2.py: ID, Title, Author, Year, Status, Deleted (record แรกอยู่หลัง header)
+BOOK_CODEC = PROGRAMS['test2'].tables['books'].schema.codec
+
+
+def write_books(filename: str, count: int):
+    """สร้าง books.dat สังเคราะห์ count record (ทุกเล่มที่ 10 ถูกลบ ทุกเล่มที่ 4 ถูกยืม)"""
+    batch = []
+    with open(filename, 'wb') as f:
+        f.write(pack_header(BOOK_CODEC))
+        for i in range(count):
+            batch.append(BOOK_CODEC.pack(
+                i + 1, f'Book {i}'.encode(), f'Author {i % 997}'.encode(),
+                str(1950 + i % 70).encode(), b'B' if i % 4 == 0 else b'A', b'1' if i % 10 == 0 else b'0'
+            ))
+            if len(batch) == 65536:
+                f.write(b''.join(batch))
+                batch.clear()
+        f.write(b''.join(batch))
+
+
+# ---------- ก่อน: อ่านทีละ record ด้วย f.read(size) แบบโค้ดเดิม ----------
+
+def per_record_rows(filename: str) -> int:
+    count = 0
+    with open(filename, 'rb') as f:
+        f.seek(HEADER_SIZE)
+        while True:
+            data = f.read(BOOK_CODEC.size)
+            if len(data) < BOOK_CODEC.size:
+                break
+            BOOK_CODEC.unpack(data)
+            count += 1
+    return count
+
+
+def per_record_available(filename: str) -> int:
+    available = 0
+    with open(filename, 'rb') as f:
+        f.seek(HEADER_SIZE)
+        while True:
+            data = f.read(BOOK_CODEC.size)
+            if len(data) < BOOK_CODEC.size:
+                break
+            book = BOOK_CODEC.unpack(data)
+            if book[5] == b'0' and book[4] == b'A':
+                available += 1
+    return available
+
+
+# ---------- หลัง: อ่านเป็นก้อน ----------
+
+def chunked_rows(filename: str) -> int:
+    count = 0
+    with open(filename, 'rb') as f:
+        for chunk in read_chunks(f, BOOK_CODEC.size, HEADER_SIZE):
+            for _ in BOOK_CODEC.iter_unpack(chunk):
+                count += 1
+    return count
+
+
+def chunked_available(filename: str) -> int:
+    with open(filename, 'rb') as f:
+        return sum(1 for chunk in read_chunks(f, BOOK_CODEC.size, HEADER_SIZE)
+                   for _ in BOOK_CODEC.iter_views(chunk, status=b'A', deleted=b'0'))
+
+
+def store_rows(filename: str) -> int:
+    store = open_store(filename, BOOK_CODEC)
+    try:
+        return sum(1 for _ in scan_rows(store, BOOK_CODEC))
+    finally:
+        store.close()
+
+
+def store_available(filename: str) -> int:
+    store = open_store(filename, BOOK_CODEC)
+    try:
+        return sum(1 for _ in scan_views(store, BOOK_CODEC, status=b'A', deleted=b'0'))
+    finally:
+        store.close()
+
+
+CASES: List[Tuple[str, str, Callable[[str], int]]] = [
+    ('แปลงทุก record', 'ก่อน: f.read ทีละ record', per_record_rows),
+    ('แปลงทุก record', 'read_chunks (readinto)', chunked_rows),
+    ('แปลงทุก record', 'RecordStore.chunks (mmap)', store_rows),
+    ('นับเล่มที่ว่าง', 'ก่อน: f.read ทีละ record', per_record_available),
+    ('นับเล่มที่ว่าง', 'read_chunks (readinto)', chunked_available),
+    ('นับเล่มที่ว่าง', 'RecordStore.chunks (mmap)', store_available),
+]
+
+
+def run(filename: str, count: int, repeat: int) -> List[Tuple[str, str, float]]:
+    """วัดแต่ละวิธี (ใช้เวลาที่ดีที่สุดจาก repeat รอบ) คืนค่า (งาน, วิธี, record/วินาที)"""
+    results = []
+    for task, method, scan in CASES:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            scan(filename)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append((task, method, count / best))
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="เปรียบเทียบความเร็วการ scan ไฟล์ .dat (record/วินาที)")
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'books.dat')
+        write_books(filename, args.records)
+        print(f"books.dat สังเคราะห์ {args.records:,} record ({os.path.getsize(filename) / 2**20:.1f} MiB)")
+
+        results = run(filename, args.records, args.repeat)
+        baseline = {}
+        for task, method, rate in results:
+            baseline.setdefault(task, rate)
+            print(f"{task:<16} {method:<28} {rate:>14,.0f} record/s  x{rate / baseline[task]:.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
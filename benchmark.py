@@ -0,0 +1,419 @@
+import argparse
+import builtins
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from file_format import pack_header
+from record_codec import RecordCodec
+from schema import PROGRAMS
+
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+FORMATS = ('test2', 'test3', 'report')
+RESULTS_FILE = 'benchmark_results.jsonl'
+REGRESSION = 1.2   # ช้าลงเกินกี่เท่าจึงถือว่าถอยหลัง (เทียบ p50)
+
+WORDS = (
+    'python', 'data', 'system', 'design', 'network', 'history', 'music', 'garden', 'river', 'ocean',
+    'mountain', 'science', 'physics', 'biology', 'art', 'poetry', 'travel', 'cooking', 'finance', 'law',
+    'medicine', 'language', 'culture', 'economy', 'energy', 'future', 'ancient', 'modern', 'city', 'forest',
+    'machine', 'learning', 'theory', 'practice', 'guide', 'story', 'world', 'night', 'light', 'shadow',
+)
+CATEGORIES = ('Programming', 'Computer Science', 'Fiction', 'Reference', 'History', 'Science', 'Art', 'Travel')
+BASE_DATE = datetime.date(2025, 1, 1)
+
+
+class Layout(NamedTuple):
+    """layout ของไฟล์ข้อมูลแต่ละโปรแกรม (สร้างจาก schema.py ตรวจกับ codec ในโปรแกรมตอนเปิดด้วย _check_layout)"""
+    capacity: int                    # ID มากที่สุดที่เก็บได้
+    digits: int                      # จำนวนหลักที่โปรแกรมแสดง ID (เติม 0 ข้างหน้า)
+    book: RecordCodec
+    member: Optional[RecordCodec]
+    borrow: Optional[RecordCodec]
+
+
+def _layout(name: str) -> Layout:
+    """layout ของโปรแกรม name จาก schema.py"""
+    program = PROGRAMS[name]
+    codec = lambda table: program.tables[table].schema.codec if table in program.tables else None
+    return Layout(program.max_id, program.id_digits, codec('books'), codec('members'), codec('borrows'))
+
+
+LAYOUTS: Dict[str, Layout] = {name: _layout(name) for name in FORMATS}
+
+
+# ==================== สร้างข้อมูลสังเคราะห์ ====================
+
+class SyntheticLibrary:
+    """ข้อมูลห้องสมุดสังเคราะห์ที่สร้างซ้ำได้ (format, rows และ seed เดียวกัน = ไฟล์เดียวกันทุก byte)
+
+    หนังสือ rows เล่ม (ID 1..rows) สมาชิก rows // 10 คน
+    หนังสือเล่มที่ i % 8 == 0 ถูกยืมอยู่ และเล่มที่ i % 8 == 4 เคยถูกยืมแล้วคืน
+    (สมาชิกแต่ละคนยืมอยู่ไม่เกิน 2 เล่ม จึงยังยืมเพิ่มได้) เล่มที่ i % 50 == 49 ถูกลบ
+    rows ถูกจำกัดไม่ให้เกินจำนวน ID ที่ layout เก็บได้ (เหลือที่ไว้ให้ add_book อีก headroom ID)
+    """
+
+    def __init__(self, fmt: str, rows: int, seed: int = 0, headroom: int = 0):
+        self.format = fmt
+        self.layout = LAYOUTS[fmt]
+        self.requested_rows = rows
+        self.rows = max(1, min(rows, self.layout.capacity - headroom))
+        self.members = max(1, self.rows // 10)
+        self.seed = seed
+
+    # ---------- กฎของข้อมูล (ใช้ทั้งตอนสร้างและตอนเลือก argument ของ benchmark) ----------
+
+    @staticmethod
+    def is_borrowed(i: int) -> bool:
+        return i % 8 == 0
+
+    @staticmethod
+    def is_deleted(i: int) -> bool:
+        return i % 50 == 49   # ไม่ชนกับเล่มที่ถูกยืม (49 + 50k เป็นเลขคี่เสมอ)
+
+    def borrower(self, i: int) -> int:
+        return (i // 8) % self.members
+
+    def available_books(self) -> Iterator[int]:
+        """index ของหนังสือที่ว่างและยังไม่ถูกลบ"""
+        return (i for i in range(self.rows) if not self.is_borrowed(i) and not self.is_deleted(i))
+
+    def format_id(self, number: int) -> str:
+        """ID ตามที่โปรแกรมแสดงและรับจากผู้ใช้ (เลขเติม 0 ให้ครบ digits หลัก)"""
+        return str(number).zfill(self.layout.digits)
+
+    # ---------- เขียนไฟล์ ----------
+
+    def write(self, directory: str):
+        rng = random.Random(self.seed)
+        layout = self.layout
+        if self.format == 'report':
+            self._write(os.path.join(directory, 'books.dat'), layout.book, self._report_books(rng))
+            return
+        self._write(os.path.join(directory, 'books.dat'), layout.book, self._books(rng))
+        self._write(os.path.join(directory, 'members.dat'), layout.member, self._members(rng))
+        self._write(os.path.join(directory, 'borrows.dat'), layout.borrow, self._borrows())
+
+    @staticmethod
+    def _write(filename: str, codec: RecordCodec, records: Iterator[bytes], batch_size: int = 65536):
+        batch = []
+        with open(filename, 'wb') as f:
+            f.write(pack_header(codec))
+            for record in records:
+                batch.append(record)
+                if len(batch) == batch_size:
+                    f.write(b''.join(batch))
+                    batch.clear()
+            f.write(b''.join(batch))
+
+    def _title(self, rng: random.Random, i: int) -> bytes:
+        return f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}".encode()
+
+    def _author(self, rng: random.Random) -> bytes:
+        return f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}".encode()
+
+    def _books(self, rng: random.Random) -> Iterator[bytes]:
+        codec = self.layout.book
+        for i in range(self.rows):
+            yield codec.pack(
+                i + 1, self._title(rng, i), self._author(rng), str(1950 + rng.randrange(75)).encode(),
+                b'B' if self.is_borrowed(i) else b'A', b'1' if self.is_deleted(i) else b'0'
+            )
+
+    def _members(self, rng: random.Random) -> Iterator[bytes]:
+        codec = self.layout.member
+        for k in range(self.members):
+            name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}".encode()
+            phone = f"08{rng.randrange(10 ** 8):08d}".encode()
+            join_date = str(BASE_DATE - datetime.timedelta(days=k % 365)).encode()
+            if 'student_id' in codec.fields:
+                yield codec.pack(k + 1, name, str(6_000_000_000 + k).encode(), phone,
+                                 join_date, b'A', b'0')
+            else:
+                yield codec.pack(k + 1, name, phone, join_date, b'A', b'0')
+
+    def _borrows(self) -> Iterator[bytes]:
+        codec = self.layout.borrow
+        number = 0
+        for i in range(0, self.rows, 4):
+            if not (self.is_borrowed(i) or i % 8 == 4):
+                continue
+            number += 1
+            borrow_date = BASE_DATE - datetime.timedelta(days=i % 20)
+            if self.is_borrowed(i):
+                member, return_date, status = self.borrower(i), b'', b'B'
+            else:
+                member = (self.borrower(i) + 1) % self.members
+                return_date, status = str(borrow_date + datetime.timedelta(days=i % 10)).encode(), b'R'
+            yield codec.pack(number, i + 1, member + 1,
+                             str(borrow_date).encode(), return_date, status, b'0')
+
+    def _report_books(self, rng: random.Random) -> Iterator[bytes]:
+        codec = self.layout.book
+        for i in range(self.rows):
+            deleted = self.is_deleted(i)
+            yield codec.pack(
+                i + 1, f"978{i:010d}".encode(), self._title(rng, i), self._author(rng),
+                str(1950 + rng.randrange(75)).encode(), rng.choice(CATEGORIES).encode(),
+                b'0' if deleted else b'1', b'1' if self.is_borrowed(i) else b'0', b'1' if deleted else b'0'
+            )
+
+
+# ==================== วัดเวลา ====================
+
+class Measurement(NamedTuple):
+    operation: str
+    samples: List[float]   # วินาทีต่อครั้ง
+
+    def summary(self) -> Dict:
+        ordered = sorted(self.samples)
+        total = sum(ordered)
+        return {
+            'operation': self.operation,
+            'count': len(ordered),
+            'total_s': round(total, 6),
+            'mean_ms': round(total / len(ordered) * 1000, 4),
+            'p50_ms': round(ordered[len(ordered) // 2] * 1000, 4),
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+            'max_ms': round(ordered[-1] * 1000, 4),
+            'ops_per_s': round(len(ordered) / total, 2) if total else None,
+        }
+
+
+@contextlib.contextmanager
+def _working_directory(directory: str):
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@contextlib.contextmanager
+def _quiet():
+    """ทิ้ง output ของโปรแกรม (การ print ยังถูกนับเวลา แต่ไม่ต้องแสดงบนจอ)"""
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _drive(method: Callable[[], None], answers: Sequence[str]):
+    """เรียกเมนูของโปรแกรมโดยตอบ input() ตาม answers"""
+    replies = iter(answers)
+    original = builtins.input
+    builtins.input = lambda prompt='': next(replies)
+    try:
+        method()
+    finally:
+        builtins.input = original
+
+
+def _measure(operation: str, calls: Sequence[Callable[[], object]]) -> Measurement:
+    samples = []
+    with _quiet():
+        for call in calls:
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+    return Measurement(operation, samples)
+
+
+def _check_layout(data: SyntheticLibrary, codecs: Sequence[Optional[RecordCodec]]):
+    """ตรวจว่าไฟล์ที่สร้างตรงกับ layout ที่โปรแกรมใช้อยู่จริง"""
+    expected = (data.layout.book, data.layout.member, data.layout.borrow)
+    for mine, theirs in zip(expected, codecs):
+        if mine is not None and (mine.format != theirs.format or mine.fields != theirs.fields):
+            raise RuntimeError(f"layout ของ {data.format} เปลี่ยนไป ({theirs.format}) ไม่ตรงกับ schema.py")
+
+
+def _open(data: SyntheticLibrary):
+    """เปิดโปรแกรมบนไฟล์ในโฟลเดอร์ปัจจุบัน (รวมการสร้างดัชนีครั้งแรก)"""
+    if data.format == 'test2':
+        from library_service import LibraryService
+        from test2 import SimpleLibrary
+        library = SimpleLibrary(LibraryService())
+        service = library.service
+        _check_layout(data, (service.book_codec, service.member_codec, service.borrow_codec))
+    elif data.format == 'test3':
+        from test3 import SimpleLibrary
+        library = SimpleLibrary()
+        _check_layout(data, (library.book_codec, library.member_codec, library.borrow_codec))
+    else:
+        from report import LibrarySystem
+        library = LibrarySystem()
+        _check_layout(data, (library.book_codec, None, None))
+    return library
+
+
+def _close(library):
+    service = getattr(library, 'service', None)
+    if service is not None:
+        service.close()
+    elif hasattr(library, 'wal'):
+        library.wal.close()
+
+
+def run_format(data: SyntheticLibrary, ops: int, repeat: int, seed: int) -> List[Measurement]:
+    """วัดทุก operation ของโปรแกรมหนึ่ง (ต้องอยู่ในโฟลเดอร์ของข้อมูล)"""
+    rng = random.Random(seed)
+    results = []
+
+    start = time.perf_counter()
+    with _quiet():
+        library = _open(data)
+    results.append(Measurement('open', [time.perf_counter() - start]))
+
+    try:
+        if data.format == 'report':
+            results.append(_measure('generate_summary_report',
+                                    [library.generate_summary_report] * repeat))
+            return results
+
+        test2 = data.format == 'test2'
+        find_book = library.service._find_book if test2 else library._find_book
+        book_ids = [data.format_id(rng.randrange(data.rows) + 1) for _ in range(ops)]
+        results.append(_measure('_find_book', [lambda b=b: find_book(b) for b in book_ids]))
+
+        words = [rng.choice(WORDS) for _ in range(repeat)]
+        results.append(_measure('search_book', [lambda w=w: _drive(library.search_book, [w]) for w in words]))
+        results.append(_measure('list_borrows', [lambda: _drive(library.list_borrows, [])] * repeat))
+        results.append(_measure('show_stats', [lambda: _drive(library.show_stats, [])] * repeat))
+
+        # ยืมแล้วคืนเล่มเดิม ข้อมูลจึงกลับสู่สภาพเดิมก่อนวัด add_book
+        available = list(zip(range(min(ops, data.members)), data.available_books()))
+        pairs = [(data.format_id(member + 1), data.format_id(book + 1)) for member, book in available]
+        borrow_answers = [[m, b, 'y'] if test2 else [m, b] for m, b in pairs]
+        return_answers = [[b, 'y'] if test2 else [b] for _, b in pairs]
+        results.append(_measure('borrow_book',
+                                [lambda a=a: _drive(library.borrow_book, a) for a in borrow_answers]))
+        results.append(_measure('return_book',
+                                [lambda a=a: _drive(library.return_book, a) for a in return_answers]))
+
+        titles = [[f"Benchmark {rng.choice(WORDS)} {n}", "Bench Author", "2024"] for n in range(ops)]
+        results.append(_measure('add_book', [lambda a=a: _drive(library.add_book, a) for a in titles]))
+    finally:
+        _close(library)
+    return results
+
+
+# ==================== ผลลัพธ์ ====================
+
+def _commit() -> Optional[str]:
+    """commit ของโค้ดที่วัด (None ถ้าไม่ใช่ git repository)"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(filename: str) -> List[Dict]:
+    if not os.path.exists(filename):
+        return []
+    with open(filename, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(previous: List[Dict], current: List[Dict]) -> List[str]:
+    """เทียบ p50 ของรอบนี้กับรอบล่าสุดก่อนหน้าที่วัด format/rows/operation เดียวกัน"""
+    latest = {}
+    for record in previous:
+        latest[(record['format'], record['rows'], record['operation'])] = record
+    lines = []
+    for record in current:
+        before = latest.get((record['format'], record['rows'], record['operation']))
+        if not before or not before['p50_ms']:
+            continue
+        ratio = record['p50_ms'] / before['p50_ms']
+        mark = "⚠️ " if ratio > REGRESSION else "  "
+        lines.append(f"{mark}{record['format']:<7} {record['rows']:>10,} {record['operation']:<24} "
+                     f"{before['p50_ms']:>10.3f} -> {record['p50_ms']:>10.3f} ms  x{ratio:.2f}"
+                     f"  ({before.get('commit') or '?'} -> {record.get('commit') or '?'})")
+    return lines
+
+
+def _parse_size(text: str) -> int:
+    text = text.strip().lower()
+    if text in SIZES:
+        return SIZES[text]
+    return int(text.replace('_', ''))
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="วัดเวลาการทำงานของ test2.py, test3.py และ report.py บนข้อมูลสังเคราะห์")
+    parser.add_argument('--sizes', default='10k', help="จำนวนหนังสือ คั่นด้วย , เช่น 10k,1m,10m")
+    parser.add_argument('--formats', default=','.join(FORMATS), help="test2,test3,report")
+    parser.add_argument('--ops', type=int, default=100, help="จำนวนครั้งของ operation เล็ก (ค้นหา/ยืม/คืน/เพิ่ม)")
+    parser.add_argument('--repeat', type=int, default=3, help="จำนวนครั้งของ operation ที่อ่านทั้งไฟล์")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=RESULTS_FILE, help="ไฟล์ผลลัพธ์ JSONL (ต่อท้าย)")
+    parser.add_argument('--data-dir', help="โฟลเดอร์เก็บข้อมูลที่สร้าง (ค่าเริ่มต้น: โฟลเดอร์ชั่วคราว)")
+    args = parser.parse_args(argv)
+
+    formats = [name.strip() for name in args.formats.split(',') if name.strip()]
+    for name in formats:
+        if name not in FORMATS:
+            parser.error(f"ไม่รู้จัก format {name}")
+    try:
+        sizes = [_parse_size(size) for size in args.sizes.split(',')]
+    except ValueError:
+        parser.error("--sizes ต้องเป็นตัวเลขหรือ 10k, 1m, 10m")
+
+    output = os.path.abspath(args.output)
+    previous = load_results(output)
+    run = {
+        'run': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+    }
+
+    current = []
+    with contextlib.ExitStack() as stack:
+        root = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        for fmt in formats:
+            for size in sizes:
+                data = SyntheticLibrary(fmt, size, args.seed, headroom=args.ops)
+                directory = os.path.join(root, f"{fmt}-{data.rows}")
+                os.makedirs(directory, exist_ok=True)
+                for name in os.listdir(directory):
+                    os.remove(os.path.join(directory, name))
+
+                start = time.perf_counter()
+                data.write(directory)
+                note = "" if data.rows == size else f" (จำกัดตามจำนวน ID ที่เก็บได้จาก {size:,})"
+                print(f"\n{fmt}: {data.rows:,} record{note} สร้างใน {time.perf_counter() - start:.1f} วินาที")
+
+                with _working_directory(directory):
+                    measurements = run_format(data, args.ops, args.repeat, args.seed)
+                for measurement in measurements:
+                    record = dict(run, format=fmt, rows=data.rows, requested_rows=size,
+                                  **measurement.summary())
+                    current.append(record)
+                    print(f"  {record['operation']:<24} n={record['count']:<5} "
+                          f"p50 {record['p50_ms']:>10.3f} ms  p95 {record['p95_ms']:>10.3f} ms")
+
+    with open(output, 'a', encoding='utf-8') as f:
+        for record in current:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    print(f"\nบันทึกผล {len(current)} รายการที่ {output}")
+
+    lines = compare(previous, current)
+    if lines:
+        print("\nเทียบกับผลครั้งก่อน (p50):")
+        print('\n'.join(lines))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,235 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import struct
+import sys
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from record_codec import RecordCodec, RecordView
+from record_store import RecordStore
+from library_service import LibraryService
+
+FORMATS = ('csv', 'jsonl', 'columnar')
+
+
+class ExportResult(NamedTuple):
+    table: str
+    filename: str
+    rows: int
+
+
+class ColumnarWriter:
+    """ไฟล์แบบคอลัมน์อย่างง่าย (.col) สำหรับงานวิเคราะห์
+
+    Header = Magic + Version + ความยาว JSON + JSON ของชื่อตารางและคอลัมน์ (ชื่อ, ชนิด, ความกว้าง)
+    ตามด้วย row group: จำนวนแถว (uint32) แล้วข้อมูลทีละคอลัมน์ คอลัมน์ละ rows * width bytes
+    (bytes ดิบความกว้างคงที่เหมือนใน .dat จึงอ่านคอลัมน์เดียวได้โดยข้ามคอลัมน์อื่น)
+    จบไฟล์ด้วย row group ที่มี 0 แถว
+    """
+
+    MAGIC = b'COL_'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHI')    # Magic + Version + ความยาว JSON
+    GROUP = struct.Struct('<I')        # จำนวนแถวใน row group
+
+    def __init__(self, f, table: str, codec: RecordCodec, columns: Sequence[int]):
+        self.f = f
+        self.codec = codec
+        self.columns = list(columns)
+        schema = json.dumps({
+            'table': table,
+            'columns': [[codec.fields[i], codec.codes[i], codec.widths[i]] for i in self.columns],
+        }).encode('utf-8')
+        f.write(self.HEADER.pack(self.MAGIC, self.VERSION, len(schema)))
+        f.write(schema)
+
+    def write_group(self, records: List[memoryview]):
+        if not records:
+            return
+        self.f.write(self.GROUP.pack(len(records)))
+        for i in self.columns:
+            start = self.codec.offsets[i]
+            end = start + self.codec.widths[i]
+            self.f.write(b''.join(record[start:end] for record in records))
+
+    def close(self):
+        self.f.write(self.GROUP.pack(0))
+
+
+def read_columnar(filename: str) -> Iterator[Dict]:
+    """อ่านไฟล์ .col กลับเป็น dict ทีละแถว (ทีละ row group)"""
+    with open(filename, 'rb') as f:
+        magic, version, length = ColumnarWriter.HEADER.unpack(f.read(ColumnarWriter.HEADER.size))
+        if magic != ColumnarWriter.MAGIC or version != ColumnarWriter.VERSION:
+            raise ValueError(f"{filename} ไม่ใช่ไฟล์ columnar")
+        columns = json.loads(f.read(length))['columns']
+
+        while True:
+            rows, = ColumnarWriter.GROUP.unpack(f.read(ColumnarWriter.GROUP.size))
+            if rows == 0:
+                return
+            values = []
+            for name, code, width in columns:
+                data = f.read(rows * width)
+                if code in 'sc':
+                    values.append([data[i:i + width].decode('utf-8').rstrip('\x00')
+                                   for i in range(0, len(data), width)])
+                else:
+                    values.append([value for value, in struct.iter_unpack('<' + code, data)])
+            names = [name for name, _, _ in columns]
+            for row in zip(*values):
+                yield dict(zip(names, row))
+
+
+class Exporter:
+    """ส่งออกตารางเป็น CSV, JSONL หรือ columnar แบบ streaming (หน่วยความจำคงที่)
+
+    อ่าน record จาก mmap ทีละ CHUNK_RECORDS record กรองจาก byte ดิบ
+    (record ที่ถูกลบ และวันที่ยืมสำหรับ since) แล้วแปลงเฉพาะ record ที่ส่งออก
+    เขียนลงไฟล์ชั่วคราวแล้ว rename ทับ ไฟล์ปลายทางจึงไม่ครึ่งๆ กลางๆ
+    """
+
+    CHUNK_RECORDS = 65536   # จำนวน record ต่อก้อน (= จำนวนแถวต่อ row group ของ columnar)
+
+    EXTENSIONS = {'csv': '.csv', 'jsonl': '.jsonl', 'columnar': '.col'}
+
+    def __init__(self, service: LibraryService):
+        self.service = service
+        self.tables = {
+            'books': (service.books, service.book_codec),
+            'members': (service.members, service.member_codec),
+            'borrows': (service.borrows, service.borrow_codec),
+        }
+
+    def _chunks(self, store: RecordStore, codec: RecordCodec,
+                since: Optional[str]) -> Iterator[List[memoryview]]:
+        """record ที่จะส่งออก ทีละก้อน (memoryview บน mmap ไม่ copy)"""
+        deleted = codec.offsets[codec.index('deleted')]
+        date_range = None
+        if since and 'borrow_date' in codec.fields:
+            start = codec.offsets[codec.index('borrow_date')]
+            date_range = (start, start + codec.widths[codec.index('borrow_date')])
+            since_key = since.encode('ascii')
+
+        view = store.view()
+        size = codec.size
+        step = size * self.CHUNK_RECORDS
+        for chunk_start in range(0, len(view), step):
+            chunk = []
+            for offset in range(chunk_start, min(chunk_start + step, len(view) - size + 1), size):
+                record = view[offset:offset + size]
+                if record[deleted] != 0x30:  # b'0' = ยังไม่ถูกลบ
+                    continue
+                # วันที่แบบ YYYY-MM-DD เรียงตาม byte ได้เลยโดยไม่ต้องแปลง
+                if date_range and bytes(record[date_range[0]:date_range[1]]) < since_key:
+                    continue
+                chunk.append(record)
+            if chunk:
+                yield chunk
+
+    @staticmethod
+    def _values(view: RecordView, columns: Sequence[int]) -> list:
+        values = []
+        for i in columns:
+            if view.codec.codes[i] in 'sc':
+                values.append(view.text(i))
+            else:
+                values.append(view[i])
+        return values
+
+    def _write_csv(self, f, codec, columns, chunks) -> int:
+        writer = csv.writer(f)
+        writer.writerow([codec.fields[i] for i in columns])
+        rows = 0
+        for chunk in chunks:
+            rows += len(chunk)
+            writer.writerows(self._values(RecordView(codec, record), columns) for record in chunk)
+        return rows
+
+    def _write_jsonl(self, f, codec, columns, chunks) -> int:
+        names = [codec.fields[i] for i in columns]
+        rows = 0
+        for chunk in chunks:
+            rows += len(chunk)
+            f.writelines(
+                json.dumps(dict(zip(names, self._values(RecordView(codec, record), columns))),
+                           ensure_ascii=False) + '\n'
+                for record in chunk
+            )
+        return rows
+
+    def _write_columnar(self, f, table, codec, columns, chunks) -> int:
+        writer = ColumnarWriter(f, table, codec, columns)
+        rows = 0
+        for chunk in chunks:
+            rows += len(chunk)
+            writer.write_group(chunk)
+        writer.close()
+        return rows
+
+    def export_table(self, table: str, fmt: str, directory: str = '.',
+                     since: Optional[str] = None) -> ExportResult:
+        """ส่งออกตารางเดียว (books, members หรือ borrows) คืนค่าชื่อไฟล์และจำนวนแถว
+
+        since (YYYY-MM-DD) กรองรายการยืมที่ยืมตั้งแต่วันนั้น (ใช้กับ borrows เท่านั้น)
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"ไม่รองรับรูปแบบ {fmt} (ใช้ {', '.join(FORMATS)})")
+        if table not in self.tables:
+            raise ValueError(f"ไม่มีตาราง {table}")
+        if since:
+            datetime.datetime.strptime(since, "%Y-%m-%d")  # ValueError ถ้ารูปแบบวันที่ผิด
+
+        store, codec = self.tables[table]
+        columns = [i for i, name in enumerate(codec.fields) if name != 'deleted']
+        chunks = self._chunks(store, codec, since)
+
+        filename = os.path.join(directory, table + self.EXTENSIONS[fmt])
+        temp_file = filename + '.tmp'
+        if fmt == 'columnar':
+            with open(temp_file, 'wb') as f:
+                rows = self._write_columnar(f, table, codec, columns, chunks)
+        else:
+            with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+                write = self._write_csv if fmt == 'csv' else self._write_jsonl
+                rows = write(f, codec, columns, chunks)
+        os.replace(temp_file, filename)
+        return ExportResult(table, filename, rows)
+
+    def export_all(self, fmt: str, directory: str = '.', since: Optional[str] = None,
+                   tables: Sequence[str] = ('books', 'members', 'borrows')) -> List[ExportResult]:
+        """ส่งออกหลายตาราง (since ใช้กับ borrows)"""
+        os.makedirs(directory, exist_ok=True)
+        return [self.export_table(table, fmt, directory, since) for table in tables]
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="ส่งออก books.dat, members.dat, borrows.dat")
+    parser.add_argument('tables', nargs='*', help="books, members, borrows (ค่าเริ่มต้น: ทั้งหมด)")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--output', default='export', help="โฟลเดอร์ปลายทาง")
+    parser.add_argument('--since', help="ส่งออกเฉพาะรายการยืมตั้งแต่วันที่ (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+    for table in args.tables:
+        if table not in ('books', 'members', 'borrows'):
+            parser.error(f"ไม่มีตาราง {table}")
+    if args.since:
+        try:
+            datetime.datetime.strptime(args.since, "%Y-%m-%d")
+        except ValueError:
+            parser.error("--since ต้องอยู่ในรูปแบบ YYYY-MM-DD")
+
+    service = LibraryService()
+    try:
+        exporter = Exporter(service)
+        for result in exporter.export_all(args.format, args.output, args.since,
+                                          args.tables or ('books', 'members', 'borrows')):
+            print(f"✅ {result.table}: {result.rows:,} แถว -> {result.filename}")
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,206 @@
+import csv
+import datetime
+import json
+import os
+import sys
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from library_service import LibraryService, ValidationError
+
+
+class ImportResult(NamedTuple):
+    imported: int
+    rejected: int
+    errors: List[Tuple[int, str]]   # (บรรทัด, ข้อความ) เฉพาะ MAX_ERRORS รายการแรก
+    first_id: Optional[str]         # ID แรก/สุดท้ายที่นำเข้า (None ถ้าไม่มีแถวที่ผ่าน)
+    last_id: Optional[str]
+
+
+class BulkImporter:
+    """นำเข้าหนังสือ/สมาชิกจำนวนมากจากไฟล์ CSV หรือ JSONL (ทีละแถว ไม่โหลดทั้งไฟล์)
+
+    ตรวจสอบแต่ละแถว (แถวที่ไม่ผ่านถูกข้ามและรายงานพร้อมเลขบรรทัด)
+    แถวที่ผ่านถูกสะสมเป็นก้อนละ CHUNK_SIZE bytes จองช่วง ID ทีเดียวทั้งก้อน
+    แปลงด้วย codec ที่ compile ไว้แล้ว และต่อท้ายไฟล์ข้อมูลเป็น transaction เดียวต่อก้อน
+    ดัชนีที่เกี่ยวข้องถูกสร้างใหม่ครั้งเดียวตอนจบ แทนการเพิ่มทีละ entry
+    """
+
+    CHUNK_SIZE = 4 << 20    # ขนาดข้อมูลต่อการเขียนหนึ่งครั้ง (bytes)
+    MAX_ERRORS = 100        # จำนวนข้อผิดพลาดที่เก็บรายละเอียดไว้
+
+    BOOK_FIELDS = (('title', 100, True), ('author', 50, True), ('year', 4, True))
+    MEMBER_FIELDS = (('name', 50, True), ('student_id', 10, True), ('phone', 15, False))
+
+    def __init__(self, service: LibraryService):
+        self.service = service
+
+    # ---------- อ่านไฟล์ ----------
+
+    def _read_rows(self, path: str) -> Iterator[Tuple[int, Optional[Dict], str]]:
+        """วนแถวของไฟล์ -> (เลขบรรทัด, dict หรือ None ถ้าอ่านไม่ได้, ข้อความผิดพลาด)"""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    yield reader.line_num, row, ''
+        elif extension in ('.jsonl', '.json', '.ndjson'):
+            with open(path, encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        yield line_no, None, f"JSON ไม่ถูกต้อง: {e}"
+                        continue
+                    if not isinstance(row, dict):
+                        yield line_no, None, "แต่ละบรรทัดต้องเป็น JSON object"
+                        continue
+                    yield line_no, row, ''
+        else:
+            raise ValidationError(f"ไม่รองรับไฟล์ {extension or path} (ใช้ .csv หรือ .jsonl)")
+
+    def _validate(self, row: Dict, fields: Sequence[Tuple[str, int, bool]]) -> List[bytes]:
+        """ตรวจและแปลงค่าของแถวเป็น bytes ความยาวคงที่ตาม fields"""
+        values = []
+        for name, width, required in fields:
+            value = row.get(name)
+            value = '' if value is None else str(value).strip()
+            if required and not value:
+                raise ValidationError(f"ไม่มีค่า {name}")
+            data = value.encode('utf-8')
+            if len(data) > width:
+                raise ValidationError(f"{name} ยาวเกิน {width} bytes")
+            values.append(data.ljust(width, b'\x00'))
+        return values
+
+    # ---------- นำเข้า ----------
+
+    def _import(self, path: str, store, sequence, codec, fields,
+                check: Callable[[List[bytes]], None],
+                pack: Callable[[int, List[bytes]], bytes],
+                counts: Dict[str, int]) -> ImportResult:
+        service = self.service
+        chunk_rows = max(1, self.CHUNK_SIZE // codec.size)
+        limit = service.max_id  # ID มากที่สุดที่เก็บได้ใน field ID
+
+        imported = rejected = 0
+        errors: List[Tuple[int, str]] = []
+        first_id = last_id = None
+        pending: List[List[bytes]] = []
+
+        def flush():
+            nonlocal imported, first_id, last_id
+            try:
+                start = sequence.reserve(len(pending), limit)
+            except OverflowError:
+                raise ValidationError(f"ID เกินค่าสูงสุด (นำเข้าได้ถึง ID {limit:,})")
+            end = start + len(pending) - 1
+
+            chunk = b''.join(
+                pack(start + offset, values)
+                for offset, values in enumerate(pending)
+            )
+            service.append_records(store, chunk, {name: delta * len(pending) for name, delta in counts.items()})
+
+            imported += len(pending)
+            first_id = first_id or service.format_id(start)
+            last_id = service.format_id(end)
+            pending.clear()
+
+        for line_no, row, error in self._read_rows(path):
+            if row is not None:
+                try:
+                    values = self._validate(row, fields)
+                    check(values)
+                except ValidationError as e:
+                    error = str(e)
+            if error:
+                rejected += 1
+                if len(errors) < self.MAX_ERRORS:
+                    errors.append((line_no, error))
+                continue
+
+            pending.append(values)
+            if len(pending) >= chunk_rows:
+                flush()
+        if pending:
+            flush()
+
+        return ImportResult(imported, rejected, errors, first_id, last_id)
+
+    def import_books(self, path: str) -> ImportResult:
+        """นำเข้าหนังสือ (คอลัมน์ title, author, year) สถานะว่างทุกเล่ม"""
+        service = self.service
+        result = self._import(
+            path, service.books, service.book_ids, service.book_codec, self.BOOK_FIELDS,
+            lambda values: None,
+            lambda book_id, values: service.book_codec.pack(book_id, *values, b'A', b'0'),
+            {'total_books': 1, 'available_books': 1}
+        )
+        if result.imported:
+            service.book_index.rebuild()
+            service.text_index.rebuild()
+        return result
+
+    def import_members(self, path: str) -> ImportResult:
+        """นำเข้าสมาชิก (คอลัมน์ name, student_id, phone) รหัสนักศึกษาต้องไม่ซ้ำ"""
+        service = self.service
+        join_date = datetime.date.today().strftime("%Y-%m-%d").encode()
+
+        # ถือล็อกเดียวกับ add_member ตลอดการนำเข้า terminal อื่นจึงสมัครรหัสที่กำลังนำเข้าซ้อนไม่ได้
+        # รหัสที่มีอยู่แล้วอ่านจากไฟล์สมาชิกรอบเดียวก่อนเริ่ม แล้วตรวจทุกแถวกับ set นี้
+        # (รวมรหัสของแถวที่ผ่านไปแล้ว) โดยไม่ค้นดัชนีระหว่างนำเข้า
+        with service.registration_lock():
+            seen = service.student_ids()
+
+            def check(values: List[bytes]):
+                student_id = values[1]
+                if student_id in seen:
+                    text = student_id.rstrip(b'\x00').decode('utf-8')
+                    raise ValidationError(f"รหัสนักศึกษา {text} ซ้ำ")
+                seen.add(student_id)
+
+            result = self._import(
+                path, service.members, service.member_ids, service.member_codec, self.MEMBER_FIELDS,
+                check,
+                lambda member_id, values: service.member_codec.pack(member_id, *values, join_date, b'A', b'0'),
+                {'active_members': 1}
+            )
+            if result.imported:
+                service.member_index.rebuild()
+                service.student_index.rebuild()
+        return result
+
+
+def print_result(result: ImportResult):
+    """แสดงผลการนำเข้า"""
+    if result.imported:
+        print(f"✅ นำเข้าสำเร็จ {result.imported:,} รายการ (ID {result.first_id} - {result.last_id})")
+    else:
+        print("ไม่มีรายการที่นำเข้า")
+    if result.rejected:
+        print(f"⚠️  ข้ามแถวที่ไม่ถูกต้อง {result.rejected:,} แถว")
+        for line_no, error in result.errors:
+            print(f"   บรรทัด {line_no}: {error}")
+
+
+if __name__ == "__main__":
+    # python bulk_import.py books catalog.csv | python bulk_import.py members members.jsonl
+    if len(sys.argv) != 3 or sys.argv[1] not in ('books', 'members'):
+        print("วิธีใช้: python bulk_import.py books|members <ไฟล์ .csv หรือ .jsonl>")
+        sys.exit(2)
+
+    service = LibraryService()
+    importer = BulkImporter(service)
+    try:
+        if sys.argv[1] == 'books':
+            print_result(importer.import_books(sys.argv[2]))
+        else:
+            print_result(importer.import_members(sys.argv[2]))
+    except (ValidationError, OSError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        service.close()
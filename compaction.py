@@ -0,0 +1,96 @@
+import os
+import time
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
+
+from record_codec import RecordCodec
+from record_store import RecordStore
+from file_format import data_offset, pack_header
+from locks import UsageLock
+from scanner import scan_rows
+from schema import Schema
+from wal import WriteAheadLog
+from metrics import metrics
+
+T = TypeVar('T')
+
+
+class CompactResult(NamedTuple):
+    filename: str
+    removed: int
+    reclaimed: int          # bytes
+    scan_before: float      # วินาที
+    scan_after: float       # วินาที
+
+
+def _time_scan(store: RecordStore, codec: RecordCodec) -> float:
+    """เวลาที่ใช้อ่านทุก record ในไฟล์ (วินาที)"""
+    start = time.perf_counter()
+    for _ in scan_rows(store, codec):
+        pass
+    return time.perf_counter() - start
+
+
+def _alive(record) -> bool:
+    return record[-1:] == b'0'
+
+
+def _archive_returned(borrows: RecordStore, borrow_schema: Schema, archive_file: str
+                      ) -> Callable[[bytes], bool]:
+    """ต่อท้ายรายการยืมที่คืนแล้วลง archive_file คืนค่า predicate ของ record ที่ย้ายไปแล้ว
+
+    เขียน archive ให้เสร็จ (fsync) ก่อนตัดออกจากไฟล์หลัก หยุดกลางทางได้แค่ข้อมูลซ้ำ ไม่หาย
+    archive ที่มีอยู่แล้วต้องเป็น layout เดียวกัน (ไม่เช่นนั้น raise FormatError)
+    """
+    codec = borrow_schema.codec
+    returned = borrow_schema.where(status=b'R', deleted=b'0')
+    with open(archive_file, 'ab') as f:
+        start = f.tell()
+        if start == 0:
+            f.write(pack_header(codec))
+        else:
+            data_offset(archive_file, codec)
+        for borrow in borrows:
+            if returned(borrow):
+                f.write(borrow)
+        f.flush()
+        os.fsync(f.fileno())
+        if metrics.enabled:
+            metrics.count(files_opened=1, bytes_written=f.tell() - start)
+    return returned
+
+
+@metrics.operation()
+def compact_library(usage: UsageLock, wal: WriteAheadLog,
+                    stores: Sequence[Tuple[RecordStore, RecordCodec]],
+                    borrows: RecordStore, borrow_schema: Schema, archive_file: Optional[str],
+                    rebuild_indexes: Callable[[], T]) -> Tuple[List[CompactResult], T]:
+    """บีบอัดไฟล์ข้อมูลของโปรแกรม: ตัด record ที่ถูกลบออก แล้วสร้างดัชนีใหม่
+
+    ถ้าระบุ archive_file จะย้ายรายการยืมที่คืนแล้วจาก borrows ไปต่อท้ายไฟล์นั้นด้วย
+    ทำทั้งหมดขณะถือ usage แบบ exclusive (raise InUseError ถ้ามี process อื่นเปิดโปรแกรมอยู่)
+    process อื่นจึงไม่เขียนลงไฟล์เดิมที่ถูกแทนที่ และเปิดได้อีกครั้งหลังดัชนีถูกสร้างใหม่แล้ว
+    คืนค่า (ผลของแต่ละไฟล์, ผลของ rebuild_indexes())
+    """
+    with usage.exclusive():
+        # ตำแหน่ง record จะเปลี่ยน ต้องให้ทุกอย่างใน WAL ลงไฟล์ข้อมูลก่อน
+        wal.checkpoint()
+
+        keep_borrow = _alive
+        if archive_file:
+            returned = _archive_returned(borrows, borrow_schema, archive_file)
+            keep_borrow = lambda record: _alive(record) and not returned(record)
+
+        results = []
+        for store, codec in stores:
+            keep = keep_borrow if store is borrows else _alive
+            size_before = os.path.getsize(store.filename)
+            scan_before = _time_scan(store, codec)
+
+            removed = store.compact(lambda index, record: keep(record))
+
+            reclaimed = size_before - os.path.getsize(store.filename)
+            scan_after = _time_scan(store, codec)
+            results.append(CompactResult(store.filename, removed, reclaimed, scan_before, scan_after))
+
+        # ตำแหน่ง record เปลี่ยนหมด ต้องสร้างดัชนีใหม่ทั้งหมด
+        return results, rebuild_indexes()
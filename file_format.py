@@ -0,0 +1,111 @@
+import json
+import os
+import struct
+from typing import NamedTuple, Optional, Tuple
+
+from record_codec import RecordCodec
+from record_store import RecordStore
+from metrics import metrics
+
+MAGIC = b'LDAT'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')  # Magic + Version + HeaderSize + RecordSize ตามด้วย layout (JSON)
+HEADER_SIZE = 256                  # ขนาด header ทั้งหมด record แรกเริ่มที่ byte นี้
+
+
+class FormatError(Exception):
+    """ไฟล์ข้อมูลไม่มี header (ไฟล์รุ่นก่อน) หรือ layout ในไฟล์ไม่ตรงกับที่โปรแกรมใช้"""
+
+
+class FileLayout(NamedTuple):
+    """layout ที่บันทึกไว้ใน header ของไฟล์ข้อมูล"""
+    version: int
+    header_size: int
+    record_size: int
+    name: str
+    format: str
+    fields: Tuple[str, ...]
+
+    def codec(self) -> RecordCodec:
+        return RecordCodec(self.format, self.fields, self.name)
+
+    def matches(self, codec: RecordCodec) -> bool:
+        # เทียบ layout ที่ได้ ไม่เทียบตัวอักษรของ format ('<4q' กับ '<qqqq' คือ layout เดียวกัน)
+        mine = self.codec()
+        return (self.record_size, mine.format[0], mine.fields, mine.codes, mine.widths) == \
+            (codec.size, codec.format[0], codec.fields, codec.codes, codec.widths)
+
+    def describe(self) -> str:
+        return f"{self.format} ({', '.join(self.fields)})"
+
+
+def pack_header(codec: RecordCodec) -> bytes:
+    """header ของไฟล์ข้อมูลที่เก็บ record ตาม codec (ยาว HEADER_SIZE bytes)"""
+    layout = json.dumps({
+        'name': codec.Row.__name__,
+        'format': codec.format,
+        'fields': list(codec.fields),
+    }, separators=(',', ':')).encode('utf-8')
+    if HEADER.size + len(layout) > HEADER_SIZE:
+        raise ValueError(f"layout '{codec.format}' ยาวเกินกว่าจะเก็บใน header ({HEADER_SIZE} bytes)")
+    return (HEADER.pack(MAGIC, VERSION, HEADER_SIZE, codec.size) + layout).ljust(HEADER_SIZE, b'\x00')
+
+
+def unpack_header(data: bytes) -> Optional[FileLayout]:
+    """แปลง header -> FileLayout (คืนค่า None ถ้าไม่มี header คือไฟล์รุ่นก่อน)"""
+    if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+        return None
+    _, version, header_size, record_size = HEADER.unpack_from(data)
+    if version > VERSION:
+        raise FormatError(f"header รุ่น {version} ใหม่กว่าที่โปรแกรมนี้รู้จัก (รุ่น {VERSION})")
+    try:
+        layout = json.loads(bytes(data[HEADER.size:header_size]).rstrip(b'\x00'))
+        return FileLayout(version, header_size, record_size,
+                          layout['name'], layout['format'], tuple(layout['fields']))
+    except (ValueError, KeyError, TypeError):
+        raise FormatError("header ของไฟล์ข้อมูลเสียหาย")
+
+
+def read_layout(filename: str) -> Optional[FileLayout]:
+    """อ่าน layout จาก header ของไฟล์ (None ถ้าไฟล์ว่างหรือเป็นไฟล์รุ่นก่อนที่ไม่มี header)"""
+    with open(filename, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+        if len(data) >= HEADER.size and data[:len(MAGIC)] == MAGIC:
+            header_size = HEADER.unpack_from(data)[2]
+            data += f.read(max(0, header_size - len(data)))
+    if metrics.enabled:
+        metrics.count(files_opened=1, bytes_read=len(data))
+    return unpack_header(data)
+
+
+def init_file(filename: str, codec: RecordCodec):
+    """สร้างไฟล์ข้อมูลพร้อม header ถ้ายังไม่มีหรือยังว่าง"""
+    fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size == 0:
+            # process อื่นที่สร้างพร้อมกันจะเขียน header เดียวกันทับ จึงไม่เสียหาย
+            os.pwrite(fd, pack_header(codec), 0)
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def data_offset(filename: str, codec: RecordCodec) -> int:
+    """ตรวจว่า layout ในไฟล์ตรงกับ codec แล้วคืนค่าตำแหน่งของ record แรก
+
+    ไฟล์รุ่นก่อน (ไม่มี header) หรือ layout ไม่ตรงจะ raise FormatError
+    ให้แปลงไฟล์ด้วย migrate.py ก่อน
+    """
+    layout = read_layout(filename)
+    if layout is None:
+        raise FormatError(f"{filename} เป็นไฟล์รุ่นก่อนที่ไม่มี header ให้แปลงไฟล์ด้วย migrate.py ก่อน")
+    if not layout.matches(codec):
+        raise FormatError(f"{filename} เก็บข้อมูลแบบ {layout.describe()} "
+                          f"แต่โปรแกรมใช้ {codec.format} ให้แปลงไฟล์ด้วย migrate.py ก่อน")
+    return layout.header_size
+
+
+def open_store(filename: str, codec: RecordCodec) -> RecordStore:
+    """เปิดไฟล์ข้อมูลที่มี header (สร้างใหม่ถ้ายังไม่มี) เป็น RecordStore ของ codec"""
+    init_file(filename, codec)
+    return RecordStore(filename, codec.size, data_offset(filename, codec))
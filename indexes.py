@@ -0,0 +1,738 @@
+import hashlib
+import os
+import re
+import struct
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+from heapq import merge
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from postings import Postings, Segment, SegmentWriter, build_segment, merge_segments
+from record_codec import RecordCodec, RecordView
+from record_store import RecordStore
+from metrics import metrics
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def index_filename(data_file: str, suffix: str = '') -> str:
+    """ชื่อไฟล์ดัชนีที่คู่กับไฟล์ข้อมูล เช่น books.dat -> books.idx"""
+    return os.path.splitext(data_file)[0] + suffix + '.idx'
+
+
+RUN_ENTRIES = 1 << 18   # จำนวน entry ที่เรียง/สะสมในหน่วยความจำต่อก้อนตอนสร้างดัชนีใหม่
+
+
+def sorted_entries(entry: struct.Struct, items: Iterable[Tuple[object, int]],
+                   directory: str) -> Iterator[bytes]:
+    """เรียง (key, record index) แบบ external sort -> ก้อน bytes ของ entry ที่เรียงแล้ว
+
+    เรียงในหน่วยความจำทีละ RUN_ENTRIES entry แล้วพักแต่ละก้อน (run) ไว้ในไฟล์ชั่วคราว
+    run ที่ต่อกันตามลำดับอยู่แล้ว (เช่น ID ที่เพิ่มขึ้นตามลำดับการต่อท้าย) อ่านต่อกันได้เลย
+    นอกนั้น merge ทุก run พร้อมกัน หน่วยความจำจึงขึ้นกับ RUN_ENTRIES ไม่ขึ้นกับขนาดไฟล์ข้อมูล
+    """
+    items = iter(items)
+    run = sorted(islice(items, RUN_ENTRIES))
+    if len(run) < RUN_ENTRIES:
+        yield b''.join(entry.pack(*item) for item in run)
+        return
+
+    runs = []   # (ไฟล์ชั่วคราว, item แรก, item สุดท้าย)
+    try:
+        while run:
+            f = tempfile.TemporaryFile(dir=directory or '.')
+            runs.append((f, run[0], run[-1]))
+            f.write(b''.join(entry.pack(*item) for item in run))
+            run = sorted(islice(items, RUN_ENTRIES))
+
+        if all(previous[2] <= following[1] for previous, following in zip(runs, runs[1:])):
+            for f, _, _ in runs:
+                f.seek(0)
+                yield from iter(lambda: f.read(entry.size * RUN_ENTRIES), b'')
+            return
+
+        yield from pack_entries(entry, merge(*(_read_run(f, entry) for f, _, _ in runs)))
+    finally:
+        for f, _, _ in runs:
+            f.close()
+
+
+def pack_entries(entry: struct.Struct, items: Iterable[Tuple]) -> Iterator[bytes]:
+    """แปลง item เป็น entry แล้วรวมเป็นก้อนละ RUN_ENTRIES entry"""
+    chunk = []
+    for item in items:
+        chunk.append(entry.pack(*item))
+        if len(chunk) >= RUN_ENTRIES:
+            yield b''.join(chunk)
+            chunk.clear()
+    yield b''.join(chunk)
+
+
+def _read_run(f, entry: struct.Struct) -> Iterator[Tuple]:
+    f.seek(0)
+    for data in iter(lambda: f.read(entry.size * 4096), b''):
+        yield from entry.iter_unpack(data)
+
+
+class IndexFile:
+    """ไฟล์ดัชนีแบบ Header + Entry ขนาดคงที่ ที่สร้างจากไฟล์ข้อมูล (.dat)
+
+    Header เก็บชนิดของ key จำนวน record ที่ทำดัชนีแล้ว และ CRC32 ของ entry ทั้งหมด
+    ใช้ตรวจว่าดัชนีเก่า/เสียหรือไม่ ถ้าเสียจะสร้างใหม่จากไฟล์ข้อมูลอัตโนมัติ
+    record ที่ถูกต่อท้ายไฟล์ข้อมูลโดยไม่ผ่านดัชนีจะถูกเพิ่มให้ในการค้นหาครั้งถัดไป
+    ทุกการเขียนถือล็อกการต่อท้ายของไฟล์ข้อมูล (ร่วมกันทุกดัชนีของไฟล์นั้นและทุก process)
+    และอ่าน header ใหม่ก่อนเขียน จึงต่อจาก entry ที่ process อื่นเขียนไว้แทนการเขียนทับ
+    key_format เป็นรหัส struct ของ key: 'I'/'Q' = ID แบบเลขฐานสอง (เทียบเป็น int) '10s' = bytes
+    """
+
+    MAGIC = b'IDX_'
+    VERSION = 2
+    HEADER = struct.Struct('<4sH8sQI')  # Magic + Version + KeyFormat + RecordCount + CRC32
+
+    def __init__(self, filename: str, data: RecordStore, key_format: str,
+                 key_offset: int, entry_format: str):
+        self.filename = filename
+        self.data = data
+        self.key_format = key_format
+        self.key_offset = key_offset
+        self._key = struct.Struct('<' + key_format)
+        self.key_size = self._key.size
+
+        self._entry = struct.Struct(entry_format)
+        self._record_count = 0
+        self._crc = 0
+        self._entry_count = 0    # จำนวน entry ที่โหลดเข้าหน่วยความจำแล้ว
+        self._loaded = False
+        self._mutex = threading.RLock()
+        self._holding = False    # thread ที่ถือ _mutex ถือล็อกของไฟล์อยู่แล้ว (เรียกซ้อนได้)
+
+        self._entries = self._open_entries()
+        # โหลดสถานะ (สร้างใหม่ถ้าดัชนีเก่าหรือเสีย) ภายใต้ล็อกเดียวกับผู้เขียน
+        with self._locked():
+            pass
+
+    def _open_entries(self) -> RecordStore:
+        open(self.filename, 'ab').close()  # สร้างไฟล์ถ้ายังไม่มี (ไม่ตัดไฟล์ที่ process อื่นเพิ่งเขียน)
+        return RecordStore(self.filename, self._entry.size, self.HEADER.size)
+
+    # ---------- ล็อกระหว่าง process ----------
+
+    def _replaced(self) -> bool:
+        """ไฟล์ดัชนีถูกแทนที่แล้ว (process อื่น rebuild แล้ว rename ไฟล์ใหม่ทับ หรือลบทิ้ง)"""
+        try:
+            return os.stat(self.filename).st_ino != os.fstat(self._entries.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _header_state(self) -> Optional[Tuple[int, int]]:
+        """(จำนวน record ที่ทำดัชนีแล้ว, CRC32) ตาม header ในไฟล์ตอนนี้"""
+        header = self._entries.read_header()
+        if header is None:
+            return None
+        return self.HEADER.unpack(header)[3:5]
+
+    def _unchanged(self) -> bool:
+        """ไฟล์ดัชนียังตรงกับสถานะในหน่วยความจำ (ตรวจโดยไม่ล็อก)"""
+        return (self._loaded and not self._replaced()
+                and self._header_state() == (self._record_count, self._crc))
+
+    def _refresh(self):
+        """โหลดสิ่งที่ process อื่นเขียนลงไฟล์ดัชนีหลังครั้งก่อน (เรียกขณะถือล็อก)
+
+        ถ้ามีแค่ entry ที่ต่อท้ายเพิ่ม (CRC ต่อจากค่าเดิมตรงกับ header) โหลดเฉพาะส่วนที่เพิ่ม
+        นอกนั้นตรวจและโหลดใหม่ทั้งไฟล์
+        """
+        if self._replaced():
+            self._entries.close()
+            self._entries = self._open_entries()
+            self._loaded = False
+        state = self._header_state()
+        if self._loaded and state == (self._record_count, self._crc):
+            return
+
+        known = self._entry_count
+        if (self._loaded and state is not None and not self._entries.trailing_bytes()
+                and len(self._entries) >= known and state[0] <= len(self.data)
+                and zlib.crc32(self._entries.view(known), self._crc) == state[1]):
+            self._record_count, self._crc = state
+            self._reload(known)
+        elif self.is_stale():
+            self._rebuild()
+        else:
+            self._reload()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """ล็อกการเขียนดัชนี (ระหว่าง thread และระหว่าง process) แล้วอ่านสถานะล่าสุดจากไฟล์"""
+        with self._mutex:
+            if self._holding:
+                yield
+                return
+            with self.data.locks.append():
+                self._refresh()
+                self._holding = True
+                try:
+                    yield
+                finally:
+                    self._holding = False
+
+    # ---------- Header ----------
+
+    def _header_values(self) -> tuple:
+        """ค่าของ header ตามลำดับ HEADER (subclass ที่เพิ่ม field ต่อท้าย HEADER เพิ่มค่าที่นี่)"""
+        return self.MAGIC, self.VERSION, self.key_format.encode(), self._record_count, self._crc
+
+    def _write_header(self):
+        self._entries.write_header(self.HEADER.pack(*self._header_values()))
+
+    def is_stale(self) -> bool:
+        """ตรวจว่าดัชนีไม่ตรงกับไฟล์ข้อมูล (ผิดรูปแบบ, checksum ไม่ตรง หรือข้อมูลหดลง)"""
+        header = self._entries.read_header()
+        if header is None or self._entries.trailing_bytes():
+            return True
+
+        magic, version, key_format, record_count, crc = self.HEADER.unpack(header)[:5]
+        if (magic != self.MAGIC or version != self.VERSION
+                or key_format.rstrip(b'\x00') != self.key_format.encode()):
+            return True
+        if record_count > len(self.data):
+            return True
+        if zlib.crc32(self._entries.view()) != crc:
+            return True
+
+        self._record_count = record_count
+        self._crc = crc
+        return False
+
+    # ---------- สร้าง/อัปเดตดัชนี ----------
+
+    def _key_of(self, record):
+        return self._key.unpack_from(record, self.key_offset)[0]
+
+    def _load(self, start: int = 0):
+        """โหลดสถานะในหน่วยความจำจาก entry ตั้งแต่ตำแหน่ง start (0 = โหลดใหม่ทั้งหมด สำหรับ subclass)"""
+
+    def _reload(self, start: int = 0):
+        self._load(start)
+        self._entry_count = len(self._entries)
+        self._loaded = True
+
+    def _build(self) -> Iterator[bytes]:
+        """สร้าง entry ทั้งหมดจากไฟล์ข้อมูลเป็นก้อน bytes ของ entry ที่ต่อกัน (ไม่ต้องมีทั้งหมดในหน่วยความจำ)"""
+        raise NotImplementedError
+
+    def _index_record(self, record, index: int):
+        """เพิ่ม record ที่ถูกต่อท้ายไฟล์ข้อมูลโดยไม่ผ่านดัชนี"""
+        raise NotImplementedError
+
+    @metrics.operation()
+    def rebuild(self) -> int:
+        """สร้างดัชนีใหม่ทั้งหมดจากไฟล์ข้อมูล คืนค่าจำนวน entry"""
+        with self._locked():
+            return self._rebuild()
+
+    def _rebuild(self) -> int:
+        self._record_count = len(self.data)
+        self._replace(self._build())
+        return self._entry_count
+
+    def _replace(self, chunks: Iterable[bytes]):
+        """เขียนไฟล์ดัชนีใหม่ทั้งไฟล์ (header ตาม _record_count + entry จาก chunks) แล้วโหลดใหม่ (เรียกขณะถือล็อก)"""
+        # เขียนลงไฟล์ชั่วคราวแล้ว rename ทับ เพื่อไม่ให้ดัชนีครึ่งๆ กลางๆ
+        # (process อื่นที่เปิดไฟล์เดิมไว้จะเห็นว่าไฟล์ถูกแทนที่และเปิดใหม่ตอนถือล็อกครั้งถัดไป)
+        # เขียน entry ทีละก้อนพร้อมคำนวณ CRC แล้วจึงเขียน header ทับตอนท้าย (หลังใช้ chunks หมดแล้ว)
+        temp_file = f'{self.filename}.{os.getpid()}.tmp'
+        crc = size = 0
+        with open(temp_file, 'wb') as f:
+            f.write(bytes(self.HEADER.size))
+            for chunk in chunks:
+                f.write(chunk)
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+            self._crc = crc
+            f.seek(0)
+            f.write(self.HEADER.pack(*self._header_values()))
+        if metrics.enabled:
+            metrics.count(files_opened=1, bytes_written=self.HEADER.size + size)
+        self._entries.close()
+        os.replace(temp_file, self.filename)
+        self._entries = RecordStore(self.filename, self._entry.size, self.HEADER.size)
+        self._reload()
+
+    def _append_entry(self, entry: bytes, record_index: int):
+        """ต่อท้าย entry (หนึ่งหรือหลาย entry ติดกัน) พร้อมอัปเดต checksum และ header (เรียกขณะถือล็อก)"""
+        self._entries.append(entry)
+        self._entry_count += len(entry) // self._entry.size
+        self._crc = zlib.crc32(entry, self._crc)
+        self._record_count = max(self._record_count, record_index + 1)
+        self._write_header()
+
+    def _sync(self):
+        """ตามให้ทันสิ่งที่ process อื่นเขียนลงดัชนี และ record ที่ถูกเพิ่มโดยไม่ผ่านดัชนี"""
+        if len(self.data) == self._record_count and self._unchanged():
+            return
+        with self._locked():
+            count = len(self.data)
+            if count == self._record_count:
+                return
+            if count < self._record_count:
+                self._rebuild()
+                return
+            for index, record in self.data.scan(self._record_count):
+                self._index_record(record, index)
+            self._record_count = count
+            self._write_header()
+
+    def close(self):
+        self._entries.close()
+
+
+class PrimaryIndex(IndexFile):
+    """ดัชนีหลัก ID -> index ของ record
+
+    Entry (ID + record index) ส่วนแรกเรียงตาม ID จึงค้นหาแบบ binary search บนไฟล์ได้
+    โดยไม่ต้องโหลดดัชนีทั้งหมดเข้าหน่วยความจำ (header เก็บจำนวน entry ในส่วนที่เรียง)
+    ID ที่มาไม่เรียง (เช่น terminal อื่นจองช่วง ID ก่อนหน้าแต่เขียนทีหลัง) ต่อท้ายเป็นส่วน overflow
+    ที่โหลดเป็น dict เล็กๆ และถูก merge กลับเข้าส่วนที่เรียงเมื่อยาวเกิน OVERFLOW_ENTRIES หรือตอน rebuild
+    entry เดิมในไฟล์จึงไม่ถูกเขียนทับเลย (มีแค่ต่อท้ายหรือแทนที่ทั้งไฟล์ด้วย rename)
+    ผู้อ่านใน process อื่นที่ค้นโดยไม่ล็อกจึงไม่เห็นข้อมูลครึ่งๆ กลางๆ
+    """
+
+    MAGIC = b'PIDX'
+    VERSION = 3
+    HEADER = struct.Struct('<4sH8sQIQ')  # Magic + Version + KeyFormat + RecordCount + CRC32 + SortedCount
+    OVERFLOW_ENTRIES = 4096     # จำนวน entry ในส่วน overflow ที่ทำให้ merge เข้าส่วนที่เรียง
+
+    def __init__(self, filename: str, data: RecordStore, key_format: str, key_offset: int = 0):
+        self._sorted_count = 0                  # จำนวน entry ส่วนที่เรียง (ที่เหลือคือ overflow)
+        self._overflow: Dict[object, int] = {}  # ID -> record index ของส่วน overflow
+        super().__init__(filename, data, key_format, key_offset, f'<{key_format}Q')  # ID + record index
+
+    def _header_values(self) -> tuple:
+        return super()._header_values() + (self._sorted_count,)
+
+    def is_stale(self) -> bool:
+        if super().is_stale():
+            return True
+        return self.HEADER.unpack(self._entries.read_header())[5] > len(self._entries)
+
+    def _load(self, start: int = 0):
+        self._sorted_count = self.HEADER.unpack(self._entries.read_header())[5]
+        overflow = self._overflow if start else {}
+        for key, index in self._entry.iter_unpack(self._entries.view(max(start, self._sorted_count))):
+            overflow[key] = index
+        self._overflow = overflow
+
+    def _build(self) -> Iterator[bytes]:
+        entries = ((self._key_of(record), index) for index, record in self.data.scan())
+        return sorted_entries(self._entry, entries, os.path.dirname(self.filename))
+
+    def _replace(self, chunks: Iterable[bytes]):
+        # ไฟล์ที่เขียนใหม่ทั้งไฟล์ (rebuild/merge) เรียงทั้งไฟล์: นับ entry ระหว่างเขียน
+        # (header ถูกเขียนหลังใช้ chunks หมดแล้ว จึงได้จำนวนที่ถูกต้อง)
+        def counted() -> Iterator[bytes]:
+            size = 0
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+            self._sorted_count = size // self._entry.size
+
+        super()._replace(counted())
+
+    def _merge(self):
+        """รวมส่วน overflow เข้าส่วนที่เรียงแล้วเขียนไฟล์ใหม่ (เรียกขณะถือล็อก)"""
+        step = RUN_ENTRIES
+
+        def sorted_part() -> Iterator[Tuple]:
+            for start in range(0, self._sorted_count, step):
+                data = bytes(self._entries.view(start, min(start + step, self._sorted_count)))
+                yield from self._entry.iter_unpack(data)
+
+        self._replace(pack_entries(self._entry, merge(sorted_part(), sorted(self._overflow.items()))))
+
+    def _index_record(self, record, index: int):
+        self.add(self._key_of(record), index)
+
+    def _entry_key(self, position: int):
+        return self._key.unpack_from(self._entries.get(position))[0]
+
+    def _bisect(self, key, low: int = 0) -> int:
+        """ตำแหน่งแรกในส่วนที่เรียงที่ key ของ entry >= key (ค้นตั้งแต่ตำแหน่ง low)"""
+        high = self._sorted_count
+        while low < high:
+            mid = (low + high) // 2
+            if self._entry_key(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _find(self, key, low: int = 0) -> Tuple[int, int]:
+        """(index ของ record หรือ -1, ตำแหน่งที่ค้นถึงในส่วนที่เรียง)"""
+        index = self._overflow.get(key)
+        if index is not None:
+            return index, low
+        position = self._bisect(key, low)
+        if position < self._sorted_count:
+            found_key, index = self._entry.unpack(self._entries.get(position))
+            if found_key == key:
+                return index, position
+        return -1, position
+
+    def add(self, key, record_index: int):
+        """เพิ่ม entry ใหม่ (ID ที่เพิ่มขึ้นเรื่อยๆ ต่อท้ายส่วนที่เรียงได้ทันที ที่ไม่เรียงต่อท้ายเป็น overflow)
+
+        entry ที่มีอยู่แล้ว (process อื่นตามเพิ่ม record นี้ให้ก่อน) จะไม่ถูกเพิ่มซ้ำ
+        """
+        entry = self._entry.pack(key, record_index)
+        with self._locked():
+            if self._find(key)[0] == record_index:
+                return
+            count = self._sorted_count
+            if not self._overflow and (count == 0 or self._entry_key(count - 1) <= key):
+                self._sorted_count += 1
+            else:
+                self._overflow[key] = record_index
+            self._append_entry(entry, record_index)
+            if len(self._overflow) >= self.OVERFLOW_ENTRIES:
+                self._merge()
+
+    @metrics.operation()
+    def lookup(self, key) -> int:
+        """หา index ของ record จาก ID (คืนค่า -1 ถ้าไม่พบ)"""
+        self._sync()
+        with self._mutex:  # thread อื่นใน process นี้อาจกำลัง merge/rebuild
+            return self._find(key)[0]
+
+    @metrics.operation()
+    def lookup_many(self, keys: Iterable) -> Dict[object, int]:
+        """หา index ของ record จากหลาย ID พร้อมกัน -> {ID: index} (ID ที่ไม่พบไม่อยู่ในผลลัพธ์)
+
+        เรียง ID ก่อนแล้วค้นต่อจากตำแหน่งของ ID ก่อนหน้า ช่วงที่ต้องค้นจึงแคบลงเรื่อยๆ
+        และอ่าน entry ตามลำดับไฟล์ (ID ซ้ำถูกค้นครั้งเดียว)
+        """
+        self._sync()
+        found: Dict[object, int] = {}
+        position = 0
+        with self._mutex:
+            for key in sorted(set(keys)):
+                record_index, position = self._find(key, position)
+                if record_index != -1:
+                    found[key] = record_index
+        return found
+
+
+def index_join(rows: Iterable, probes: Sequence[Tuple[Callable, PrimaryIndex, Callable]],
+               chunk_rows: int = 4096) -> Iterator[tuple]:
+    """join rows กับตารางอื่นผ่าน PrimaryIndex ทีละก้อน แทนการค้นทีละแถว (N+1)
+
+    probes คือ (key_of(row) -> ID, ดัชนีหลักของตาราง, convert(record) -> ค่า หรือ None ถ้าใช้ไม่ได้)
+    แต่ละก้อนรวบรวม ID ที่ไม่ซ้ำของทุก probe ค้นในดัชนีครั้งเดียวด้วย lookup_many
+    แปลง record ละครั้งเก็บเป็น hash map แล้ว yield (row, ค่า1, ค่า2, ...) ตามลำดับเดิม
+    แถวที่ probe ใดไม่พบหรือ convert คืนค่า None จะถูกข้าม
+    หน่วยความจำขึ้นกับ chunk_rows ไม่ขึ้นกับขนาดตาราง
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            return
+
+        tables = []
+        for key_of, index, convert in probes:
+            table = {}
+            for key, record_index in index.lookup_many(key_of(row) for row in chunk).items():
+                record = index.data.get(record_index)
+                # ดัชนีอาจชี้ record ที่ ID ไม่ตรง (เช่น ดัชนีเก่า) ตรวจเหมือน lookup ทีละตัว
+                if record is not None and index._key_of(record) == key:
+                    table[key] = convert(record)
+            tables.append(table)
+
+        for row in chunk:
+            values = tuple(table.get(key_of(row)) for (key_of, _, _), table in zip(probes, tables))
+            if None not in values:
+                yield (row,) + values
+
+
+class HashIndex(IndexFile):
+    """ดัชนีรอง key -> index ของ record (hash table ในหน่วยความจำ)
+
+    ไฟล์เก็บเป็น journal ของการเพิ่ม (+) / ลบ (-) แบบต่อท้ายอย่างเดียว
+    โหลดเป็น dict ตอนเปิด และบีบ journal ให้เหลือเฉพาะ entry ที่ใช้อยู่ตอน rebuild
+    include() ใช้เลือกเฉพาะ record ที่ควรอยู่ในดัชนี (เช่น ยังไม่ถูกลบ)
+    """
+
+    MAGIC = b'HIDX'
+
+    def __init__(self, filename: str, data: RecordStore, key_format: str, key_offset: int,
+                 include: Callable[[memoryview], bool]):
+        self.include = include
+        self._table: Dict[object, List[int]] = {}
+        super().__init__(filename, data, key_format, key_offset, f'<c{key_format}Q')  # Op + Key + record index
+
+    def _load(self, start: int = 0):
+        table: Dict[object, List[int]] = self._table if start else {}
+        for op, key, index in self._entry.iter_unpack(self._entries.view(start)):
+            if op == b'+':
+                indexes = table.setdefault(key, [])
+                if index not in indexes:  # process อื่นอาจเพิ่ม record เดียวกันไว้แล้ว
+                    indexes.append(index)
+            elif key in table and index in table[key]:
+                table[key].remove(index)
+                if not table[key]:
+                    del table[key]
+        self._table = table
+
+    def _build(self) -> Iterator[bytes]:
+        entries = []
+        for index, record in self.data.scan():
+            if self.include(record):
+                entries.append(self._entry.pack(b'+', self._key_of(record), index))
+                if len(entries) >= RUN_ENTRIES:
+                    yield b''.join(entries)
+                    entries.clear()
+        yield b''.join(entries)
+
+    def _index_record(self, record, index: int):
+        if self.include(record):
+            self.add(self._key_of(record), index)
+
+    def add(self, key, record_index: int):
+        """เพิ่ม record index ให้กับ key"""
+        with self._locked():
+            indexes = self._table.setdefault(key, [])
+            if record_index in indexes:
+                return
+            self._append_entry(self._entry.pack(b'+', key, record_index), record_index)
+            indexes.append(record_index)
+
+    def remove(self, key, record_index: int):
+        """ลบ record index ออกจาก key (เช่น เมื่อ record ถูกลบแบบ soft delete)"""
+        with self._locked():
+            indexes = self._table.get(key)
+            if not indexes or record_index not in indexes:
+                return
+            self._append_entry(self._entry.pack(b'-', key, record_index), record_index)
+            indexes.remove(record_index)
+            if not indexes:
+                del self._table[key]
+
+    @metrics.operation()
+    def lookup(self, key) -> List[int]:
+        """หา index ของ record ทั้งหมดที่มี key นี้"""
+        self._sync()
+        return list(self._table.get(key, ()))
+
+    def first(self, key) -> int:
+        """หา index ของ record แรกที่มี key นี้ (คืนค่า -1 ถ้าไม่พบ)"""
+        indexes = self.lookup(key)
+        return indexes[0] if indexes else -1
+
+
+class TextIndex(IndexFile):
+    """ดัชนีค้นหาข้อความ (inverted index) ของ field ข้อความ เช่น ชื่อหนังสือ/ผู้แต่ง
+
+    เก็บคำ (token) ของแต่ละ field ไว้จัดอันดับผลลัพธ์ และ trigram ไว้ค้นหาแบบ substring
+    ส่วนหลักคือ segment (เช่น books_text.seg) ที่สร้างครั้งเดียวตอน rebuild: พจนานุกรม term ที่เรียงแล้ว
+    และ posting list แบบเรียง/เก็บส่วนต่าง อ่านผ่าน mmap การค้นหาจึงอ่านเฉพาะ term ของ keyword
+    การเพิ่ม/แก้/ลบทีละ record ต่อท้ายไฟล์ดัชนีเป็น journal ของ (+) / (-) แบบเดียวกับ HashIndex
+    โหลดเป็น dict เล็กๆ ในหน่วยความจำ และถูก merge เข้า segment ใหม่เมื่อยาวเกิน MERGE_ENTRIES
+    """
+
+    MAGIC = b'TIDX'
+    VERSION = 3
+    TERM_SIZE = 16
+    MERGE_ENTRIES = 1 << 17     # จำนวน entry ใน journal ที่ทำให้ merge เข้า segment
+
+    def __init__(self, filename: str, data: RecordStore, codec: RecordCodec,
+                 fields: Sequence[str], include: Callable[[memoryview], bool]):
+        self.codec = codec
+        self.fields = tuple(codec.index(field) for field in fields)
+        self.include = include
+        self.segment_file = os.path.splitext(filename)[0] + '.seg'
+        self._segment: Optional[Segment] = None
+        # term -> {record index: มีอยู่หรือไม่} ตาม journal (ค่าล่าสุดของ record ชนะค่าใน segment)
+        self._changes: Dict[bytes, Dict[int, bool]] = {}
+        super().__init__(filename, data, f'{self.TERM_SIZE}s', 0, f'<c{self.TERM_SIZE}sI')  # Op + Term + record index
+
+    # ---------- คำและ trigram ----------
+
+    @classmethod
+    def _term_key(cls, term: str) -> bytes:
+        """แปลง term เป็น key ขนาดคงที่ (term ที่ยาวเกินใช้ hash แทน)"""
+        data = term.encode('utf-8')
+        if len(data) <= cls.TERM_SIZE:
+            return data.ljust(cls.TERM_SIZE, b'\x00')
+        return hashlib.blake2b(data, digest_size=cls.TERM_SIZE).digest()
+
+    @staticmethod
+    def _trigrams(text: str) -> Set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _terms(self, record) -> Set[bytes]:
+        """term ทั้งหมดของ record: token แยกตาม field และ trigram ของทุก field"""
+        view = RecordView(self.codec, memoryview(record))
+        terms = set()
+        for position, field in enumerate(self.fields):
+            text = view.text(field).lower()
+            for token in _TOKEN_PATTERN.findall(text):
+                terms.add(f'{position}:{token}')
+            terms.update(self._trigrams(text))
+        return {self._term_key(term) for term in terms}
+
+    # ---------- สร้าง/อัปเดตดัชนี ----------
+
+    def is_stale(self) -> bool:
+        try:
+            Segment(self.segment_file, self.TERM_SIZE).close()
+        except (OSError, ValueError):
+            return True
+        return super().is_stale()
+
+    def _load(self, start: int = 0):
+        if start == 0:
+            if self._segment is not None:
+                self._segment.close()
+            self._segment = Segment(self.segment_file, self.TERM_SIZE)
+            self._changes = {}
+        changes = self._changes
+        for op, term, index in self._entry.iter_unpack(self._entries.view(start)):
+            changes.setdefault(term, {})[index] = op == b'+'
+
+    def _documents(self) -> Iterator[Tuple[int, Set[bytes]]]:
+        for index, record in self.data.scan():
+            if self.include(record):
+                yield index, self._terms(record)
+
+    def _rebuild(self) -> int:
+        """สร้าง segment ใหม่จากไฟล์ข้อมูลแบบ external sort แล้วเริ่ม journal ว่าง คืนค่าจำนวน record ที่ทำดัชนี"""
+        count = 0
+
+        def documents():
+            nonlocal count
+            for document in self._documents():
+                count += 1
+                yield document
+
+        build_segment(self.segment_file, self.TERM_SIZE, documents())
+        self._record_count = len(self.data)
+        self._replace(())
+        return count
+
+    def _merge(self):
+        """รวม journal เข้า segment ใหม่แล้วเริ่ม journal ว่าง (เรียกขณะถือล็อก)
+
+        rename segment ใหม่ก่อนแล้วจึงแทนที่ journal ถ้าหยุดระหว่างนั้น journal เดิมที่ใช้กับ segment ใหม่
+        ก็ยังได้ผลเดิม เพราะค่าล่าสุดของแต่ละ record ใน journal ตรงกับข้อมูลที่ segment ใหม่สร้างจากมันอยู่แล้ว
+        """
+        writer = SegmentWriter(self.segment_file, self.TERM_SIZE)
+        try:
+            merge_segments(writer, [self._segment], self._changes)
+        except BaseException:
+            writer.discard()
+            raise
+        writer.commit()
+        self._replace(())
+
+    def _index_record(self, record, index: int):
+        if self.include(record):
+            self.add(index, record)
+
+    def _apply(self, op: bytes, record_index: int, record):
+        terms = self._terms(record)
+        present = op == b'+'
+        with self._locked():
+            # ข้าม term ที่ journal บันทึกสถานะนี้ไว้แล้ว (เช่น process อื่นตามเพิ่ม record นี้ให้ก่อน)
+            terms = [term for term in terms
+                     if self._changes.get(term, {}).get(record_index) is not present]
+            if not terms:
+                return
+            self._append_entry(
+                b''.join(self._entry.pack(op, term, record_index) for term in terms), record_index
+            )
+            for term in terms:
+                self._changes.setdefault(term, {})[record_index] = present
+            if self._entry_count >= self.MERGE_ENTRIES:
+                self._merge()
+
+    def add(self, record_index: int, record):
+        """เพิ่มข้อความของ record เข้าดัชนี"""
+        self._apply(b'+', record_index, record)
+
+    def remove(self, record_index: int, record):
+        """ลบข้อความของ record ออกจากดัชนี (ต้องเรียกก่อนเขียนทับ record)"""
+        self._apply(b'-', record_index, record)
+
+    def close(self):
+        super().close()
+        if self._segment is not None:
+            self._segment.close()
+
+    # ---------- ค้นหา ----------
+
+    def _postings(self, segment: Segment, term: str) -> Postings:
+        key = self._term_key(term)
+        # copy การเปลี่ยนแปลงของ term ไว้ก่อน (thread อื่นอาจเขียน journal ระหว่างค้นหา)
+        return Postings(segment.find(key), dict(self._changes.get(key, ())))
+
+    @metrics.operation()
+    def search(self, keyword: str) -> Optional[List[int]]:
+        """หา index ของ record ที่มี keyword อยู่ใน field ใดก็ได้ เรียงตามความเกี่ยวข้อง
+
+        คืนค่า None ถ้า keyword สั้นกว่า 3 ตัวอักษร (ใช้ trigram ไม่ได้ ให้ไล่ทั้งไฟล์แทน)
+        """
+        keyword = keyword.lower()
+        grams = self._trigrams(keyword)
+        if not grams:
+            return None
+
+        self._sync()
+        segment = self._segment
+
+        # candidate = record ที่มีครบทุก trigram ของ keyword: เริ่มจาก posting list ที่สั้นที่สุด
+        # แล้วตัดด้วย posting list ที่เหลือทีละตัว (ถอดรหัสเฉพาะ block ที่มี candidate)
+        postings = sorted((self._postings(segment, gram) for gram in grams), key=len)
+        candidates = postings[0].values()
+        for posting in postings[1:]:
+            if not candidates:
+                return []
+            candidates = posting.intersect(candidates)
+
+        # คะแนน: keyword ตรงกับคำทั้งคำใน field แรกได้คะแนนมากกว่า field ถัดไป
+        scores = dict.fromkeys(candidates, 0)
+        weight = len(self.fields)
+        tokens = _TOKEN_PATTERN.findall(keyword)
+        for position in range(len(self.fields)):
+            for token in tokens:
+                for index in self._postings(segment, f'{position}:{token}').intersect(candidates):
+                    scores[index] += weight - position
+
+        # ตรวจกับข้อมูลจริง (trigram ครบไม่ได้แปลว่าเป็น substring เสมอไป)
+        # field ที่เป็น ASCII ล้วนเทียบกับ byte ดิบได้เลยโดยไม่ต้องแปลงเป็น str
+        # keyword ที่เป็นคำเดียวทั้งคำ: record ที่ได้คะแนนจาก token นั้นมี keyword อยู่แน่นอน ไม่ต้องเทียบซ้ำ
+        whole_word = tokens == [keyword]
+        needle = keyword.encode('utf-8') if '\x00' not in keyword else None
+        fields = [(self.codec.offsets[field], self.codec.offsets[field] + self.codec.widths[field])
+                  for field in self.fields]
+        results = []
+        for index, record in self.data.get_many(candidates):
+            if not self.include(record):
+                continue
+            if whole_word and scores[index]:
+                results.append(index)
+                continue
+            for start, end in fields:
+                raw = bytes(record[start:end])
+                if needle is not None and raw.isascii():
+                    found = needle in raw.lower()
+                else:
+                    found = keyword in raw.decode('utf-8').rstrip('\x00').lower()
+                if found:
+                    results.append(index)
+                    break
+
+        results.sort(key=lambda index: (-scores[index], index))
+        return results
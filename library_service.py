@@ -0,0 +1,862 @@
+import datetime
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from record_codec import RecordView
+from record_store import RecordStore
+from compaction import CompactResult, compact_library
+from file_format import open_store
+from locks import InUseError, UsageLock
+from scanner import count_by, scan_rows, scan_views
+from indexes import index_join
+from schema import PROGRAMS
+from sequence import IdSequence, sequence_filename
+from wal import Transaction, WriteAheadLog
+from metrics import metrics
+
+
+# ========== ข้อผิดพลาด ==========
+
+class LibraryError(Exception):
+    """ข้อผิดพลาดของระบบห้องสมุด (ข้อความเป็นภาษาไทย แสดงให้ผู้ใช้ได้ทันที)"""
+
+
+class ValidationError(LibraryError):
+    """ข้อมูลที่ส่งมาไม่ครบหรือไม่ถูกต้อง"""
+
+
+class NotFoundError(LibraryError):
+    """ไม่พบหนังสือ สมาชิก หรือรายการยืมที่ระบุ"""
+
+
+class ConflictError(LibraryError):
+    """ทำรายการไม่ได้เพราะสถานะปัจจุบัน เช่น หนังสือถูกยืมอยู่ หรือยืมเกินจำนวน"""
+
+
+# ========== ผลลัพธ์ ==========
+
+class Book(NamedTuple):
+    id: str
+    title: str
+    author: str
+    year: str
+    available: bool
+
+
+class Member(NamedTuple):
+    id: str
+    name: str
+    student_id: str
+    phone: str
+    join_date: str
+    active: bool
+
+
+class Loan(NamedTuple):
+    id: str
+    book_id: str
+    member_id: str
+    borrow_date: datetime.date
+    due_date: datetime.date
+
+
+class ActiveLoan(NamedTuple):
+    """รายการยืมที่ยังไม่คืน พร้อมหนังสือและสมาชิก"""
+    loan: Loan
+    book: Book
+    member: Member
+
+
+class ReturnItem(NamedTuple):
+    """หนังสือที่จะคืน/คืนแล้ว พร้อมค่าปรับ (member เป็น None ถ้าสมาชิกถูกลบไปแล้ว)"""
+    loan: Loan
+    book: Optional[Book]
+    member: Optional[Member]
+    days_late: int
+    fine: int
+
+
+class Stats(NamedTuple):
+    total_books: int
+    available_books: int
+    active_members: int
+    active_borrows: int
+
+
+class CompactReport(NamedTuple):
+    files: List[CompactResult]
+    indexes: List[Tuple[str, int]]  # ผลของ rebuild_indexes() หลังบีบอัด
+
+
+class LibraryService:
+    """ตรรกะทั้งหมดของระบบห้องสมุด (Binary File, Fixed-Length Records) โดยไม่มี input()/print()
+
+    ทุกเมธอดคืนค่าเป็น NamedTuple และแจ้งข้อผิดพลาดด้วย LibraryError
+    เมนูบน terminal (test2.SimpleLibrary) งานแบบ batch หรือ server เรียกใช้ชุดเดียวกันนี้
+    """
+
+    MAX_BORROW_LIMIT = 3    # จำนวนหนังสือที่ยืมได้สูงสุดต่อคน
+    LOAN_DAYS = 7           # จำนวนวันที่ยืมได้
+    FINE_PER_DAY = 10       # ค่าปรับต่อวัน (บาท)
+
+    # การตั้งค่า ID (สามารถแก้ไขได้)
+    BOOK_ID_START = 1       # เลขเริ่มต้นสำหรับหนังสือ
+    MEMBER_ID_START = 1     # เลขเริ่มต้นสำหรับสมาชิก
+    BORROW_ID_START = 1     # เลขเริ่มต้นสำหรับรายการยืม
+    # layout ของ record, ชนิดของ ID และดัชนีประกาศไว้ใน schema.py (PROGRAMS['test2'])
+    PROGRAM = PROGRAMS['test2']
+    ID_LENGTH = PROGRAM.id_digits   # จำนวนหลักที่แสดงของ ID (3 หลัก = 001, 002, 003, ... ID ที่ยาวกว่าแสดงเต็ม)
+    ID_TYPE = PROGRAM.id_type       # ID เก็บเป็นเลขฐานสอง 'I' = uint32
+
+    def __init__(self, directory: str = ''):
+        tables = self.PROGRAM.tables
+        # schema -> codec ที่ compile format ไว้ครั้งเดียว (struct.Struct)
+        self.book_schema = tables['books'].schema
+        self.member_schema = tables['members'].schema
+        self.borrow_schema = tables['borrows'].schema
+        self.book_codec = self.book_schema.codec
+        self.member_codec = self.member_schema.codec
+        self.borrow_codec = self.borrow_schema.codec
+        self.book_format = self.book_codec.format
+        self.member_format = self.member_codec.format
+        self.borrow_format = self.borrow_codec.format
+        # ตัวนับสถิติ (record เดียว int64 x 4) ลำดับ field ตรงกับ Stats
+        self.stats_codec = tables['counters'].schema.codec
+
+        # คำนวณขนาด record
+        self.book_size = self.book_codec.size
+        self.member_size = self.member_codec.size
+        self.borrow_size = self.borrow_codec.size
+        self.id_size = self.book_codec.widths[0]
+        self.max_id = self.PROGRAM.max_id  # ID มากที่สุดที่เก็บได้
+
+        # ชื่อไฟล์ (directory ว่าง = โฟลเดอร์ปัจจุบัน)
+        self.books_file = os.path.join(directory, tables['books'].filename)
+        self.members_file = os.path.join(directory, tables['members'].filename)
+        self.borrows_file = os.path.join(directory, tables['borrows'].filename)
+        self.archive_file = os.path.join(directory, tables['archive'].filename)
+        self.wal_file = os.path.join(directory, self.PROGRAM.wal)
+        self.counters_file = os.path.join(directory, tables['counters'].filename)
+
+        # ถือล็อกการเปิดใช้ไว้ก่อนเปิดไฟล์ข้อมูล (รอถ้า process อื่นกำลังบีบอัดไฟล์อยู่)
+        self.usage = UsageLock(self.wal_file)
+
+        # เปิดไฟล์ข้อมูลผ่าน mmap ครั้งเดียวต่อ instance (สร้างไฟล์พร้อม header ถ้ายังไม่มี
+        # ไฟล์รุ่นก่อนหรือ layout ไม่ตรงกับ codec จะ raise FormatError ให้แปลงด้วย migrate.py)
+        self.books = open_store(self.books_file, self.book_codec)
+        self.members = open_store(self.members_file, self.member_codec)
+        self.borrows = open_store(self.borrows_file, self.borrow_codec)
+        self.counters = open_store(self.counters_file, self.stats_codec)
+        self._register_lock = threading.Lock()  # ตรวจรหัสนักศึกษาซ้ำ + เพิ่มสมาชิก ทีละ thread
+
+        # ทุกการเขียนผ่าน WAL ก่อน (เขียนซ้ำ transaction ที่ค้างอยู่ก่อนสร้างดัชนี)
+        # ตัวนับสถิติอยู่ใน WAL เดียวกัน จึงเปลี่ยนพร้อมข้อมูลใน transaction เดียว
+        self.wal = WriteAheadLog(self.wal_file, [self.books, self.members, self.borrows, self.counters])
+        self.recovered = self.wal.replay()  # จำนวน transaction ที่กู้คืนตอนเปิด
+
+        # ตัวนับ ID ถัดไป (books.seq, members.seq, borrows.seq)
+        self.book_ids = IdSequence(sequence_filename(self.books_file), self.books,
+                                   self.ID_TYPE, start=self.BOOK_ID_START)
+        self.member_ids = IdSequence(sequence_filename(self.members_file), self.members,
+                                     self.ID_TYPE, start=self.MEMBER_ID_START)
+        self.borrow_ids = IdSequence(sequence_filename(self.borrows_file), self.borrows,
+                                     self.ID_TYPE, start=self.BORROW_ID_START)
+
+        # ดัชนีหลัก ID -> ตำแหน่ง record (books.idx, members.idx, borrows.idx) เทียบ ID เป็น int
+        self.book_index = self.book_schema.open_index('id', self.books_file, self.books)
+        self.member_index = self.member_schema.open_index('id', self.members_file, self.members)
+        self.borrow_index = self.borrow_schema.open_index('id', self.borrows_file, self.borrows)
+
+        # ดัชนีค้นหาข้อความ ชื่อหนังสือ/ผู้แต่ง (books_text.seg + journal books_text.idx)
+        self.text_index = self.book_schema.open_index('text', self.books_file, self.books)
+
+        # ดัชนีรอง รหัสนักศึกษา -> สมาชิก (เฉพาะสมาชิกที่ยังไม่ถูกลบ)
+        self.student_index = self.member_schema.open_index('student', self.members_file, self.members)
+
+        # ดัชนีรอง รายการยืมที่ยังไม่คืน แยกตามสมาชิกและตามหนังสือ
+        self.active_by_member = self.borrow_schema.open_index('member', self.borrows_file, self.borrows)
+        self.active_by_book = self.borrow_schema.open_index('book', self.borrows_file, self.borrows)
+
+        self._init_stats()
+        self._closed = False
+
+    def _init_stats(self):
+        """นับสถิติจากไฟล์ข้อมูลครั้งแรก (หรือเมื่อไฟล์ library.cnt หาย)"""
+        with self.counters.locks.append():
+            if len(self.counters) == 0:
+                self.wal.write(self.counters, 0, self.stats_codec.pack(*self._scan_stats()))
+
+    def _count(self, txn: Transaction, total_books: int = 0, available_books: int = 0,
+               active_members: int = 0, active_borrows: int = 0):
+        """ปรับตัวนับสถิติใน transaction เดียวกับการเปลี่ยนข้อมูล"""
+        txn.add(self.counters, 0, (total_books, available_books, active_members, active_borrows))
+
+    def append_records(self, store: RecordStore, chunk: bytes, counts: Dict[str, int]) -> int:
+        """ต่อท้าย record หลายตัว (ต่อกันใน chunk) พร้อมปรับตัวนับสถิติใน transaction เดียว
+        คืนค่า index ของ record แรก (สำหรับงานจำนวนมาก เช่น นำเข้าข้อมูล ดัชนีต้อง rebuild เองภายหลัง)
+
+        counts คือจำนวนที่เปลี่ยนของตัวนับ (ชื่อตาม Stats) รวมทั้ง chunk แล้ว เช่น {'active_members': 100}
+        """
+        with self.wal.transaction() as txn:
+            txn.append(store, chunk)
+            self._count(txn, **counts)
+        return txn.first_index(store)
+
+    @contextmanager
+    def registration_lock(self) -> Iterator[None]:
+        """ล็อกการสมัครสมาชิก (ระหว่าง thread และระหว่าง process ผ่านล็อกการต่อท้าย members.dat)
+        ถือไว้ตั้งแต่ตรวจรหัสนักศึกษาซ้ำจนเพิ่ม record และดัชนีเสร็จ"""
+        with self._register_lock, self.members.locks.append():
+            yield
+
+    def student_ids(self) -> Set[bytes]:
+        """รหัสนักศึกษา (bytes ตามที่เก็บในไฟล์) ของสมาชิกที่ยังไม่ถูกลบทั้งหมด อ่านไฟล์สมาชิกรอบเดียว
+
+        ใช้ตรวจรหัสซ้ำของงานจำนวนมากแทนการค้นดัชนีทีละรหัส (เรียกขณะถือ registration_lock())
+        """
+        student_id, deleted = self.member_codec.index('student_id'), self.member_codec.index('deleted')
+        return {row[student_id] for row in scan_rows(self.members, self.member_codec) if row[deleted] == b'0'}
+
+    def _indexes(self) -> list:
+        """ดัชนีทั้งหมดของ instance นี้"""
+        return [self.book_index, self.member_index, self.borrow_index,
+                self.student_index, self.active_by_member, self.active_by_book, self.text_index]
+
+    def close(self):
+        """เขียนทุกอย่างใน WAL ลงไฟล์ข้อมูล ล้าง WAL แล้วปิดทุกไฟล์ (เรียกก่อนปิดโปรแกรม เรียกซ้ำได้)"""
+        if self._closed:
+            return
+        self._closed = True
+        self.wal.close()
+        for sequence in (self.book_ids, self.member_ids, self.borrow_ids):
+            sequence.release()  # คืน ID ที่จองไว้แต่ยังไม่ได้ใช้
+        for index in self._indexes():
+            index.close()
+        for store in (self.books, self.members, self.borrows, self.counters):
+            store.close()
+        # ปลดล็อกการเปิดใช้เป็นลำดับสุดท้าย (process ที่รอบีบอัดไฟล์จะเริ่มหลังปิดไฟล์ทั้งหมดแล้ว)
+        self.usage.close()
+
+    def _encode(self, text: str, length: int) -> bytes:
+        """แปลง string -> bytes ความยาวคงที่"""
+        return text.encode('utf-8')[:length].ljust(length, b'\x00')
+
+    def _decode(self, data: bytes) -> str:
+        """แปลง bytes -> string"""
+        return data.decode('utf-8').rstrip('\x00')
+
+    def format_id(self, number: int) -> str:
+        """แปลงเลข ID เป็นข้อความตามจำนวนหลัก (1 -> 001)"""
+        return f"{number:0{self.ID_LENGTH}d}"
+
+    def _parse_id(self, text: str) -> Optional[int]:
+        """แปลง ID ที่ผู้ใช้ระบุ (001 หรือ 1) เป็นเลข (None ถ้าไม่ใช่ ID ที่เก็บได้)"""
+        text = text.strip()
+        if not (text.isascii() and text.isdigit()):
+            return None
+        number = int(text)
+        return number if number <= self.max_id else None
+
+    def _reserve_ids(self, sequence: IdSequence, count: int = 1) -> int:
+        """จอง ID ใหม่ count ตัว (Auto Increment จากไฟล์ .seq) คืนค่า ID แรก"""
+        try:
+            return sequence.reserve(count, self.max_id)
+        except OverflowError:
+            raise ConflictError(f"ID เต็มแล้ว (เก็บได้ถึง {self.max_id:,})")
+
+    def _due_date(self, borrow_date: datetime.date) -> datetime.date:
+        return borrow_date + datetime.timedelta(days=self.LOAN_DAYS)
+
+    # ---------- แปลง record -> ผลลัพธ์ ----------
+
+    def _book(self, book) -> Book:
+        """Row หรือ RecordView ของหนังสือ -> Book"""
+        if isinstance(book, RecordView):
+            return Book(self.format_id(book[0]), book.text(1), book.text(2), book.text(3), book[4] == b'A')
+        return Book(self.format_id(book[0]), self._decode(book[1]), self._decode(book[2]),
+                    self._decode(book[3]), book[4] == b'A')
+
+    def _member(self, member) -> Member:
+        """Row หรือ RecordView ของสมาชิก -> Member"""
+        if isinstance(member, RecordView):
+            return Member(self.format_id(member[0]), member.text(1), member.text(2), member.text(3),
+                          member.text(4), member[5] == b'A')
+        return Member(self.format_id(member[0]), self._decode(member[1]), self._decode(member[2]),
+                      self._decode(member[3]), self._decode(member[4]), member[5] == b'A')
+
+    def _loan(self, borrow) -> Loan:
+        """Row หรือ RecordView ของรายการยืม -> Loan"""
+        date_text = borrow.text(3) if isinstance(borrow, RecordView) else self._decode(borrow[3])
+        borrow_date = datetime.datetime.strptime(date_text, "%Y-%m-%d").date()
+        return Loan(self.format_id(borrow[0]), self.format_id(borrow[1]), self.format_id(borrow[2]),
+                    borrow_date, self._due_date(borrow_date))
+
+    # ========== จัดการหนังสือ ==========
+
+    @metrics.operation()
+    def add_book(self, title: str, author: str, year: str) -> str:
+        """เพิ่มหนังสือ คืนค่า ID ของหนังสือใหม่"""
+        title, author, year = title.strip(), author.strip(), year.strip()
+        if not title or not author or not year:
+            raise ValidationError("กรุณากรอกข้อมูลให้ครบ")
+
+        book_id = self._reserve_ids(self.book_ids)
+        data = self.book_codec.pack(
+            book_id,
+            self._encode(title, 100),
+            self._encode(author, 50),
+            self._encode(year, 4),
+            b'A',  # Available
+            b'0'   # Not deleted
+        )
+
+        with self.wal.transaction() as txn:
+            txn.append(self.books, data)
+            self._count(txn, total_books=1, available_books=1)
+        index = txn.first_index(self.books)
+        self.book_index.add(book_id, index)
+        self.text_index.add(index, data)
+        return self.format_id(book_id)
+
+    def has_books(self) -> bool:
+        return len(self.books) > 0
+
+    @metrics.operation()
+    def list_books(self) -> Iterator[Book]:
+        """หนังสือทั้งหมดที่ยังไม่ถูกลบ ตามลำดับในไฟล์"""
+        # กรองเฉพาะที่ไม่ถูกลบจาก byte ดิบ แล้วค่อยแปลงเป็น Book
+        for book in scan_views(self.books, self.book_codec, deleted=b'0'):
+            yield self._book(book)
+
+    @metrics.operation()
+    def search_books(self, keyword: str) -> List[Book]:
+        """ค้นหาจากชื่อหรือผู้แต่ง (ไม่สนตัวพิมพ์เล็ก-ใหญ่)"""
+        keyword = keyword.strip().lower()
+
+        # ใช้ดัชนีข้อความ (เรียงตามความเกี่ยวข้อง) ถ้า keyword สั้นเกินไปจึงไล่ทั้งไฟล์
+        matches = self.text_index.search(keyword)
+        if matches is not None:
+            return [self._book(self.book_codec.view(self.books.get(index))) for index in matches]
+        return [
+            self._book(book) for book in scan_views(self.books, self.book_codec, deleted=b'0')
+            if keyword in book.text(1).lower() or keyword in book.text(2).lower()
+        ]
+
+    @metrics.operation()
+    def get_book(self, book_id: str) -> Optional[Book]:
+        """หนังสือจาก ID (None ถ้าไม่พบหรือถูกลบแล้ว)"""
+        book = self._find_book(book_id)
+        return self._book(book) if book else None
+
+    @metrics.operation()
+    def update_book(self, book_id: str, title: str = '', author: str = '', year: str = '') -> Book:
+        """แก้ไขข้อมูลหนังสือ (ค่าว่าง = ไม่เปลี่ยน) คืนค่าข้อมูลหลังแก้ไข"""
+        book_index = self._find_book_index(book_id)
+        if book_index == -1:
+            raise NotFoundError("ไม่พบหนังสือ")
+
+        with self.books.locks.records([book_index]):
+            # อ่านใหม่ภายใต้ล็อก terminal อื่นอาจยืมหรือลบเล่มนี้ไปแล้ว
+            book = self._get_book_at_index(book_index)
+            if book[5] != b'0':
+                raise NotFoundError("หนังสือถูกลบไปแล้ว")
+
+            updated_book = self.book_codec.pack(
+                book[0],
+                self._encode(title.strip(), 100) if title.strip() else book[1],
+                self._encode(author.strip(), 50) if author.strip() else book[2],
+                self._encode(year.strip(), 4) if year.strip() else book[3],
+                book[4], book[5]
+            )
+
+            self.text_index.remove(book_index, self.books.get(book_index))
+            self.wal.write(self.books, book_index, updated_book)
+            self.text_index.add(book_index, updated_book)
+
+        return self._book(self.book_codec.unpack(updated_book))
+
+    @metrics.operation()
+    def delete_book(self, book_id: str):
+        """ลบหนังสือ (Soft Delete) ลบไม่ได้ถ้าถูกยืมอยู่"""
+        book_index = self._find_book_index(book_id)
+        if book_index == -1:
+            raise NotFoundError("ไม่พบหนังสือ")
+
+        with self.books.locks.records([book_index]):
+            book = self._get_book_at_index(book_index)
+            if book[4] == b'B' or book[5] != b'0':
+                raise ConflictError("หนังสือถูกยืมหรือถูกลบไปแล้ว ไม่สามารถลบได้")
+
+            deleted_book = self.book_codec.pack(
+                book[0], book[1], book[2], book[3], book[4], b'1'
+            )
+
+            with self.wal.transaction() as txn:
+                txn.write(self.books, book_index, deleted_book)
+                self._count(txn, total_books=-1, available_books=-1)  # ลบได้เฉพาะเล่มที่ว่าง
+            self.text_index.remove(book_index, deleted_book)
+
+    @metrics.operation()
+    def _find_book_index(self, book_id: str) -> int:
+        """หา index ของหนังสือ (ผ่านดัชนี books.idx)"""
+        number = self._parse_id(book_id)
+        if number is None:
+            return -1
+        index = self.book_index.lookup(number)
+        book = self._get_book_at_index(index)
+        if book and book[0] == number and book[5] == b'0':
+            return index
+        return -1
+
+    def _get_book_at_index(self, index: int) -> Optional[Tuple]:
+        """ดึงข้อมูลหนังสือจาก index"""
+        data = self.books.get(index)
+        if data is None:
+            return None
+        return self.book_codec.unpack(data)
+
+    # ========== จัดการสมาชิก ==========
+
+    @metrics.operation()
+    def add_member(self, name: str, student_id: str, phone: str = '') -> str:
+        """เพิ่มสมาชิก คืนค่า ID ของสมาชิกใหม่"""
+        name, student_id, phone = name.strip(), student_id.strip(), phone.strip()
+        if not name:
+            raise ValidationError("กรุณากรอกชื่อ")
+
+        if not student_id:
+            raise ValidationError("กรุณากรอกรหัสนักศึกษา")
+
+        # ตรวจรหัสนักศึกษาซ้ำจนถึงเพิ่มเข้าดัชนีภายใต้ registration_lock()
+        # terminal หรือ thread อื่นจึงสมัครรหัสเดียวกันซ้อนไม่ได้
+        with self.registration_lock():
+            if self._check_student_id_exists(student_id):
+                raise ConflictError("รหัสนักศึกษานี้มีในระบบแล้ว")
+
+            member_id = self._reserve_ids(self.member_ids)
+            join_date = datetime.date.today().strftime("%Y-%m-%d")
+
+            data = self.member_codec.pack(
+                member_id,
+                self._encode(name, 50),
+                self._encode(student_id, 10),
+                self._encode(phone, 15),
+                self._encode(join_date, 10),
+                b'A', b'0'
+            )
+
+            with self.wal.transaction() as txn:
+                txn.append(self.members, data)
+                self._count(txn, active_members=1)
+            index = txn.first_index(self.members)
+            self.member_index.add(member_id, index)
+            self.student_index.add(self._encode(student_id, 10), index)
+        return self.format_id(member_id)
+
+    @metrics.operation()
+    def _check_student_id_exists(self, student_id: str) -> bool:
+        """ตรวจสอบว่ารหัสนักศึกษามีในระบบแล้วหรือไม่"""
+        return self._find_member_index_by_student_id(student_id) != -1
+
+    def _find_member_index_by_student_id(self, student_id: str) -> int:
+        """หา index ของสมาชิกจากรหัสนักศึกษา (ผ่านดัชนี members_student.idx)"""
+        for index in self.student_index.lookup(self._encode(student_id, 10)):
+            member = self._get_member_at_index(index)
+            if member and member[6] == b'0' and self._decode(member[2]) == student_id:
+                return index
+        return -1
+
+    def has_members(self) -> bool:
+        return len(self.members) > 0
+
+    @metrics.operation()
+    def list_members(self) -> Iterator[Member]:
+        """สมาชิกทั้งหมดที่ยังไม่ถูกลบ ตามลำดับในไฟล์"""
+        for member in scan_views(self.members, self.member_codec, deleted=b'0'):
+            yield self._member(member)
+
+    @metrics.operation()
+    def get_member(self, member_id: str) -> Optional[Member]:
+        """สมาชิกจาก ID (None ถ้าไม่พบหรือถูกลบแล้ว)"""
+        member = self._find_member(member_id)
+        return self._member(member) if member else None
+
+    @metrics.operation()
+    def delete_member(self, member_id: str):
+        """ลบสมาชิก ลบไม่ได้ถ้ายังยืมหนังสืออยู่"""
+        member_index = self._find_member_index(member_id)
+        if member_index == -1:
+            raise NotFoundError("ไม่พบสมาชิก")
+
+        with self.members.locks.records([member_index]):
+            if self.count_active_borrows(member_id) > 0:
+                raise ConflictError("สมาชิกคนนี้กำลังยืมหนังสืออยู่ ไม่สามารถลบได้")
+
+            member = self._get_member_at_index(member_index)
+            if member[6] != b'0':
+                raise NotFoundError("ไม่พบสมาชิก")  # ถูกลบไปแล้วระหว่างรอล็อก
+            deleted_member = self.member_codec.pack(
+                member[0], member[1], member[2], member[3], member[4], member[5], b'1'
+            )
+
+            with self.wal.transaction() as txn:
+                txn.write(self.members, member_index, deleted_member)
+                if member[5] == b'A':
+                    self._count(txn, active_members=-1)
+            self.student_index.remove(member[2], member_index)
+
+    @metrics.operation()
+    def _find_member_index(self, member_id: str) -> int:
+        """หา index ของสมาชิก (ผ่านดัชนี members.idx)"""
+        number = self._parse_id(member_id)
+        if number is None:
+            return -1
+        index = self.member_index.lookup(number)
+        member = self._get_member_at_index(index)
+        if member and member[0] == number and member[6] == b'0':
+            return index
+        return -1
+
+    def _get_member_at_index(self, index: int) -> Optional[Tuple]:
+        """ดึงข้อมูลสมาชิกจาก index"""
+        data = self.members.get(index)
+        if data is None:
+            return None
+        return self.member_codec.unpack(data)
+
+    @metrics.operation()
+    def count_active_borrows(self, member_id: str) -> int:
+        """นับจำนวนหนังสือที่สมาชิกกำลังยืมอยู่ (ผ่านดัชนี borrows_member.idx)"""
+        number = self._parse_id(member_id)
+        if number is None:
+            return 0
+        count = 0
+        for index in self.active_by_member.lookup(number):
+            borrow = self.borrow_codec.unpack(self.borrows.get(index))
+            if borrow[2] == number and borrow[5] == b'B' and borrow[6] == b'0':
+                count += 1
+        return count
+
+    # ========== ยืม-คืนหนังสือ ==========
+
+    @metrics.operation()
+    def check_borrow(self, member_id: str, book_ids: Sequence[str]) -> List[Book]:
+        """ตรวจว่ายืมหนังสือชุดนี้ได้หรือไม่ (ยังไม่เขียนอะไร) คืนค่าหนังสือตามลำดับที่ระบุ"""
+        self._require_borrower(member_id, book_ids)
+        return [self._book(book) for _, _, book in self._check_books(book_ids)]
+
+    @metrics.operation()
+    def _require_borrower(self, member_id: str, book_ids: Sequence[str]) -> Member:
+        member = self.get_member(member_id)
+        if not member:
+            raise NotFoundError("ไม่พบสมาชิก")
+
+        if not member.active:
+            raise ConflictError("สมาชิกถูกระงับ ไม่สามารถยืมได้")
+
+        if not book_ids:
+            raise ValidationError("กรุณาระบุ ID หนังสือ")
+
+        current_borrows = self.count_active_borrows(member_id)
+        if current_borrows + len(book_ids) > self.MAX_BORROW_LIMIT:
+            raise ConflictError(f"ไม่สามารถยืมได้ {len(book_ids)} เล่ม "
+                                f"(ยืมได้อีก {self.MAX_BORROW_LIMIT - current_borrows} เล่ม)")
+        return member
+
+    @metrics.operation()
+    def _check_books(self, book_ids: Sequence[str]) -> List[Tuple[str, int, Tuple]]:
+        """ตรวจสอบหนังสือทั้งหมดผ่านดัชนี คืนค่า (book_id, index ของหนังสือ, ข้อมูลหนังสือ)"""
+        books = []
+        for book_id in book_ids:
+            # ID เดียวกันพิมพ์ได้หลายแบบ (001 และ 1) เทียบกันในรูปมาตรฐาน
+            number = self._parse_id(book_id)
+            book_id = book_id.strip() if number is None else self.format_id(number)
+            if any(book_id == selected[0] for selected in books):
+                raise ValidationError(f"ระบุหนังสือ ID: {book_id} ซ้ำ")
+
+            book_index = self._find_book_index(book_id)
+            book = self._get_book_at_index(book_index) if book_index != -1 else None
+            if not book:
+                raise NotFoundError(f"ไม่พบหนังสือ ID: {book_id}")
+
+            if book[4] != b'A':
+                raise ConflictError(f"หนังสือ '{self._decode(book[1])}' (ID: {book_id}) ถูกยืมแล้ว")
+
+            books.append((book_id, book_index, book))
+        return books
+
+    @metrics.operation()
+    def borrow(self, member_id: str, book_ids: Sequence[str],
+               borrow_date: Optional[datetime.date] = None) -> List[Loan]:
+        """ยืมหนังสือหลายเล่มเป็นชุดเดียว (ทั้งหมดหรือไม่มีเลย) คืนค่ารายการยืมที่สร้าง
+
+        รายการยืมทั้งชุด (เขียนครั้งเดียว) และสถานะหนังสือทุกเล่มอยู่ใน transaction เดียวของ WAL
+        ถ้าหยุดกลางทางจึงไม่มีหนังสือที่ถูกยืมโดยไม่มีรายการยืม
+        ล็อกหนังสือทุกเล่มและสมาชิกไว้แล้วตรวจซ้ำ terminal อื่นจึงยืมเล่มเดียวกันซ้อนไม่ได้
+        """
+        self._require_borrower(member_id, book_ids)
+        books = self._check_books(book_ids)
+        borrow_date = borrow_date or datetime.date.today()
+
+        member_index = self._find_member_index(member_id)
+        if member_index == -1:
+            raise NotFoundError("ไม่พบสมาชิก")
+        with self.books.locks.records(book_index for _, book_index, _ in books), \
+                self.members.locks.records([member_index]):
+            # อ่านสมาชิกซ้ำภายใต้ล็อก (terminal อื่นอาจลบหรือระงับไปแล้ว)
+            member = self._get_member_at_index(member_index)
+            if member[6] != b'0':
+                raise NotFoundError("ไม่พบสมาชิก")
+            if member[5] != b'A':
+                raise ConflictError("สมาชิกถูกระงับ ไม่สามารถยืมได้")
+
+            books = [(book_id, book_index, self._get_book_at_index(book_index))
+                     for book_id, book_index, _ in books]
+            for book_id, _, book in books:
+                if book[4] != b'A' or book[5] != b'0':
+                    raise ConflictError(f"หนังสือ '{self._decode(book[1])}' (ID: {book_id}) ถูกยืมไปแล้ว")
+
+            if self.count_active_borrows(member_id) + len(books) > self.MAX_BORROW_LIMIT:
+                raise ConflictError(f"สมาชิกยืมเกิน {self.MAX_BORROW_LIMIT} เล่ม")
+
+            return self._write_borrow_batch(member_id, books, borrow_date)
+
+    @metrics.operation()
+    def _write_borrow_batch(self, member_id: str, books: List[Tuple[str, int, Tuple]],
+                            borrow_date: datetime.date) -> List[Loan]:
+        """เขียนรายการยืมและสถานะหนังสือ (เรียกขณะถือล็อกจาก borrow)"""
+        # จอง ID รายการยืมทีเดียวทั้งชุด
+        first_id = self._reserve_ids(self.borrow_ids, len(books))
+        member_number = self._parse_id(member_id)
+        member_id = self.format_id(member_number)
+        date_text = borrow_date.strftime("%Y-%m-%d")
+
+        records = bytearray()
+        for offset, (_, _, book) in enumerate(books):
+            records += self.borrow_codec.pack(
+                first_id + offset,
+                book[0],
+                member_number,
+                self._encode(date_text, 10),
+                self._encode("", 10),
+                b'B', b'0'
+            )
+
+        with self.wal.transaction() as txn:
+            txn.append(self.borrows, bytes(records))
+
+            # เปลี่ยนสถานะหนังสือทั้งหมด เรียงตามตำแหน่งในไฟล์
+            for _, book_index, book in sorted(books, key=lambda selected: selected[1]):
+                txn.write(self.books, book_index, self.book_codec.pack(
+                    book[0], book[1], book[2], book[3], b'B', book[5]
+                ))
+            self._count(txn, available_books=-len(books), active_borrows=len(books))
+
+        first_index = txn.first_index(self.borrows)
+        loans = []
+        for offset, (book_id, _, book) in enumerate(books):
+            index = first_index + offset
+            self.borrow_index.add(first_id + offset, index)
+            self.active_by_member.add(member_number, index)
+            self.active_by_book.add(book[0], index)
+            loans.append(Loan(self.format_id(first_id + offset), book_id, member_id,
+                              borrow_date, self._due_date(borrow_date)))
+
+        return loans
+
+    @metrics.operation()
+    def check_return(self, book_ids: Sequence[str],
+                     return_date: Optional[datetime.date] = None) -> List[ReturnItem]:
+        """รายการยืมของหนังสือที่จะคืนพร้อมค่าปรับ (ยังไม่เขียนอะไร)"""
+        return [item for item, _, _ in self._check_returns(book_ids, return_date)]
+
+    @metrics.operation()
+    def _check_returns(self, book_ids: Sequence[str], return_date: Optional[datetime.date]
+                       ) -> List[Tuple[ReturnItem, int, Tuple]]:
+        """คืนค่า (ReturnItem, index ของรายการยืม, ข้อมูลรายการยืม) ของหนังสือแต่ละเล่ม"""
+        if not book_ids:
+            raise ValidationError("กรุณาระบุ ID หนังสือ")
+
+        return_date = return_date or datetime.date.today()
+        items = []
+        seen = set()
+        for book_id in book_ids:
+            # ID เดียวกันพิมพ์ได้หลายแบบ (001 และ 1) เทียบกันในรูปมาตรฐาน
+            number = self._parse_id(book_id)
+            book_id = book_id.strip() if number is None else self.format_id(number)
+            if book_id in seen:
+                raise ValidationError(f"ระบุหนังสือ ID: {book_id} ซ้ำ")
+            seen.add(book_id)
+
+            borrow_record = self._find_active_borrow(book_id)
+            if not borrow_record:
+                raise NotFoundError(f"ไม่พบรายการยืมของหนังสือ ID: {book_id} (อาจคืนแล้ว)")
+
+            index, borrow = borrow_record
+            loan = self._loan(borrow)
+
+            # คำนวณค่าปรับ
+            days_late = (return_date - loan.due_date).days
+            fine = max(0, days_late * self.FINE_PER_DAY)
+
+            item = ReturnItem(loan, self.get_book(book_id), self.get_member(loan.member_id),
+                              days_late, fine)
+            items.append((item, index, borrow))
+        return items
+
+    @metrics.operation()
+    def return_books(self, book_ids: Sequence[str],
+                     return_date: Optional[datetime.date] = None) -> List[ReturnItem]:
+        """คืนหนังสือทีละเล่มหรือหลายเล่มใน transaction เดียว คืนค่ารายการที่คืนพร้อมค่าปรับ"""
+        return_date = return_date or datetime.date.today()
+        items = self._check_returns(book_ids, return_date)
+        date_text = self._encode(return_date.strftime("%Y-%m-%d"), 10)
+
+        # ล็อกหนังสือและรายการยืมไว้ แล้วตรวจซ้ำว่ายังไม่มี terminal อื่นคืนไปก่อน
+        book_indexes = [self._find_book_index(item.loan.book_id) for item, _, _ in items]
+        with self.books.locks.records(index for index in book_indexes if index != -1), \
+                self.borrows.locks.records(index for _, index, _ in items):
+            for item, index, _ in items:
+                if self.borrows.get(index)[-2:] != b'B0':
+                    raise ConflictError(f"หนังสือ ID: {item.loan.book_id} ถูกคืนไปแล้ว")
+
+            # คืนทุกเล่มใน transaction เดียว
+            with self.wal.transaction() as txn:
+                available = 0
+                for item, index, borrow in items:
+                    updated = self.borrow_codec.pack(
+                        borrow[0], borrow[1], borrow[2], borrow[3], date_text, b'R', borrow[6]
+                    )
+                    txn.write(self.borrows, index, updated)
+                    if self._update_book_status(item.loan.book_id, b'A', txn):
+                        available += 1
+                self._count(txn, available_books=available, active_borrows=-len(items))
+
+        for _, index, borrow in items:
+            self.active_by_member.remove(borrow[2], index)
+            self.active_by_book.remove(borrow[1], index)
+
+        return [item for item, _, _ in items]
+
+    def has_borrows(self) -> bool:
+        return len(self.borrows) > 0
+
+    @metrics.operation()
+    def active_loans(self) -> Iterator[ActiveLoan]:
+        """รายการยืมที่ยังไม่คืน (ข้ามรายการที่หนังสือหรือสมาชิกถูกลบไปแล้ว)
+
+        join กับหนังสือและสมาชิกทีละก้อนผ่านดัชนีหลัก (index_join) แทนการค้นทีละรายการ
+        หนังสือ/สมาชิกที่ถูกอ้างถึงหลายครั้งในก้อนเดียวจึงถูกค้นและแปลงครั้งเดียว
+        """
+        # กรองรายการที่คืนแล้ว/ถูกลบจาก byte ดิบ โดยไม่ต้องแปลง record
+        borrows = scan_views(self.borrows, self.borrow_codec, status=b'B', deleted=b'0')
+        rows = index_join(borrows, [
+            (lambda borrow: borrow[1], self.book_index,
+             lambda data: self._book(self.book_codec.view(data)) if data[-1:] == b'0' else None),
+            (lambda borrow: borrow[2], self.member_index,
+             lambda data: self._member(self.member_codec.view(data)) if data[-1:] == b'0' else None),
+        ])
+        for borrow, book, member in rows:
+            yield ActiveLoan(self._loan(borrow), book, member)
+
+    # ========== ฟังก์ชันช่วยเหลือ ==========
+
+    @metrics.operation()
+    def _find_book(self, book_id: str) -> Optional[Tuple]:
+        """หาหนังสือจาก ID"""
+        index = self._find_book_index(book_id)
+        if index == -1:
+            return None
+        return self._get_book_at_index(index)
+
+    @metrics.operation()
+    def _find_member(self, member_id: str) -> Optional[Tuple]:
+        """หาสมาชิกจาก ID"""
+        index = self._find_member_index(member_id)
+        if index == -1:
+            return None
+        return self._get_member_at_index(index)
+
+    @metrics.operation()
+    def _find_active_borrow(self, book_id: str) -> Optional[Tuple[int, Tuple]]:
+        """หารายการยืมที่ยังไม่คืน (ผ่านดัชนี borrows_book.idx)"""
+        number = self._parse_id(book_id)
+        if number is None:
+            return None
+        for index in self.active_by_book.lookup(number):
+            borrow = self.borrow_codec.unpack(self.borrows.get(index))
+            if borrow[1] == number and borrow[5] == b'B' and borrow[6] == b'0':
+                return (index, borrow)
+        return None
+
+    @metrics.operation()
+    def _update_book_status(self, book_id: str, status: bytes, txn: Optional[Transaction] = None) -> bool:
+        """อัปเดตสถานะหนังสือ (ถ้าระบุ txn จะเขียนใน transaction นั้น) คืนค่า False ถ้าไม่พบหนังสือ"""
+        index = self._find_book_index(book_id)
+        if index == -1:
+            return False
+
+        book = self._get_book_at_index(index)
+        updated = self.book_codec.pack(
+            book[0], book[1], book[2], book[3], status, book[5]
+        )
+        if txn is not None:
+            txn.write(self.books, index, updated)
+        else:
+            self.wal.write(self.books, index, updated)
+        return True
+
+    @metrics.operation()
+    def stats(self) -> Stats:
+        """สถิติระบบจากตัวนับที่เก็บไว้ (ไม่อ่านไฟล์ข้อมูล)"""
+        return Stats(*self.stats_codec.unpack(self.counters.get(0)))
+
+    @metrics.operation()
+    def verify_stats(self, repair: bool = True) -> Tuple[Stats, Stats]:
+        """เทียบตัวนับกับการนับใหม่จากไฟล์ข้อมูลทั้งหมด คืนค่า (ตัวนับ, นับใหม่)
+
+        repair=True จะเขียนค่าที่นับใหม่ทับถ้าไม่ตรงกัน
+        (ถือล็อกของไฟล์ตัวนับไว้ process อื่นจึงเปลี่ยนตัวนับระหว่างนับไม่ได้)
+        """
+        with self.counters.locks.append():
+            stored = self.stats()
+            actual = self._scan_stats()
+            if repair and stored != actual:
+                self.wal.write(self.counters, 0, self.stats_codec.pack(*actual))
+        return stored, actual
+
+    @metrics.operation()
+    def _scan_stats(self) -> Stats:
+        """นับสถิติใหม่จากไฟล์ข้อมูลทั้งหมด
+
+        อ่านเฉพาะ byte ของสถานะและการลบของแต่ละ record (key = สถานะต่อด้วยลบ เช่น b'A0')
+        """
+        books = count_by(self.books, self.book_codec, 'status', 'deleted')
+        total_books = sum(n for key, n in books.items() if key[1:] == b'0')
+        total_members = count_by(self.members, self.member_codec, 'status', 'deleted')[b'A0']
+        active_borrows = count_by(self.borrows, self.borrow_codec, 'status', 'deleted')[b'B0']
+        return Stats(total_books, books[b'A0'], total_members, active_borrows)
+
+    # ========== บำรุงรักษา ==========
+
+    @metrics.operation()
+    def rebuild_indexes(self) -> List[Tuple[str, int]]:
+        """สร้างไฟล์ดัชนีใหม่ทั้งหมดจากไฟล์ข้อมูล คืนค่า (ชื่อไฟล์ดัชนี, จำนวนรายการ)"""
+        return [(index.filename, index.rebuild()) for index in self._indexes()]
+
+    @metrics.operation()
+    def compact(self, archive: bool = False) -> CompactReport:
+        """บีบอัดไฟล์ข้อมูล: ตัด record ที่ถูกลบออก (archive=True ย้ายรายการยืมที่คืนแล้วไป
+        borrows_archive.dat ด้วย) แล้วสร้างดัชนีใหม่ ทำได้เมื่อไม่มี terminal อื่นเปิดอยู่เท่านั้น"""
+        try:
+            results, indexes = compact_library(
+                self.usage, self.wal,
+                [(self.books, self.book_codec), (self.members, self.member_codec),
+                 (self.borrows, self.borrow_codec)],
+                self.borrows, self.borrow_schema, self.archive_file if archive else None,
+                self.rebuild_indexes)
+        except InUseError as e:
+            raise ConflictError(str(e))
+        return CompactReport(results, indexes)
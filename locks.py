@@ -0,0 +1,156 @@
+import errno
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List
+
+try:
+    import fcntl
+except ImportError:  # Windows ไม่มี fcntl: ล็อกได้เฉพาะระหว่าง thread ใน process เดียวกัน
+    fcntl = None
+
+# struct flock ของ Linux (l_type, l_whence, l_start, l_len, l_pid) สำหรับ open file description lock
+_FLOCK = struct.Struct('hhqqi4x')
+_OFD = fcntl is not None and hasattr(fcntl, 'F_OFD_SETLKW')
+
+
+class RecordLocks:
+    """ล็อกสำหรับผู้เขียนไฟล์ข้อมูล ใช้ได้ทั้งระหว่าง thread และระหว่าง process
+
+    records(): ล็อกเฉพาะ byte ของ record ที่จะเขียนทับ (byte-range lock ของ fcntl)
+    ผู้เขียนที่แก้ไข record คนละตัวจึงทำงานพร้อมกันได้
+    append(): ล็อกการต่อท้ายไฟล์ (ล็อก byte สมมติที่ APPEND_OFFSET ซึ่งไม่ทับกับ record ใด)
+    thread ใน process เดียวกันใช้ล็อกนี้ร่วมกันได้ เพราะ WAL จัดตำแหน่งให้ไม่ซ้ำกันอยู่แล้ว
+    (WAL ใช้ล็อกเดียวกันนี้กับไฟล์ตัวนับ ระหว่างคำนวณค่าใหม่จนเขียนลงไฟล์เสร็จ)
+    ผู้อ่านอ่านผ่าน mmap โดยไม่ล็อก จึงไม่ต้องรอผู้เขียน
+    บน Linux ใช้ open file description lock ซึ่งผูกกับไฟล์ที่เปิดไว้ ไม่ใช่กับ process
+    (lockf ของ POSIX จะหลุดทั้งหมดเมื่อ process ปิด fd ใดๆ ของไฟล์นั้น เช่นตอน mmap เดิมถูกปิดเพราะ remap)
+    ควรล็อกตามลำดับ books -> members -> borrows -> ตัวนับ เสมอเพื่อไม่ให้เกิด deadlock
+    """
+
+    APPEND_OFFSET = 1 << 62
+
+    def __init__(self, store):
+        self.store = store
+        self._cond = threading.Condition()
+        self._held = set()    # record ที่ thread ใน process นี้ล็อกอยู่
+        self._append_lock = threading.Lock()
+        self._appenders = 0   # จำนวน thread ที่ถือล็อกการต่อท้ายอยู่
+
+    def _lock(self, start: int, length: int):
+        if fcntl is None:
+            return
+        if _OFD:
+            fcntl.fcntl(self.store.fileno(), fcntl.F_OFD_SETLKW,
+                        _FLOCK.pack(fcntl.F_WRLCK, os.SEEK_SET, start, length, 0))
+            return
+        delay = 0.001
+        while True:
+            try:
+                fcntl.lockf(self.store.fileno(), fcntl.LOCK_EX, length, start)
+                return
+            except OSError as e:
+                # kernel มองทุก thread ใน process เป็นเจ้าของล็อกเดียวกัน จึงอาจแจ้ง deadlock
+                # ทั้งที่แต่ละ thread ล็อกตามลำดับอยู่แล้ว (thread ที่ถือล็อกจะปล่อยเอง) ให้ลองใหม่
+                if e.errno != errno.EDEADLK:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+
+    def _unlock(self, start: int, length: int):
+        if _OFD:
+            fcntl.fcntl(self.store.fileno(), fcntl.F_OFD_SETLK,
+                        _FLOCK.pack(fcntl.F_UNLCK, os.SEEK_SET, start, length, 0))
+        elif fcntl is not None:
+            fcntl.lockf(self.store.fileno(), fcntl.LOCK_UN, length, start)
+
+    def _record_range(self, index: int):
+        return self.store.header_size + index * self.store.record_size, self.store.record_size
+
+    @contextmanager
+    def records(self, indexes: Iterable[int]) -> Iterator[List[int]]:
+        """ล็อก record ตาม index (เรียงลำดับก่อนล็อกเพื่อไม่ให้เกิด deadlock)"""
+        keys = sorted(set(indexes))
+        with self._cond:
+            while self._held.intersection(keys):
+                self._cond.wait()
+            self._held.update(keys)
+
+        locked = []
+        try:
+            for index in keys:
+                self._lock(*self._record_range(index))
+                locked.append(index)
+            yield keys
+        finally:
+            for index in locked:
+                self._unlock(*self._record_range(index))
+            with self._cond:
+                self._held.difference_update(keys)
+                self._cond.notify_all()
+
+    @contextmanager
+    def append(self) -> Iterator[None]:
+        """ล็อกการต่อท้ายไฟล์ระหว่าง process (thread แรกเป็นผู้ล็อก thread สุดท้ายเป็นผู้ปลด)"""
+        with self._append_lock:
+            if self._appenders == 0:
+                self._lock(self.APPEND_OFFSET, 1)
+            self._appenders += 1
+        try:
+            yield
+        finally:
+            with self._append_lock:
+                self._appenders -= 1
+                if self._appenders == 0:
+                    self._unlock(self.APPEND_OFFSET, 1)
+
+
+class InUseError(Exception):
+    """ไฟล์ถูก process อื่นเปิดใช้อยู่ (งานที่ต้องใช้ไฟล์แต่เพียงผู้เดียวจึงทำไม่ได้)"""
+
+
+class UsageLock:
+    """ล็อกการเปิดใช้ไฟล์ข้อมูลชุดหนึ่ง (ล็อก byte สมมติของไฟล์ filename ผ่าน fd ของตัวเอง)
+
+    ทุก process ที่เปิดโปรแกรมไว้ถือล็อกแบบ shared ตั้งแต่ก่อนเปิดไฟล์ข้อมูลจนปิดโปรแกรม
+    งานที่แทนที่ไฟล์ข้อมูลทั้งไฟล์ (เช่น compaction) ต้องได้แบบ exclusive คือไม่มี process อื่นเปิดอยู่
+    process ที่เปิดโปรแกรมระหว่างนั้นจะรอจนงานเสร็จ จึงไม่มีใครถือ fd/mmap ของไฟล์เดิมที่ถูกแทนที่
+    """
+
+    OFFSET = 1 << 62
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        self._set(fcntl.F_RDLCK if fcntl else None, wait=True)
+
+    def _set(self, kind, wait: bool) -> bool:
+        """ตั้งชนิดของล็อก (F_RDLCK/F_WRLCK/F_UNLCK) คืนค่า False ถ้า wait=False แล้วติดล็อกของ process อื่น"""
+        if fcntl is None:
+            return True
+        try:
+            if _OFD:
+                fcntl.fcntl(self._fd, fcntl.F_OFD_SETLKW if wait else fcntl.F_OFD_SETLK,
+                            _FLOCK.pack(kind, os.SEEK_SET, self.OFFSET, 1, 0))
+            else:
+                op = {fcntl.F_RDLCK: fcntl.LOCK_SH, fcntl.F_WRLCK: fcntl.LOCK_EX}.get(kind, fcntl.LOCK_UN)
+                fcntl.lockf(self._fd, op if wait or op == fcntl.LOCK_UN else op | fcntl.LOCK_NB,
+                            1, self.OFFSET)
+        except (BlockingIOError, PermissionError):
+            return False
+        return True
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """ใช้ไฟล์แต่เพียงผู้เดียว (raise InUseError ทันทีถ้ามี process อื่นเปิดอยู่)"""
+        if not self._set(fcntl.F_WRLCK if fcntl else None, wait=False):
+            raise InUseError("มีโปรแกรมอื่นเปิดข้อมูลชุดนี้อยู่ ปิดโปรแกรมอื่นก่อนแล้วลองใหม่")
+        try:
+            yield
+        finally:
+            self._set(fcntl.F_RDLCK if fcntl else None, wait=True)
+
+    def close(self):
+        os.close(self._fd)  # ปลดล็อกไปพร้อมกับ fd
@@ -0,0 +1,153 @@
+import atexit
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional
+
+FIELDS = ('records', 'bytes_read', 'bytes_written', 'files_opened')
+
+
+class OperationStats:
+    """สถิติสะสมของ operation หนึ่ง (รวมของ operation/helper ที่ถูกเรียกข้างในด้วย)"""
+
+    __slots__ = ('calls', 'errors', 'wall_time') + FIELDS
+
+    def __init__(self):
+        self.calls = self.errors = 0
+        self.wall_time = 0.0
+        self.records = self.bytes_read = self.bytes_written = self.files_opened = 0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Metrics:
+    """เก็บสถิติการทำงานภายในโปรแกรม: เวลา, จำนวน record ที่อ่าน, byte ที่อ่าน/เขียน, ไฟล์ที่เปิด
+
+    ฟังก์ชันที่ครอบด้วย @metrics.operation() ถูกนับแยกตามชื่อ (เวลาและ I/O นับรวมของที่เรียกข้างใน
+    ในระหว่างนั้น เช่น borrow รวม _find_member) จุดอ่าน/เขียนไฟล์เรียก count() ให้นับ I/O ของ thread
+    ผลรวมอยู่ใน snapshot() และถ้าระบุ trace_file จะเขียนทุกการเรียกเป็น JSON หนึ่งบรรทัด
+    ปิดอยู่เป็นค่าเริ่มต้น: ตอนปิดทุกจุดตรวจแค่ enabled แล้วทำงานตามปกติทันที
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.operations: Dict[str, OperationStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._trace = None
+
+    # ---------- เปิด/ปิด ----------
+
+    def enable(self, trace_file: Optional[str] = None):
+        """เริ่มเก็บสถิติ (trace_file = ไฟล์ JSONL ที่ต่อท้ายทุกการเรียก)"""
+        with self._lock:
+            if trace_file and self._trace is None:
+                self._trace = open(trace_file, 'a', encoding='utf-8')
+            self.enabled = True
+
+    def disable(self):
+        """หยุดเก็บสถิติและปิดไฟล์ trace (สถิติที่เก็บแล้วยังอยู่)"""
+        with self._lock:
+            self.enabled = False
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+    def reset(self):
+        with self._lock:
+            self.operations = {}
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """สถิติของทุก operation เรียงตามเวลารวมมากไปน้อย"""
+        with self._lock:
+            items = sorted(self.operations.items(), key=lambda item: -item[1].wall_time)
+            return {name: stats.as_dict() for name, stats in items}
+
+    # ---------- นับ ----------
+
+    def _counts(self) -> List[int]:
+        counts = getattr(self._local, 'counts', None)
+        if counts is None:
+            counts = self._local.counts = [0] * len(FIELDS)
+            self._local.depth = 0
+        return counts
+
+    def count(self, records: int = 0, bytes_read: int = 0, bytes_written: int = 0, files_opened: int = 0):
+        """นับ I/O ของ thread ปัจจุบัน (ผู้เรียกตรวจ enabled ก่อน)"""
+        counts = self._counts()
+        counts[0] += records
+        counts[1] += bytes_read
+        counts[2] += bytes_written
+        counts[3] += files_opened
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        """นับเวลาและ I/O ระหว่าง block เข้า operation ชื่อ name"""
+        counts = self._counts()
+        before = list(counts)
+        depth = self._local.depth
+        self._local.depth = depth + 1
+        failed = False
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.depth = depth
+            self._record(name, elapsed, [after - b for after, b in zip(counts, before)], failed, depth)
+
+    def _record(self, name: str, elapsed: float, delta: List[int], failed: bool, depth: int):
+        with self._lock:
+            stats = self.operations.get(name)
+            if stats is None:
+                stats = self.operations[name] = OperationStats()
+            stats.calls += 1
+            stats.errors += failed
+            stats.wall_time += elapsed
+            stats.records += delta[0]
+            stats.bytes_read += delta[1]
+            stats.bytes_written += delta[2]
+            stats.files_opened += delta[3]
+            if self._trace is not None:
+                entry = {'ts': time.time(), 'op': name, 'thread': threading.get_ident(), 'depth': depth,
+                         'wall_ms': round(elapsed * 1000, 4), 'error': failed}
+                entry.update(zip(FIELDS, delta))
+                self._trace.write(json.dumps(entry) + '\n')
+
+    def _iterate(self, name: str, iterator: Iterator) -> Iterator:
+        # generator นับตั้งแต่เริ่มวนจนวนจบ (รวมเวลาที่ผู้เรียกใช้ระหว่างรับแต่ละค่า)
+        with self.measure(name):
+            yield from iterator
+
+    def operation(self, name: Optional[str] = None) -> Callable:
+        """decorator นับเวลาและ I/O ของฟังก์ชัน (ค่าเริ่มต้นใช้ชื่อ Class.method)"""
+        def decorate(func: Callable) -> Callable:
+            label = name or func.__qualname__
+            generator = inspect.isgeneratorfunction(func)
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                if generator:
+                    return self._iterate(label, func(*args, **kwargs))
+                with self.measure(label):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+
+metrics = Metrics()
+atexit.register(metrics.disable)  # เขียนไฟล์ trace ที่ค้างใน buffer ก่อนจบโปรแกรม
+
+# LIBRARY_TRACE=ไฟล์.jsonl เปิดการเก็บสถิติพร้อม trace ตั้งแต่เริ่มโปรแกรม
+if os.environ.get('LIBRARY_TRACE'):
+    metrics.enable(os.environ['LIBRARY_TRACE'])
@@ -0,0 +1,360 @@
+import argparse
+import glob
+import os
+import struct
+import sys
+import zlib
+from typing import Callable, NamedTuple, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows ไม่มี fcntl: ไม่มีการกัน process อื่นแปลงไฟล์เดียวกันซ้อน
+    fcntl = None
+
+from file_format import HEADER_SIZE, FormatError, pack_header, read_layout
+from record_codec import RecordCodec
+from record_store import RecordStore
+from schema import PROGRAMS, Program, Table, detect_schema
+from wal import WriteAheadLog
+
+CHUNK_SIZE = 16 << 20   # ขนาดก้อนที่แปลงต่อครั้ง (bytes ของข้อมูลเดิม)
+
+# ==================== แปลง record ====================
+
+def _field_converter(name: str, source_code: str, target_code: str,
+                     target_width: int) -> Optional[Callable]:
+    """ฟังก์ชันแปลงค่าของ field หนึ่ง (None = ใช้ค่าเดิมได้เลย)"""
+    source_text, target_text = source_code in 'sc', target_code in 'sc'
+    if source_text and not target_text:
+        # ID แบบข้อความ (เลขเติม 0) -> เลขฐานสอง
+        return lambda value: int(value.rstrip(b'\x00').strip() or b'0')
+
+    if not source_text and target_text:
+        def to_text(value):
+            text = str(value).zfill(target_width).encode()
+            if len(text) > target_width:
+                raise ValueError(f"{name} = {value} ยาวเกิน {target_width} หลัก")
+            return text
+        return to_text
+
+    if source_text and target_text:
+        def check_width(value):
+            if len(value.rstrip(b'\x00')) > target_width:
+                raise ValueError(f"{name} ยาวเกิน {target_width} bytes")
+            return value
+        return check_width
+
+    return None  # ตัวเลข -> ตัวเลข struct ตรวจช่วงของค่าให้ตอน pack
+
+
+def converter(source: RecordCodec, target: RecordCodec) -> Callable[[bytes], bytes]:
+    """ฟังก์ชันแปลงก้อน record จาก layout source เป็น target (จับคู่ field ตามชื่อ)
+
+    field ที่ไม่มีใน source ได้ค่าว่าง (0 หรือ b'') field ที่ไม่มีใน target ถูกตัดทิ้ง
+    """
+    if source.format == target.format and source.fields == target.fields:
+        return bytes
+
+    plan = []
+    for name, code, width in zip(target.fields, target.codes, target.widths):
+        if name in source.fields:
+            i = source.index(name)
+            plan.append((i, _field_converter(name, source.codes[i], code, width), None))
+        else:
+            plan.append((None, None, {'s': b'', 'c': b'\x00'}.get(code, 0)))
+
+    pack_into, size = target.struct.pack_into, target.size
+
+    def convert(chunk: bytes) -> bytes:
+        out = bytearray(len(chunk) // source.size * size)
+        offset = 0
+        for row in source.struct.iter_unpack(chunk):
+            pack_into(out, offset, *[
+                default if i is None else (row[i] if fn is None else fn(row[i]))
+                for i, fn, default in plan
+            ])
+            offset += size
+        return bytes(out)
+
+    return convert
+
+
+# ==================== แปลงไฟล์ในที่เดิม ====================
+
+JOURNAL_MAGIC = b'MIGR'
+# Magic + ลำดับ + ตำแหน่ง record แรกของไฟล์เดิม + ขนาด record เดิม/ใหม่ + จำนวน record + ช่วงของก้อน
+# + CRC32 ของข้อมูล + CRC32 ของ header
+JOURNAL = struct.Struct('<4sQIIIQQQII')
+JOURNAL_DATA = JOURNAL.size * 2   # header มีสองช่องเขียนสลับกัน ข้อมูลเดิมของก้อนอยู่ถัดไป
+
+
+class JournalState(NamedTuple):
+    sequence: int
+    offset: int             # ตำแหน่ง record แรกของไฟล์เดิม
+    source_size: int
+    target_size: int
+    count: int              # จำนวน record ทั้งหมด
+    first: int              # ช่วงของก้อนที่กำลังแปลง (first == stop คือแปลงครบแล้ว)
+    stop: int
+    data: Optional[bytes]   # ข้อมูลเดิมของก้อน (None = ก้อนนี้เขียนลงไฟล์เสร็จแล้ว)
+
+
+def journal_filename(filename: str) -> str:
+    return filename + '.migrate'
+
+
+def _read_journal(fd: int) -> Optional[JournalState]:
+    """อ่านสถานะล่าสุดจาก journal (None ถ้ายังไม่มี header ที่สมบูรณ์ คือไฟล์ข้อมูลยังไม่ถูกแก้)
+
+    data เป็น None ถ้าข้อมูลใน journal ไม่ตรงกับ CRC คือเริ่มบันทึกก้อนถัดไปแล้ว
+    (ก้อนตาม header เขียนลงไฟล์เสร็จแล้ว)
+    """
+    headers = os.pread(fd, JOURNAL_DATA, 0)
+    latest = None
+    for slot in range(2):
+        header = headers[slot * JOURNAL.size:(slot + 1) * JOURNAL.size]
+        if len(header) < JOURNAL.size:
+            break
+        magic, *fields, data_crc, header_crc = JOURNAL.unpack(header)
+        if magic != JOURNAL_MAGIC or zlib.crc32(header[:-4]) != header_crc:
+            continue  # ช่องที่ยังไม่เคยเขียนหรือเขียนไม่ครบ
+        if latest is None or fields[0] > latest[0][0]:
+            latest = fields, data_crc
+    if latest is None:
+        return None
+
+    (sequence, offset, source_size, target_size, count, first, stop), data_crc = latest
+    data = os.pread(fd, (stop - first) * source_size, JOURNAL_DATA)
+    if len(data) != (stop - first) * source_size or zlib.crc32(data) != data_crc:
+        data = None
+    return JournalState(sequence, offset, source_size, target_size, count, first, stop, data)
+
+
+def _write_journal(fd: int, state: JournalState):
+    """บันทึกข้อมูลเดิมของก้อนก่อนเขียนทับ: ข้อมูลก่อน แล้วจึง header (fsync ทั้งสองครั้ง)
+
+    header เขียนลงช่องสลับกันตามลำดับ ถ้าหยุดระหว่างเขียน header ช่องเดิมยังใช้ได้
+    """
+    os.pwrite(fd, state.data, JOURNAL_DATA)
+    os.fsync(fd)
+    header = JOURNAL.pack(JOURNAL_MAGIC, *state[:-1], zlib.crc32(state.data), 0)[:-4]
+    os.pwrite(fd, header + struct.pack('<I', zlib.crc32(header)), state.sequence % 2 * JOURNAL.size)
+    os.fsync(fd)
+
+
+def _migrate_copy(filename: str, source: RecordCodec, offset: int, target: RecordCodec,
+                  chunk_size: int) -> int:
+    """แปลงผ่านไฟล์ชั่วคราว (ใช้เมื่อย้ายข้อมูลในที่เดิมไม่ได้เพราะส่วนที่อ่านกับเขียนซ้อนกันผิดทิศ)"""
+    convert = converter(source, target)
+    step = max(1, chunk_size // source.size)
+    count = 0
+    temp = filename + '.tmp'
+    with open(filename, 'rb') as f, open(temp, 'wb') as out:
+        out.write(pack_header(target))
+        f.seek(offset)
+        while True:
+            data = f.read(step * source.size)
+            data = data[:len(data) // source.size * source.size]
+            if not data:
+                break
+            out.write(convert(data))
+            count += len(data) // source.size
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temp, filename)
+    return count
+
+
+def migrate_file(filename: str, source: RecordCodec, offset: int, target: RecordCodec,
+                 chunk_size: int = CHUNK_SIZE) -> int:
+    """แปลงไฟล์ข้อมูลจาก layout source (record แรกอยู่ที่ byte offset) เป็น target ในไฟล์เดิม
+
+    แปลงทีละก้อน ถ้า record ใหม่ใหญ่กว่าเดิมไล่จากท้ายไฟล์ (ส่วนที่เขียนไม่ทับข้อมูลที่ยังไม่ได้อ่าน)
+    ถ้าเล็กกว่าไล่จากต้นไฟล์ ข้อมูลเดิมของแต่ละก้อนถูกบันทึกใน <ไฟล์>.migrate ก่อนเขียนทับ
+    ถ้าหยุดกลางทางให้รันซ้ำ จะเขียนก้อนที่ค้างซ้ำจาก journal แล้วทำต่อ
+    header ใหม่ถูกเขียนหลังบันทึกใน journal ว่าแปลงครบทุกก้อนแล้ว คืนค่าจำนวน record
+    """
+    o, n, h = source.size, target.size, HEADER_SIZE
+    backward = n >= o and h >= offset
+    forward = n <= o and h <= offset
+    if not (backward or forward):
+        return _migrate_copy(filename, source, offset, target, chunk_size)
+
+    convert = converter(source, target)
+    step = max(1, chunk_size // max(o, n))
+    journal = journal_filename(filename)
+    fd = os.open(filename, os.O_RDWR)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        raise FormatError(f"{filename} กำลังถูกแปลงโดย process อื่น")
+    jfd = os.open(journal, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        state = _read_journal(jfd)
+        if state is None:
+            count = (os.fstat(fd).st_size - offset) // o
+            done = count if backward else 0
+            sequence = 0
+        else:
+            if (state.offset, state.source_size, state.target_size) != (offset, o, n):
+                raise FormatError(f"{journal} ไม่ตรงกับ {filename} (แปลงค้างด้วย layout อื่น)")
+            if state.data:
+                os.pwrite(fd, convert(state.data), h + state.first * n)
+                os.fsync(fd)
+            count, sequence = state.count, state.sequence
+            done = state.first if backward else state.stop
+
+        finished = state is not None and state.first == state.stop
+        if finished:
+            chunks = []   # แปลงครบแล้ว เหลือเขียน header
+        elif backward:    # ช่วง [done, count) แปลงแล้ว
+            chunks = [(max(0, stop - step), stop) for stop in range(done, 0, -step)]
+        else:             # ช่วง [0, done) แปลงแล้ว
+            chunks = [(first, min(first + step, count)) for first in range(done, count, step)]
+
+        for first, stop in chunks:
+            data = os.pread(fd, (stop - first) * o, offset + first * o)
+            if len(data) != (stop - first) * o:
+                raise FormatError(f"อ่าน {filename} ไม่ครบ (ไฟล์ถูกแก้ระหว่างแปลง?)")
+            converted = convert(data)  # แปลงก่อนบันทึก journal: ข้อมูลผิดรูปแบบจะหยุดก่อนแก้ไฟล์
+            sequence += 1
+            _write_journal(jfd, JournalState(sequence, offset, o, n, count, first, stop, data))
+            os.pwrite(fd, converted, h + first * n)
+            os.fsync(fd)
+
+        if not finished:
+            # ก้อนว่าง = แปลงครบแล้ว (ถ้าหยุดระหว่างเขียน header รอบหน้าจะเขียนซ้ำโดยไม่ต้องอ่าน header เดิม)
+            _write_journal(jfd, JournalState(sequence + 1, offset, o, n, count, count, count, b''))
+        _finish(fd, target, count)
+    finally:
+        os.close(jfd)
+        os.close(fd)
+    os.remove(journal)
+    return count
+
+
+def _finish(fd: int, target: RecordCodec, count: int):
+    os.pwrite(fd, pack_header(target), 0)
+    os.ftruncate(fd, HEADER_SIZE + count * target.size)
+    os.fsync(fd)
+
+
+def finish_pending(filename: str, target: RecordCodec) -> Optional[int]:
+    """เขียน header ของไฟล์ที่แปลงครบทุกก้อนแล้วแต่หยุดก่อนเสร็จ (คืนค่า None ถ้ายังแปลงไม่ครบ)"""
+    journal = journal_filename(filename)
+    if not os.path.exists(journal):
+        return None
+    with open(journal, 'rb') as f:
+        state = _read_journal(f.fileno())
+    if state is None or state.first != state.stop or state.target_size != target.size:
+        return None
+    count = state.count
+    fd = os.open(filename, os.O_RDWR)
+    try:
+        _finish(fd, target, count)
+    finally:
+        os.close(fd)
+    os.remove(journal)
+    return count
+
+
+# ==================== แปลงทั้งโปรแกรม ====================
+
+def _status(filename: str, table: Table) -> str:
+    if not os.path.exists(filename):
+        return "ไม่มีไฟล์"
+    if os.path.exists(journal_filename(filename)):
+        return "แปลงค้างอยู่ (จะทำต่อจากเดิม)"
+    layout = read_layout(filename)
+    if layout is None:
+        if os.path.getsize(filename) == 0:
+            return f"ไฟล์ว่าง -> {table.schema.format}"
+        return f"ไฟล์รุ่นก่อน {table.legacy.format} -> {table.schema.format}"
+    if table.schema.matches(layout):
+        return "เป็นรุ่นล่าสุดแล้ว"
+    return f"{layout.describe()} -> {table.schema.format}"
+
+
+def replay_wal(program: Program, directory: str) -> int:
+    """เขียน transaction ที่ค้างใน WAL ลงไฟล์ข้อมูล (ตาม layout ที่อยู่ในไฟล์ตอนนี้) ก่อนแปลง"""
+    if program.wal is None:
+        return 0
+    wal_file = os.path.join(directory, program.wal)
+    if not os.path.exists(wal_file) or os.path.getsize(wal_file) <= WriteAheadLog.HEADER.size:
+        return 0
+    stores = []
+    try:
+        for table in program.tables.values():
+            if table.in_wal:
+                filename = os.path.join(directory, table.filename)
+                if os.path.exists(journal_filename(filename)):
+                    raise FormatError(f"{filename} แปลงค้างอยู่ ให้แปลงให้เสร็จก่อน replay WAL")
+                open(filename, 'ab').close()
+                schema, offset = detect_schema(filename, table)
+                stores.append(RecordStore(filename, schema.size, offset))
+        wal = WriteAheadLog(wal_file, stores)
+        replayed = wal.replay()
+        wal.close()
+        return replayed
+    finally:
+        for store in stores:
+            store.close()
+
+
+def migrate(name: str, directory: str = '.', chunk_size: int = CHUNK_SIZE, check: bool = False) -> int:
+    """แปลงไฟล์ข้อมูลทุกไฟล์ของโปรแกรม name เป็น layout ปัจจุบัน คืนค่าจำนวนไฟล์ที่แปลง"""
+    program = PROGRAMS[name]
+    if not check:
+        replayed = replay_wal(program, directory)
+        if replayed:
+            print(f"เขียน transaction ที่ค้างใน WAL ลงไฟล์ข้อมูล {replayed} รายการ")
+
+    pending = []
+    for table in program.tables.values():
+        filename = os.path.join(directory, table.filename)
+        status = _status(filename, table)
+        print(f"{table.filename:<22} {status}")
+        if os.path.exists(filename) and status != "เป็นรุ่นล่าสุดแล้ว":
+            pending.append((filename, table))
+    if check:
+        return 0
+
+    for filename, table in pending:
+        count = finish_pending(filename, table.schema.codec)
+        if count is None:
+            source, offset = detect_schema(filename, table)
+            try:
+                count = migrate_file(filename, source.codec, offset, table.schema.codec, chunk_size)
+            except (ValueError, struct.error) as e:
+                raise FormatError(f"แปลง {filename} ไม่ได้: {e}")
+        # ดัชนีเก็บตำแหน่งและ key ตาม layout เดิม ให้โปรแกรมสร้างใหม่ตอนเปิด
+        prefix = glob.escape(os.path.splitext(filename)[0])
+        for index in glob.glob(prefix + '*.idx') + glob.glob(prefix + '*.seg'):
+            os.remove(index)
+        print(f"✅ แปลง {table.filename} แล้ว {count:,} record")
+    return len(pending)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="แปลงไฟล์ข้อมูลเป็น layout ปัจจุบัน (ปิดโปรแกรมที่ใช้ไฟล์ทุกตัวก่อนรัน)")
+    parser.add_argument('program', choices=sorted(PROGRAMS))
+    parser.add_argument('--directory', default='.', help="โฟลเดอร์ของไฟล์ข้อมูล")
+    parser.add_argument('--check', action='store_true', help="แสดงสถานะของไฟล์โดยไม่แปลง")
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_SIZE >> 20, help="ขนาดก้อนที่แปลงต่อครั้ง (MiB)")
+    args = parser.parse_args(argv)
+
+    try:
+        migrated = migrate(args.program, args.directory, max(1, args.chunk_mb) << 20, args.check)
+    except (FormatError, OSError) as e:
+        print(f"❌ {e}")
+        print("แก้ไขแล้วรันซ้ำได้ ไฟล์ที่แปลงค้างจะทำต่อจากเดิม")
+        sys.exit(1)
+    if not args.check and not migrated:
+        print("ไม่มีไฟล์ที่ต้องแปลง")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
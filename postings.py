@@ -0,0 +1,372 @@
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from itertools import accumulate, groupby
+from operator import itemgetter, sub
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from metrics import metrics
+
+BLOCK = 128               # จำนวน posting ต่อ block
+RUN_POSTINGS = 1 << 20    # จำนวน posting ที่สะสมในหน่วยความจำก่อนเขียนเป็น run ตอนสร้าง segment
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+_WIDTHS = ((0xFF, 'B'), (0xFFFF, 'H'), (0xFFFFFFFF, 'I'))   # ส่วนต่างที่มากที่สุด -> ชนิดของ array
+
+
+def _uints(typecode: str, data) -> array:
+    """bytes แบบ little-endian -> array ของจำนวนเต็มไม่ติดลบ"""
+    values = array(typecode)
+    values.frombytes(data)
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def _raw(values: array) -> bytes:
+    """array -> bytes แบบ little-endian"""
+    if _BIG_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_postings(values: Sequence[int]) -> Tuple[bytes, int]:
+    """posting list ที่เรียงแล้ว (ไม่ซ้ำ) -> (bytes ของ region, จำนวน block)
+
+    region = ค่าแรกของทุก block (uint32) + ตำแหน่งท้ายของแต่ละ block (uint32) + block ต่อกัน
+    แต่ละ block เก็บส่วนต่างจากค่าก่อนหน้าด้วยความกว้างที่พอดีกับส่วนต่างที่มากที่สุดใน block
+    (1, 2 หรือ 4 bytes นำหน้าด้วยชนิดของ array) ตารางค่าแรกใช้กระโดดข้าม block ที่ไม่ต้องอ่าน
+    """
+    firsts, ends, blocks = array('I'), array('I'), []
+    size = 0
+    for start in range(0, len(values), BLOCK):
+        block = values[start:start + BLOCK]
+        deltas = list(map(sub, block[1:], block))
+        largest = max(deltas, default=0)
+        code = next(code for limit, code in _WIDTHS if largest <= limit)
+        data = code.encode() + _raw(array(code, deltas))
+        firsts.append(block[0])
+        blocks.append(data)
+        size += len(data)
+        ends.append(size)
+    return _raw(firsts) + _raw(ends) + b''.join(blocks), len(firsts)
+
+
+def _concat(regions: Sequence[Tuple[memoryview, int]]) -> Tuple[bytes, int]:
+    """ต่อ region ของ term เดียวกันที่ record index ของ region ถัดไปมากกว่าเสมอ
+    -> (region, จำนวน block) ต่อ block กันได้เลยโดยไม่ต้องถอดรหัส
+    """
+    firsts, ends, blocks = array('I'), array('I'), []
+    shift = 0
+    for region, count in regions:
+        region_ends = _uints('I', region[4 * count:8 * count])
+        firsts.extend(_uints('I', region[:4 * count]))
+        ends.extend(end + shift for end in region_ends)
+        blocks.append(region[8 * count:8 * count + region_ends[-1]])
+        shift += region_ends[-1]
+    return _raw(firsts) + _raw(ends) + b''.join(blocks), len(firsts)
+
+
+class PostingList:
+    """posting list ของ term หนึ่งบน mmap ของ segment (ถอดรหัสเฉพาะ block ที่ใช้)"""
+
+    __slots__ = ('count', '_firsts', '_ends', '_blocks')
+
+    def __init__(self, region: memoryview, count: int, blocks: int):
+        self.count = count
+        self._firsts = _uints('I', region[:4 * blocks])
+        self._ends = _uints('I', region[4 * blocks:8 * blocks])
+        self._blocks = region[8 * blocks:]
+
+    def _block(self, i: int) -> List[int]:
+        data = self._blocks[self._ends[i - 1] if i else 0:self._ends[i]]
+        return list(accumulate(_uints(chr(data[0]), data[1:]), initial=self._firsts[i]))
+
+    def values(self) -> List[int]:
+        """record index ทั้งหมดเรียงจากน้อยไปมาก"""
+        values = []
+        for i in range(len(self._firsts)):
+            values += self._block(i)
+        return values
+
+    def intersect(self, candidates: Sequence[int]) -> List[int]:
+        """candidates (เรียงแล้ว) ที่อยู่ใน posting list นี้
+
+        เดินไปพร้อมกันทั้งสองฝั่ง: กระโดดไปยัง block ของ candidate ถัดไปด้วยตารางค่าแรก
+        (bisect ต่อจาก block ก่อนหน้า) ตัด candidate ทั้งช่วงที่ตกใน block นั้นด้วย bisect
+        แล้วถอดรหัส block ครั้งเดียว block ที่ไม่มี candidate ตกอยู่เลยจะไม่ถูกถอดรหัส
+        """
+        found = []
+        firsts = self._firsts
+        last = len(firsts) - 1
+        position, total, i = 0, len(candidates), 0
+        while position < total:
+            i = bisect_right(firsts, candidates[position], i) - 1
+            if i < 0:
+                # candidate ที่น้อยกว่าค่าแรกของ posting list ไม่มีทางอยู่ใน list
+                position, i = bisect_left(candidates, firsts[0], position), 0
+                continue
+            end = bisect_left(candidates, firsts[i + 1], position) if i < last else total
+            members = set(self._block(i))
+            found += [candidate for candidate in candidates[position:end] if candidate in members]
+            position = end
+        return found
+
+
+class Postings:
+    """posting list ของ term: ส่วนที่อยู่ใน segment รวมกับการเปลี่ยนแปลงที่ยังไม่ได้ merge
+
+    changes คือ {record index: มีอยู่หรือไม่} ค่าล่าสุดของแต่ละ record ชนะค่าใน segment
+    """
+
+    __slots__ = ('base', 'changes')
+
+    def __init__(self, base: Optional[PostingList], changes: Optional[Dict[int, bool]] = None):
+        self.base = base
+        self.changes = changes or {}
+
+    def __len__(self) -> int:
+        """จำนวนโดยประมาณ (ใช้เลือก posting list ที่สั้นที่สุดก่อน)"""
+        return (self.base.count if self.base else 0) + len(self.changes)
+
+    def values(self) -> List[int]:
+        values = self.base.values() if self.base else []
+        return _apply(values, self.changes) if self.changes else values
+
+    def intersect(self, candidates: Sequence[int]) -> List[int]:
+        found = self.base.intersect(candidates) if self.base else []
+        if not self.changes:
+            return found
+        # found เป็นลำดับย่อยของ candidates: เดินคู่กันเพื่อรู้ว่า candidate ใดอยู่ใน segment
+        results, position = [], 0
+        for index in candidates:
+            in_base = position < len(found) and found[position] == index
+            if in_base:
+                position += 1
+            if self.changes.get(index, in_base):
+                results.append(index)
+        return results
+
+
+class Segment:
+    """ไฟล์ segment ของดัชนีข้อความ อ่านผ่าน mmap (ไม่แก้ไขหลังเขียนเสร็จ ถูกแทนที่ด้วย rename เท่านั้น)
+
+    Header + region ของแต่ละ term (encode_postings) + พจนานุกรม term เรียงตาม term
+    (Term + ตำแหน่งของ region + จำนวน posting + จำนวน block) ค้น term ด้วย binary search บน mmap
+    การค้นหาจึงอ่านเฉพาะพจนานุกรมบางหน้าและ region ของ term ที่ใช้ ไม่ต้องโหลดทั้งไฟล์
+    """
+
+    MAGIC = b'TSEG'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHQQ')    # Magic + Version + TermCount + ตำแหน่งของพจนานุกรม
+
+    def __init__(self, filename: str, term_size: int):
+        self.filename = filename
+        self.entry = struct.Struct(f'<{term_size}sQII')   # Term + Offset + Count + Blocks
+        with open(filename, 'rb') as f:
+            if metrics.enabled:
+                metrics.count(files_opened=1)
+            header = f.read(self.HEADER.size)
+            size = os.fstat(f.fileno()).st_size
+            if len(header) != self.HEADER.size:
+                raise ValueError(f"{filename} ไม่ใช่ segment")
+            magic, version, self.term_count, self.dictionary = self.HEADER.unpack(header)
+            if (magic, version) != (self.MAGIC, self.VERSION) or \
+                    self.dictionary + self.term_count * self.entry.size != size:
+                raise ValueError(f"{filename} ไม่ใช่ segment หรือเขียนไม่ครบ")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._term_size = term_size
+
+    def _entry(self, i: int) -> Tuple[bytes, int, int, int]:
+        return self.entry.unpack_from(self._view, self.dictionary + i * self.entry.size)
+
+    def find(self, term: bytes) -> Optional[PostingList]:
+        """posting list ของ term (None ถ้าไม่มี)"""
+        view, base, size = self._view, self.dictionary, self.entry.size
+        low, high = 0, self.term_count
+        while low < high:
+            mid = (low + high) // 2
+            start = base + mid * size
+            if bytes(view[start:start + self._term_size]) < term:
+                low = mid + 1
+            else:
+                high = mid
+        if low == self.term_count:
+            return None
+        found, offset, count, blocks = self._entry(low)
+        if found != term:
+            return None
+        if metrics.enabled:
+            metrics.count(bytes_read=8 * blocks)
+        return PostingList(self._view[offset:], count, blocks)
+
+    def entries(self) -> Iterator[Tuple[bytes, memoryview, int, int]]:
+        """ทุก term เรียงตาม term -> (term, region, จำนวน posting, จำนวน block)"""
+        for i in range(self.term_count):
+            term, offset, count, blocks = self._entry(i)
+            end = offset + 8 * blocks + struct.unpack_from('<I', self._view, offset + 8 * blocks - 4)[0]
+            yield term, self._view[offset:end], count, blocks
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:  # PostingList ที่ยังใช้อยู่ถือ memoryview ไว้ ให้ GC ปิดเอง
+            pass
+
+
+class SegmentWriter:
+    """เขียน segment ทีละ term ตามลำดับ term ลงไฟล์ชั่วคราวในโฟลเดอร์ของ filename
+
+    พจนานุกรมถูกพักไว้ในไฟล์ชั่วคราวอีกไฟล์แล้วต่อท้ายตอน finish() หน่วยความจำจึงไม่ขึ้นกับจำนวน term
+    """
+
+    def __init__(self, filename: str, term_size: int):
+        self.filename = filename
+        self.entry = struct.Struct(f'<{term_size}sQII')
+        directory = os.path.dirname(filename) or '.'
+        fd, self.temp_file = tempfile.mkstemp(prefix=os.path.basename(filename) + '.',
+                                              suffix='.tmp', dir=directory)
+        self._file = open(fd, 'wb')
+        self._dictionary = tempfile.TemporaryFile(dir=directory)
+        self._file.write(bytes(Segment.HEADER.size))
+        self._position = Segment.HEADER.size
+        self.terms = 0
+
+    def add(self, term: bytes, region, blocks: int, count: int):
+        self._file.write(region)
+        self._dictionary.write(self.entry.pack(term, self._position, count, blocks))
+        self._position += len(region)
+        self.terms += 1
+
+    def add_postings(self, term: bytes, values: Sequence[int]):
+        if values:
+            self.add(term, *encode_postings(values), len(values))
+
+    def finish(self, sync: bool = False) -> str:
+        """เขียนพจนานุกรมและ header คืนค่าชื่อไฟล์ชั่วคราวที่เขียนเสร็จแล้ว"""
+        self._dictionary.seek(0)
+        shutil.copyfileobj(self._dictionary, self._file, 1 << 20)
+        self._dictionary.close()
+        self._file.seek(0)
+        self._file.write(Segment.HEADER.pack(Segment.MAGIC, Segment.VERSION, self.terms, self._position))
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+        if metrics.enabled:
+            metrics.count(files_opened=2, bytes_written=self._position + 2 * self.terms * self.entry.size)
+        self._file.close()
+        return self.temp_file
+
+    def commit(self):
+        """เขียนให้เสร็จ (fsync) แล้ว rename ทับ filename"""
+        os.replace(self.finish(sync=True), self.filename)
+
+    def discard(self):
+        self._dictionary.close()
+        self._file.close()
+        os.remove(self.temp_file)
+
+
+def merge_segments(writer: SegmentWriter, segments: Sequence[Segment],
+                   changes: Optional[Dict[bytes, Dict[int, bool]]] = None):
+    """เขียน term ของทุก segment ตามลำดับ term ลง writer พร้อมใช้ changes ของแต่ละ term
+
+    segment ที่มาก่อนต้องมี record index น้อยกว่าของ segment ถัดไป (เช่น run ของ build_segment)
+    term ที่ไม่มีการเปลี่ยนแปลงถูก copy/ต่อ block ทั้งก้อน ถอดรหัสเฉพาะ term ที่มีใน changes
+    """
+    changes = changes or {}
+    streams = [_ordered(segment, order) for order, segment in enumerate(segments)]
+    streams.append((term, len(segments), None, 0, 0) for term in sorted(changes))
+    for term, group in groupby(merge(*streams), key=itemgetter(0)):
+        parts = [(region, count, blocks) for _, _, region, count, blocks in group if region is not None]
+        if term in changes:
+            values = []
+            for region, count, blocks in parts:
+                values += PostingList(region, count, blocks).values()
+            writer.add_postings(term, _apply(values, changes[term]))
+        elif len(parts) == 1:
+            region, count, blocks = parts[0]
+            writer.add(term, region, blocks, count)
+        else:
+            writer.add(term, *_concat([(region, blocks) for region, _, blocks in parts]),
+                       sum(count for _, count, _ in parts))
+
+
+def _ordered(segment: Segment, order: int) -> Iterator[Tuple[bytes, int, memoryview, int, int]]:
+    """term ของ segment พร้อมลำดับของ segment (term เดียวกันจาก segment ก่อนมาก่อนเสมอ)"""
+    for term, region, count, blocks in segment.entries():
+        yield term, order, region, count, blocks
+
+
+def _apply(values: List[int], changes: Dict[int, bool]) -> List[int]:
+    """values (เรียงแล้ว) หลังใช้ changes: merge กับ record ที่เพิ่ม แล้วตัดตัวซ้ำและ record ที่ถูกลบ"""
+    added = sorted(index for index, present in changes.items() if present)
+    return [index for index, _ in groupby(merge(values, added)) if changes.get(index, True)]
+
+
+def build_segment(filename: str, term_size: int, documents: Iterable[Tuple[int, Iterable[bytes]]],
+                  run_postings: int = RUN_POSTINGS):
+    """สร้าง segment จาก (record index, term ทั้งหมดของ record) ที่เรียงตาม record index แล้ว rename ทับ filename
+
+    external sort: สะสม posting ในหน่วยความจำไม่เกิน run_postings ตัวแล้วเขียนเป็น run
+    (segment ชั่วคราวที่เรียงตาม term) จบแล้วจึง merge ทุก run ตามลำดับ term
+    record index เพิ่มขึ้นตามลำดับ run จึงต่อ block ของแต่ละ run ได้เลยโดยไม่ต้องเรียงใหม่
+    """
+    runs: List[str] = []
+    segments: List[Segment] = []
+    try:
+        run: Dict[bytes, array] = {}
+        size = 0
+        for index, terms in documents:
+            for term in terms:
+                postings = run.get(term)
+                if postings is None:
+                    run[term] = postings = array('I')
+                postings.append(index)
+                size += 1
+            if size >= run_postings:
+                runs.append(_write_run(filename, term_size, run))
+                run, size = {}, 0
+
+        if not runs:
+            # ทั้งหมดอยู่ในหน่วยความจำ: เขียนเป็น segment ได้เลย
+            runs.append(_write_run(filename, term_size, run, sync=True))
+            os.replace(runs.pop(), filename)
+            return
+        if run:
+            runs.append(_write_run(filename, term_size, run))
+        run = None
+
+        segments = [Segment(name, term_size) for name in runs]
+        writer = SegmentWriter(filename, term_size)
+        try:
+            merge_segments(writer, segments)
+        except BaseException:
+            writer.discard()
+            raise
+        writer.commit()
+    finally:
+        for segment in segments:
+            segment.close()
+        for name in runs:
+            os.remove(name)
+
+
+def _write_run(filename: str, term_size: int, run: Dict[bytes, array], sync: bool = False) -> str:
+    writer = SegmentWriter(filename, term_size)
+    try:
+        for term in sorted(run):
+            writer.add_postings(term, run[term])
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.finish(sync)
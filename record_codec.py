@@ -0,0 +1,146 @@
+import re
+import struct
+from collections import namedtuple
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+_FIELD_PATTERN = re.compile(r'(\d*)([xcbB?hHiIlLqQnNefdspP])')
+
+
+class RecordView:
+    """มุมมองของ record เดียวบน buffer เดิม (ไม่ copy และไม่แปลงล่วงหน้า)
+
+    view[i] คืนค่า bytes ดิบของ field (หรือตัวเลขสำหรับ field ตัวเลข) เหมือน Row
+    view.text(i) แปลงเป็น str เฉพาะตอนที่เรียกใช้
+    """
+
+    __slots__ = ('codec', 'data')
+
+    def __init__(self, codec: 'RecordCodec', data: memoryview):
+        self.codec = codec
+        self.data = data
+
+    def raw(self, i: int) -> memoryview:
+        """bytes ดิบของ field i (memoryview บน buffer เดิม)"""
+        offset = self.codec.offsets[i]
+        return self.data[offset:offset + self.codec.widths[i]]
+
+    def __getitem__(self, i: int):
+        unpacker = self.codec.field_structs[i]
+        if unpacker is None:
+            return bytes(self.raw(i))
+        return unpacker.unpack_from(self.data, self.codec.offsets[i])[0]
+
+    def text(self, i: int) -> str:
+        """แปลง field ข้อความเป็น str (ตัด \\x00 ท้าย)"""
+        return str(self.raw(i), 'utf-8').rstrip('\x00')
+
+    def row(self) -> tuple:
+        """แปลงทั้ง record เป็น Row"""
+        return self.codec.unpack(self.data)
+
+
+class RecordCodec:
+    """ตัวแปลง record <-> tuple ที่ compile format ไว้ครั้งเดียวด้วย struct.Struct
+
+    แต่ละ record ถูกแปลงเป็น namedtuple (อ่านได้ทั้ง row[1] และ row.title)
+    และแปลงทั้ง buffer ทีเดียวได้ด้วย iter_unpack
+    """
+
+    def __init__(self, fmt: str, fields: Sequence[str], name: str = 'Record'):
+        self.format = fmt
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+        self.fields = tuple(fields)
+        self.Row = namedtuple(name, self.fields)
+
+        self.offsets, self.widths, self.codes = self._layout(fmt)
+        if len(self.offsets) != len(self.fields):
+            raise ValueError(f"format '{fmt}' มี {len(self.offsets)} field แต่ตั้งชื่อไว้ {len(self.fields)} field")
+
+        # Struct ของ field ตัวเลข (field bytes ใช้ค่า None)
+        order = fmt[0] if fmt[0] in '@=<>!' else '<'
+        self.field_structs = tuple(
+            None if code in 'spc' else struct.Struct(order + code) for code in self.codes
+        )
+
+        # field ข้อความ = bytes ที่ยาวกว่า 1 (field 1 byte เป็น flag เก็บเป็น bytes ไว้เหมือนเดิม)
+        self.text_fields = tuple(
+            i for i, (code, width) in enumerate(zip(self.codes, self.widths))
+            if code == 's' and width > 1
+        )
+
+    @staticmethod
+    def _layout(fmt: str) -> Tuple[List[int], List[int], List[str]]:
+        """คำนวณ offset, ความกว้าง และชนิดของแต่ละ field (format แบบไม่มี padding)"""
+        order = fmt[0] if fmt and fmt[0] in '@=<>!' else ''
+        offsets, widths, codes = [], [], []
+        offset = 0
+        for count, code in _FIELD_PATTERN.findall(fmt[len(order):]):
+            count = int(count) if count else 1
+            if code in 'sp':
+                repeat, width = 1, count
+            else:
+                repeat, width = count, struct.calcsize((order or '<') + code)
+            for _ in range(repeat):
+                if code != 'x':
+                    offsets.append(offset)
+                    widths.append(width)
+                    codes.append(code)
+                offset += width
+        return offsets, widths, codes
+
+    def index(self, field: str) -> int:
+        """ตำแหน่งของ field จากชื่อ"""
+        return self.fields.index(field)
+
+    def unpack(self, data) -> tuple:
+        """แปลง record เดียว -> Row"""
+        return self.Row._make(self.struct.unpack(data))
+
+    def pack(self, *values) -> bytes:
+        """แปลงค่าของแต่ละ field -> bytes ของ record"""
+        return self.struct.pack(*values)
+
+    def iter_unpack(self, buffer) -> Iterator[tuple]:
+        """แปลงทุก record ใน buffer ทีเดียว (buffer ต้องยาวเป็นจำนวนเท่าของ size)"""
+        return map(self.Row._make, self.struct.iter_unpack(buffer))
+
+    def view(self, data) -> RecordView:
+        """RecordView ของ record เดียว"""
+        return RecordView(self, memoryview(data))
+
+    def iter_views(self, buffer, **equals: bytes) -> Iterator[RecordView]:
+        """วน RecordView ทุก record ใน buffer
+
+        ระบุ field 1 byte เพื่อกรองได้ เช่น iter_views(buf, deleted=b'0')
+        การกรองเทียบ byte ดิบใน buffer โดยตรง record ที่ไม่ผ่านจึงไม่ถูกแปลงเลย
+        field แรกที่ระบุถูกค้นจาก column ของ field นั้น (copy 1 byte ต่อ record แล้วใช้ bytes.find)
+        record ที่ไม่ตรงจึงถูกข้ามโดยไม่วนใน Python ควรระบุ field ที่ตรงน้อยที่สุดก่อน
+        """
+        checks = [(self.offsets[self.index(name)], value[0]) for name, value in equals.items()]
+        view = memoryview(buffer)
+        size = self.size
+        end = len(view) - len(view) % size
+        if not checks:
+            for offset in range(0, end, size):
+                yield RecordView(self, view[offset:offset + size])
+            return
+
+        (first_offset, first_value), rest = checks[0], checks[1:]
+        column = view[first_offset:end:size].tobytes()
+        i = column.find(first_value)
+        while i >= 0:
+            offset = i * size
+            for field_offset, value in rest:
+                if view[offset + field_offset] != value:
+                    break
+            else:
+                yield RecordView(self, view[offset:offset + size])
+            i = column.find(first_value, i + 1)
+
+    def decode(self, row: Iterable) -> tuple:
+        """แปลง field ข้อความของ Row เป็น str (ตัด \\x00 ท้าย)"""
+        values = list(row)
+        for i in self.text_fields:
+            values[i] = values[i].decode('utf-8').rstrip('\x00')
+        return self.Row._make(values)
@@ -0,0 +1,263 @@
+import mmap
+import os
+import tempfile
+import threading
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from locks import RecordLocks
+from metrics import metrics
+from scanner import CHUNK_SIZE
+
+# madvise มีเฉพาะบางระบบ (Python 3.8+ บน Unix)
+_WILLNEED = getattr(mmap, 'MADV_WILLNEED', None)
+
+
+class RecordStore:
+    """ไฟล์ .dat แบบ Fixed-Length Records ที่ map เข้าหน่วยความจำครั้งเดียว
+
+    อ่าน record ผ่าน memoryview ของ mmap (ไม่ copy ข้อมูล)
+    และ remap อัตโนมัติเมื่อขนาดไฟล์เปลี่ยน
+    ถ้ากำหนด header_size ไว้ record แรกจะเริ่มหลัง header
+    """
+
+    def __init__(self, filename: str, record_size: int, header_size: int = 0):
+        self.filename = filename
+        self.record_size = record_size
+        self.header_size = header_size
+
+        self._file = open(filename, 'r+b')
+        if metrics.enabled:
+            metrics.count(files_opened=1)
+        self._write_lock = threading.Lock()  # seek + write ต้องไม่สลับกันระหว่าง thread
+        self._map_lock = threading.Lock()    # remap ทีละ thread
+        self._mmap = None
+        self._view = None
+        self._mapped_size = -1
+        self._remap()
+
+        self.locks = RecordLocks(self)
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def _remap(self):
+        """map ไฟล์ใหม่ถ้าขนาดไฟล์ไม่ตรงกับที่ map ไว้
+
+        สร้าง mapping ใหม่ก่อนแล้วจึงสลับ thread อื่นที่อ่านอยู่จึงไม่เห็น mapping ว่างระหว่าง remap
+        """
+        if os.fstat(self._file.fileno()).st_size == self._mapped_size:
+            return
+
+        with self._map_lock:
+            size = os.fstat(self._file.fileno()).st_size
+            if size == self._mapped_size:
+                return
+
+            old = self._mmap
+            if size > 0:
+                mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view, self._mmap = memoryview(mapped), mapped
+            else:
+                self._view = self._mmap = None
+            self._mapped_size = size
+            self._close_map(old)
+
+    @staticmethod
+    def _close_map(mapped: Optional[mmap.mmap]):
+        """ปิด mapping (ถ้ายังมี memoryview ค้างอยู่ ให้ GC ปิดเอง)"""
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+
+    def _release(self):
+        """ปล่อย mapping เดิม"""
+        self._view = None
+        mapped, self._mmap = self._mmap, None
+        self._close_map(mapped)
+
+    def _data_size(self) -> int:
+        """ขนาดส่วนข้อมูล (ไม่รวม header)"""
+        self._remap()
+        return max(0, self._mapped_size - self.header_size)
+
+    def __len__(self) -> int:
+        """จำนวน record ที่สมบูรณ์ในไฟล์"""
+        return self._data_size() // self.record_size
+
+    def trailing_bytes(self) -> int:
+        """จำนวน byte ท้ายไฟล์ที่ไม่ครบหนึ่ง record (0 = ไฟล์ปกติ)"""
+        return self._data_size() % self.record_size
+
+    def read_header(self) -> Optional[bytes]:
+        """อ่าน header (คืนค่า None ถ้าไฟล์ยังไม่มี header)"""
+        self._remap()
+        if self.header_size == 0 or self._mapped_size < self.header_size:
+            return None
+        if metrics.enabled:
+            metrics.count(bytes_read=self.header_size)
+        return bytes(self._view[:self.header_size])
+
+    def write_header(self, data: bytes):
+        """เขียน header ที่ต้นไฟล์"""
+        with self._write_lock:
+            self._file.seek(0)
+            self._file.write(data)
+            self._file.flush()
+        if metrics.enabled:
+            metrics.count(bytes_written=len(data))
+
+    def get(self, index: int) -> Optional[memoryview]:
+        """ดึง record ตาม index (คืนค่า None ถ้าเกินขอบเขต)"""
+        if index < 0 or index >= len(self):
+            return None
+        if metrics.enabled:
+            metrics.count(records=1, bytes_read=self.record_size)
+        offset = self.header_size + index * self.record_size
+        return self._view[offset:offset + self.record_size]
+
+    def get_many(self, indexes: Iterable[int]) -> Iterator[Tuple[int, memoryview]]:
+        """ดึงหลาย record ตาม index (ตรวจขนาดไฟล์ครั้งเดียว) -> (index, data) ข้าม index ที่เกินขอบเขต"""
+        count = len(self)
+        view, size, base = self._view, self.record_size, self.header_size
+        for index in indexes:
+            if 0 <= index < count:
+                if metrics.enabled:
+                    metrics.count(records=1, bytes_read=size)
+                offset = base + index * size
+                yield index, view[offset:offset + size]
+
+    def view(self, start: int = 0, stop: Optional[int] = None) -> memoryview:
+        """memoryview ต่อเนื่องของ record ช่วง [start, stop)"""
+        count = len(self)
+        if stop is None or stop > count:
+            stop = count
+        if start >= stop:
+            return memoryview(b'')
+        if metrics.enabled:
+            metrics.count(records=stop - start, bytes_read=(stop - start) * self.record_size)
+        base = self.header_size
+        return self._view[base + start * self.record_size:base + stop * self.record_size]
+
+    def _ranges(self, start: int, chunk_size: int
+                ) -> Tuple[memoryview, Iterator[Tuple[int, int, int, int]]]:
+        """view ของไฟล์และช่วงของแต่ละก้อน -> (index แรก, index ถัดจากตัวสุดท้าย, byte เริ่ม, byte จบ)
+
+        นับ record (ซึ่ง remap ถ้าไฟล์โตขึ้น) ก่อนหยิบ view ช่วงที่คืนจึงอยู่ใน view เสมอ
+        และเห็น record ที่เพิ่งต่อท้ายทั้งจาก process นี้และ process อื่น
+        """
+        count = len(self)
+        return self._view, self._chunk_ranges(self._mmap, start, count, chunk_size)
+
+    def _chunk_ranges(self, mapped: Optional[mmap.mmap], start: int, count: int,
+                      chunk_size: int) -> Iterator[Tuple[int, int, int, int]]:
+        """ก่อนคืนแต่ละก้อนจะบอก kernel ให้อ่านล่วงหน้าทั้งก้อน (MADV_WILLNEED)
+        แทนการเกิด page fault ทีละหน้าระหว่างวน
+        """
+        step = max(1, chunk_size // self.record_size)
+        for first in range(start, count, step):
+            last = min(first + step, count)
+            begin = self.header_size + first * self.record_size
+            end = self.header_size + last * self.record_size
+            if _WILLNEED is not None:
+                page = begin - begin % mmap.PAGESIZE
+                mapped.madvise(_WILLNEED, page, end - page)
+            yield first, last, begin, end
+
+    def chunks(self, start: int = 0,
+               chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, memoryview]]:
+        """วนอ่าน record ตั้งแต่ index start เป็นก้อนละประมาณ chunk_size bytes
+        -> (index ของ record แรกในก้อน, memoryview ของทั้งก้อน)
+
+        ก้อนเป็น memoryview บน mmap (ไม่ copy และใช้ต่อได้หลังวนไปก้อนอื่น)
+        """
+        view, ranges = self._ranges(start, chunk_size)
+        for first, last, begin, end in ranges:
+            if metrics.enabled:
+                metrics.count(records=last - first, bytes_read=end - begin)
+            yield first, view[begin:end]
+
+    def project(self, offsets: Sequence[int], start: int = 0,
+                chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, Tuple[memoryview, ...]]]:
+        """วนอ่านเฉพาะ byte ที่ตำแหน่ง offsets ในแต่ละ record เป็นก้อน
+        -> (index ของ record แรกในก้อน, column ละหนึ่ง memoryview)
+
+        column เป็น memoryview แบบ strided บน mmap (ไม่ copy) column[i] คือ byte ของ record ที่ first + i
+        ใช้กับ field 1 byte เช่น status/deleted ที่ต้องการนับหรือกรองโดยไม่แปลงทั้ง record
+        """
+        size = self.record_size
+        view, ranges = self._ranges(start, chunk_size)
+        for first, last, begin, end in ranges:
+            if metrics.enabled:
+                metrics.count(records=last - first, bytes_read=(last - first) * len(offsets))
+            yield first, tuple(view[begin + offset:end:size] for offset in offsets)
+
+    def scan(self, start: int = 0) -> Iterator[Tuple[int, memoryview]]:
+        """วนอ่านทุก record ตั้งแต่ index ที่กำหนด -> (index, data)"""
+        size = self.record_size
+        for first, chunk in self.chunks(start):
+            for index, offset in enumerate(range(0, len(chunk), size), first):
+                yield index, chunk[offset:offset + size]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        for _, data in self.scan():
+            yield data
+
+    def write(self, index: int, data: bytes):
+        """เขียนทับ record ที่ index (data อาจยาวหลาย record ติดกัน)"""
+        with self._write_lock:
+            self._file.seek(self.header_size + index * self.record_size)
+            self._file.write(data)
+            self._file.flush()
+        if metrics.enabled:
+            metrics.count(bytes_written=len(data))
+
+    def append(self, data: bytes) -> int:
+        """ต่อท้าย record ใหม่ แล้วคืนค่า index ของ record นั้น"""
+        index = len(self)
+        self.write(index, data)
+        return index
+
+    def sync(self):
+        """บังคับให้ข้อมูลที่เขียนแล้วลงดิสก์จริง (fsync)"""
+        os.fsync(self._file.fileno())
+
+    def compact(self, keep: Callable[[int, memoryview], bool]) -> int:
+        """เขียนไฟล์ใหม่เฉพาะ record ที่ keep(index, data) เป็นจริง คืนค่าจำนวน record ที่ถูกตัดออก
+
+        เขียนลงไฟล์ชั่วคราว (ชื่อไม่ซ้ำในโฟลเดอร์เดียวกัน) แล้ว rename ทับ ไฟล์เดิมจึงไม่เสียถ้าหยุดกลางทาง
+        (byte ท้ายไฟล์ที่ไม่ครบหนึ่ง record จะถูกตัดทิ้งไปด้วย)
+        process อื่นต้องไม่เปิดไฟล์นี้อยู่ (ผู้เรียกถือ UsageLock.exclusive() ไว้)
+        """
+        fd, temp_file = tempfile.mkstemp(prefix=os.path.basename(self.filename) + '.',
+                                         suffix='.tmp', dir=os.path.dirname(self.filename) or '.')
+        if hasattr(os, 'fchmod'):  # mkstemp สร้างไฟล์แบบ 0600 ให้สิทธิ์เหมือนไฟล์เดิม
+            os.fchmod(fd, os.fstat(self._file.fileno()).st_mode & 0o777)
+        removed = 0
+        if metrics.enabled:
+            metrics.count(files_opened=2)  # ไฟล์ชั่วคราว + เปิดไฟล์ใหม่หลัง rename
+        with open(fd, 'wb') as f:
+            header = self.read_header()
+            if header:
+                f.write(header)
+            for index, data in self.scan():
+                if keep(index, data):
+                    f.write(data)
+                else:
+                    removed += 1
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._release()
+        self._file.close()
+        os.replace(temp_file, self.filename)
+        self._file = open(self.filename, 'r+b')
+        self._mapped_size = -1
+        self._remap()
+        return removed
+
+    def close(self):
+        """ปิด mapping และไฟล์"""
+        self._release()
+        self._file.close()
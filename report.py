@@ -1,31 +1,38 @@
-import struct
 import os
+import sys
 import datetime
-from typing import Optional, List, Tuple
-from collections import Counter
+from typing import Iterator, Optional, Tuple
+
+from record_codec import RecordCodec
+from file_format import FormatError, init_file, pack_header
+from schema import PROGRAMS, detect_schema
+from report_analytics import SummaryCounter, numpy_counter
+from scanner import read_chunks
+from metrics import metrics
 
 
 class LibrarySystem:
     """ระบบห้องสมุด - Binary File, Fixed-Length Records"""
     
     def __init__(self):
-        # กำหนด format สำหรับบันทึกข้อมูล
+        # layout ประกาศไว้ใน schema.py
         # BookID(4) + ISBN(13) + Title(50) + Author(30) + Year(4) + Category(20) + Status(1) + Borrowed(1) + Deleted(1)
-        self.book_format = '<I13s50s30s4s20sccc'
+        self.table = PROGRAMS['report'].tables['books']
+        self.book_codec = self.table.schema.codec
+        self.book_format = self.book_codec.format
         
         # คำนวณขนาด record
-        self.book_size = struct.calcsize(self.book_format)
+        self.book_size = self.book_codec.size
         
         # ชื่อไฟล์
-        self.books_file = 'books.dat'
+        self.books_file = self.table.filename
         self.report_file = 'library_report.txt'
         
         self._init_files()
     
     def _init_files(self):
-        """สร้างไฟล์เปล่าถ้ายังไม่มี"""
-        if not os.path.exists(self.books_file):
-            open(self.books_file, 'wb').close()
+        """สร้างไฟล์เปล่า (มีแค่ header) ถ้ายังไม่มี"""
+        init_file(self.books_file, self.book_codec)
     
     def _encode(self, text: str, length: int) -> bytes:
         """แปลง string -> bytes ความยาวคงที่"""
@@ -51,9 +58,9 @@ class LibrarySystem:
         ]
         
         with open(self.books_file, 'wb') as f:
+            f.write(pack_header(self.book_codec))
             for book in sample_books:
-                data = struct.pack(
-                    self.book_format,
+                data = self.book_codec.pack(
                     book[0],
                     self._encode(book[1], 13),
                     self._encode(book[2], 50),
@@ -68,88 +75,117 @@ class LibrarySystem:
         
         print("เพิ่มข้อมูลตัวอย่างสำเร็จ!")
     
+    @metrics.operation()
     def generate_summary_report(self):
         """สร้าง Summary Report และบันทึกเป็นไฟล์ .txt"""
         if not os.path.exists(self.books_file) or os.path.getsize(self.books_file) == 0:
             print("ไม่มีข้อมูลในระบบ")
             return
         
-        # อ่านข้อมูลทั้งหมด
-        books = []
-        with open(self.books_file, 'rb') as f:
-            while True:
-                data = f.read(self.book_size)
-                if not data or len(data) != self.book_size:
-                    break
-                try:
-                    book = struct.unpack(self.book_format, data)
-                    books.append(book)
-                except struct.error:
-                    break
-        
-        # คำนวณสถิติ
-        total_books = len(books)
-        active_books = [b for b in books if b[8] == b'0']
-        deleted_books = [b for b in books if b[8] == b'1']
-        borrowed_books = [b for b in active_books if b[7] == b'1']
-        available_books = [b for b in active_books if b[7] == b'0']
-        
-        # นับจำนวนหนังสือตามหมวดหมู่ (เฉพาะ Active)
-        categories = Counter([self._decode(b[5]) for b in active_books])
-        
-        # เปิดไฟล์เพื่อเขียน Report
-        with open(self.report_file, 'w', encoding='utf-8') as report:
-            # พิมพ์ Header
-            now = datetime.datetime.now()
-            report.write("Library Management System - Summary Report (Sample)\n")
-            report.write(f"Generated At : {now.strftime('%Y-%m-%d %H:%M:%S')} (+07:00)\n")
-            report.write("App Version  : 1.0\n")
-            report.write("Endianness   : Little-Endian\n")
-            report.write("Encoding     : UTF-8 (fixed-length)\n")
-            report.write("\n")
-            
-            # พิมพ์ตารางรายการหนังสือ
-            report.write("+" + "-"*8 + "+" + "-"*15 + "+" + "-"*35 + "+" + "-"*25 + "+" + "-"*6 + "+" + "-"*18 + "+" + "-"*10 + "+" + "-"*10 + "+\n")
-            report.write(f"| {'BookID':<6} | {'ISBN':<13} | {'Title':<33} | {'Author':<23} | {'Year':<4} | {'Category':<16} | {'Status':<8} | {'Borrowed':<8} |\n")
-            report.write("+" + "-"*8 + "+" + "-"*15 + "+" + "-"*35 + "+" + "-"*25 + "+" + "-"*6 + "+" + "-"*18 + "+" + "-"*10 + "+" + "-"*10 + "+\n")
-            
-            for book in books:
-                book_id = book[0]
-                isbn = self._decode(book[1])
-                title = self._decode(book[2])[:31]
-                author = self._decode(book[3])[:21]
-                year = self._decode(book[4])
-                category = self._decode(book[5])[:14]
-                status = "Active" if book[6] == b'1' else "Inactive"
-                borrowed = "Yes" if book[7] == b'1' else "No"
-                deleted = book[8]
-                
-                # ถ้าถูกลบให้แสดง Deleted
-                if deleted == b'1':
-                    status = "Deleted"
-                
-                report.write(f"| {book_id:<6} | {isbn:<13} | {title:<33} | {author:<23} | {year:<4} | {category:<16} | {status:<8} | {borrowed:<8} |\n")
-            
-            report.write("+" + "-"*8 + "+" + "-"*15 + "+" + "-"*35 + "+" + "-"*25 + "+" + "-"*6 + "+" + "-"*18 + "+" + "-"*10 + "+" + "-"*10 + "+\n")
-            report.write("\n")
-            
-            # สรุปสถิติ
-            report.write(f"Summary (นับเฉพาะหนังสือที่ Active)\n")
-            report.write(f"- Total Books (records) : {total_books}\n")
-            report.write(f"- Active Books          : {len(active_books)}\n")
-            report.write(f"- Deleted Books         : {len(deleted_books)}\n")
-            report.write(f"- Currently Borrowed    : {len(borrowed_books)}\n")
-            report.write(f"- Available Now         : {len(available_books)}\n")
-            report.write("\n")
-            
-            report.write(f"Books by Category (Active only)\n")
-            for category, count in sorted(categories.items()):
-                report.write(f"- {category:<20} : {count}\n")
-            report.write("\n")
+        # อ่านได้ทั้งไฟล์ที่มี header และไฟล์รุ่นก่อน ขอแค่มี field ครบตามลำดับที่ Report ใช้
+        try:
+            codec, start = self._detect_codec()
+        except FormatError as e:
+            print(f"❌ {e}")
+            return
+        if os.path.getsize(self.books_file) - start < codec.size:
+            print("ไม่มีข้อมูลในระบบ")  # มีแค่ header
+            return
+        
+        # สถิติคำนวณด้วย NumPy ถ้ามี (None = นับด้วย Python ระหว่างเขียนตาราง)
+        counter = numpy_counter(codec)
+        
+        # อ่านไฟล์รอบเดียวเป็นก้อนใหญ่ลง buffer เดียวที่ใช้ซ้ำ แต่ละก้อนใช้ทั้งนับสถิติ
+        # และแปลงเป็นแถวของตารางทันที หน่วยความจำจึงไม่ขึ้นกับขนาดไฟล์
+        # (iter_unpack copy ค่าออกมาก่อน buffer ถูกเขียนทับ)
+        with open(self.books_file, 'rb') as f, open(self.report_file, 'w', encoding='utf-8') as report:
+            if metrics.enabled:
+                metrics.count(files_opened=2)
+            self._write_report(report, self._rows(f, codec, start, counter), counter, codec)
+            if metrics.enabled:
+                metrics.count(bytes_written=report.tell())
         
         print(f"สร้าง Report สำเร็จ! บันทึกที่: {self.report_file}")
         print(f"สามารถเปิดไฟล์ {self.report_file} เพื่อดูรายงานได้")
     
+    def _detect_codec(self) -> Tuple[RecordCodec, int]:
+        """codec ของข้อมูลที่อยู่ใน books.dat ตอนนี้ และตำแหน่ง record แรก"""
+        schema, start = detect_schema(self.books_file, self.table)
+        if schema.codec.fields != self.book_codec.fields:
+            raise FormatError(f"{self.books_file} เก็บ field {', '.join(schema.codec.fields)} "
+                              f"ซึ่งไม่ใช่ข้อมูลของ Report")
+        return schema.codec, start
+    
+    @staticmethod
+    def _rows(f, codec: RecordCodec, start: int, counter=None) -> Iterator[tuple]:
+        """แถวทั้งหมดของไฟล์ทีละก้อน (ส่งแต่ละก้อนให้ counter นับสถิติก่อนแปลงเป็นแถว)"""
+        for chunk in read_chunks(f, codec.size, start):
+            if counter is not None:
+                counter.add_chunk(chunk)
+            yield from codec.iter_unpack(chunk)
+    
+    def _write_report(self, report, books, counter=None, codec: Optional[RecordCodec] = None):
+        """เขียน Report จาก books (iterator ของ Row) ในการวนรอบเดียว
+        
+        counter คือตัวนับที่ได้ข้อมูลเองระหว่างอ่าน books (เช่น NumpyCounter)
+        ถ้าไม่ได้ส่งมา จะสะสมสถิติทีละแถวไประหว่างเขียนตาราง
+        """
+        separator = "+" + "-"*8 + "+" + "-"*15 + "+" + "-"*35 + "+" + "-"*25 + "+" + "-"*6 + "+" + "-"*18 + "+" + "-"*10 + "+" + "-"*10 + "+\n"
+        
+        # พิมพ์ Header
+        now = datetime.datetime.now()
+        report.write("Library Management System - Summary Report (Sample)\n")
+        report.write(f"Generated At : {now.strftime('%Y-%m-%d %H:%M:%S')} (+07:00)\n")
+        report.write("App Version  : 1.0\n")
+        report.write("Endianness   : Little-Endian\n")
+        report.write("Encoding     : UTF-8 (fixed-length)\n")
+        report.write("\n")
+        
+        # พิมพ์ตารางรายการหนังสือ
+        report.write(separator)
+        report.write(f"| {'BookID':<6} | {'ISBN':<13} | {'Title':<33} | {'Author':<23} | {'Year':<4} | {'Category':<16} | {'Status':<8} | {'Borrowed':<8} |\n")
+        report.write(separator)
+        
+        row_counter = SummaryCounter(codec or self.book_codec) if counter is None else None
+        
+        for book in books:
+            if row_counter is not None:
+                row_counter.add(book)
+            book_id = book[0]
+            isbn = self._decode(book[1])
+            title = self._decode(book[2])[:31]
+            author = self._decode(book[3])[:21]
+            year = self._decode(book[4])
+            category = self._decode(book[5])[:14]
+            status = "Active" if book[6] == b'1' else "Inactive"
+            borrowed = "Yes" if book[7] == b'1' else "No"
+            deleted = book[8]
+            
+            # ถ้าถูกลบให้แสดง Deleted
+            if deleted == b'1':
+                status = "Deleted"
+            
+            report.write(f"| {book_id:<6} | {isbn:<13} | {title:<33} | {author:<23} | {year:<4} | {category:<16} | {status:<8} | {borrowed:<8} |\n")
+        
+        summary = (counter or row_counter).result()
+        
+        report.write(separator)
+        report.write("\n")
+        
+        # สรุปสถิติ
+        report.write(f"Summary (นับเฉพาะหนังสือที่ Active)\n")
+        report.write(f"- Total Books (records) : {summary.total}\n")
+        report.write(f"- Active Books          : {summary.active}\n")
+        report.write(f"- Deleted Books         : {summary.deleted}\n")
+        report.write(f"- Currently Borrowed    : {summary.borrowed}\n")
+        report.write(f"- Available Now         : {summary.available}\n")
+        report.write("\n")
+        
+        report.write(f"Books by Category (Active only)\n")
+        for category, count in sorted(summary.categories.items()):
+            report.write(f"- {category:<20} : {count}\n")
+        report.write("\n")
+    
     def run(self):
         """รันโปรแกรม"""
         while True:
@@ -177,5 +213,9 @@ class LibrarySystem:
 
 
 if __name__ == "__main__":
-    system = LibrarySystem()
+    try:
+        system = LibrarySystem()
+    except FormatError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
     system.run()
\ No newline at end of file
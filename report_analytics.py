@@ -0,0 +1,95 @@
+from collections import Counter
+from typing import Dict, NamedTuple, Optional
+
+from record_codec import RecordCodec
+
+try:
+    import numpy as np
+except ImportError:  # ไม่มี NumPy: ใช้ SummaryCounter นับทีละ record แทน
+    np = None
+
+
+class BookSummary(NamedTuple):
+    total: int          # จำนวน record ทั้งหมด
+    active: int         # deleted = '0'
+    deleted: int        # deleted = '1'
+    borrowed: int       # active และ borrowed = '1'
+    available: int      # active และ borrowed = '0'
+    categories: Dict[str, int]  # จำนวนหนังสือ active ตามหมวดหมู่
+
+
+class SummaryCounter:
+    """สะสมสถิติของ Report ทีละ record (ใช้เมื่อไม่มี NumPy)"""
+
+    def __init__(self, codec: RecordCodec):
+        self.category = codec.index('category')
+        self.borrowed_flag = codec.index('borrowed')
+        self.deleted_flag = codec.index('deleted')
+        self.total = self.active = self.deleted = self.borrowed = self.available = 0
+        self.categories = Counter()
+
+    def add(self, book):
+        self.total += 1
+        deleted = book[self.deleted_flag]
+        if deleted == b'1':
+            self.deleted += 1
+        elif deleted == b'0':
+            self.active += 1
+            self.categories[book[self.category].decode('utf-8').rstrip('\x00')] += 1
+            borrowed = book[self.borrowed_flag]
+            if borrowed == b'1':
+                self.borrowed += 1
+            elif borrowed == b'0':
+                self.available += 1
+
+    def result(self) -> BookSummary:
+        return BookSummary(self.total, self.active, self.deleted, self.borrowed,
+                           self.available, dict(self.categories))
+
+
+def numpy_dtype(codec: RecordCodec):
+    """structured dtype ที่ตรงกับ layout ของ codec (ไม่มี padding)"""
+    order = '>' if codec.format[0] in '>!' else '<'
+    fields = []
+    for name, code, width in zip(codec.fields, codec.codes, codec.widths):
+        if code in 'sc':
+            fields.append((name, f'S{width}'))
+        else:
+            fields.append((name, order + code))
+    return np.dtype(fields)
+
+
+class NumpyCounter:
+    """สะสมสถิติของ Report ทีละก้อนแบบ vectorized ด้วย NumPy
+
+    มองก้อนเป็น structured array (np.frombuffer ไม่ copy) ก้อนจึงเป็นก้อนเดียวกับที่ใช้เขียนตารางได้
+    """
+
+    def __init__(self, codec: RecordCodec):
+        self.dtype = numpy_dtype(codec)
+        self.total = self.active = self.deleted = self.borrowed = self.available = 0
+        self.categories = Counter()
+
+    def add_chunk(self, chunk):
+        books = np.frombuffer(chunk, dtype=self.dtype)
+        self.total += len(books)
+        is_active = books['deleted'] == b'0'
+        self.deleted += int(np.count_nonzero(books['deleted'] == b'1'))
+        self.active += int(np.count_nonzero(is_active))
+        self.borrowed += int(np.count_nonzero(is_active & (books['borrowed'] == b'1')))
+        self.available += int(np.count_nonzero(is_active & (books['borrowed'] == b'0')))
+
+        names, counts = np.unique(books['category'][is_active], return_counts=True)
+        for name, n in zip(names, counts):
+            # dtype S ตัด \x00 ท้ายให้แล้ว แปลงแบบเดียวกับ _decode เพื่อให้ชื่อหมวดตรงกัน
+            self.categories[name.decode('utf-8').rstrip('\x00')] += int(n)
+
+    def result(self) -> BookSummary:
+        return BookSummary(self.total, self.active, self.deleted, self.borrowed,
+                           self.available, dict(self.categories))
+
+
+def numpy_counter(codec: RecordCodec) -> Optional[NumpyCounter]:
+    """NumpyCounter ของ codec (None ถ้าไม่มี NumPy ให้ใช้ SummaryCounter ทีละ record แทน)"""
+    return NumpyCounter(codec) if np is not None else None
+
@@ -0,0 +1,76 @@
+from collections import Counter
+from itertools import chain
+from typing import BinaryIO, Iterator, Optional
+
+from metrics import metrics
+
+CHUNK_SIZE = 4 << 20   # ขนาดก้อนที่อ่านต่อครั้ง (bytes)
+
+
+def read_chunks(f: BinaryIO, record_size: int, start: int = 0, stop: Optional[int] = None,
+                chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+    """อ่านไฟล์เป็นก้อนใหญ่ด้วย readinto ลง bytearray ตัวเดียวที่ใช้ซ้ำทุกก้อน
+
+    yield memoryview ของ record เต็มจำนวน (ยาวเป็นจำนวนเท่าของ record_size)
+    ตั้งแต่ byte ที่ start ถึง stop (None = ท้ายไฟล์) byte ท้ายไฟล์ที่ไม่ครบหนึ่ง record ถูกข้าม
+    memoryview ใช้ได้จนถึงก้อนถัดไปเท่านั้น ถ้าจะเก็บ record ไว้ต้อง copy (bytes() หรือ unpack)
+    """
+    buffer = bytearray(max(1, chunk_size // record_size) * record_size)
+    view = memoryview(buffer)
+    remaining = None if stop is None else max(0, stop - start)
+    f.seek(start)
+
+    while remaining != 0:
+        limit = len(buffer) if remaining is None else min(len(buffer), remaining)
+        filled = 0
+        while filled < limit:
+            n = f.readinto(view[filled:limit])
+            if not n:
+                break
+            filled += n
+        if remaining is not None:
+            remaining -= filled
+
+        usable = filled - filled % record_size
+        if metrics.enabled:
+            metrics.count(records=usable // record_size, bytes_read=filled)
+        if usable:
+            yield view[:usable]
+        if filled < limit:
+            return  # ถึงท้ายไฟล์
+
+
+def iter_records(chunks: Iterator[memoryview], record_size: int) -> Iterator[memoryview]:
+    """แยกก้อนจาก read_chunks / RecordStore.chunks เป็น memoryview ทีละ record (ไม่ copy)"""
+    for chunk in chunks:
+        for offset in range(0, len(chunk), record_size):
+            yield chunk[offset:offset + record_size]
+
+
+def scan_views(store, codec, **equals: bytes):
+    """RecordView ทุก record ของ store อ่านทีละก้อน (กรองจาก byte ดิบแบบ codec.iter_views)"""
+    return chain.from_iterable(codec.iter_views(chunk, **equals) for _, chunk in store.chunks())
+
+
+def scan_rows(store, codec):
+    """Row ทุก record ของ store แปลงทีละก้อนด้วย codec.iter_unpack"""
+    return chain.from_iterable(codec.iter_unpack(chunk) for _, chunk in store.chunks())
+
+
+def count_by(store, codec, *fields: str) -> Counter:
+    """นับจำนวน record ของ store ตามค่าของ field 1 byte (เช่น status, deleted)
+
+    อ่านเฉพาะ byte ของ field เหล่านั้นด้วย store.project (ไม่แปลงทั้ง record)
+    คืนค่า Counter ที่ key เป็นค่าของทุก field ต่อกัน เช่น count_by(books, codec, 'status', 'deleted')[b'A0']
+    """
+    offsets = []
+    for name in fields:
+        i = codec.index(name)
+        if codec.widths[i] != 1:
+            raise ValueError(f"count_by ใช้ได้กับ field 1 byte เท่านั้น ({name} ยาว {codec.widths[i]} bytes)")
+        offsets.append(codec.offsets[i])
+
+    counts = Counter()
+    for _, columns in store.project(offsets):
+        counts.update(zip(*columns))  # นับใน C ไม่ต้องวนทีละ record ใน Python
+    return Counter({bytes(key): n for key, n in counts.items()})
@@ -0,0 +1,228 @@
+import struct
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from record_codec import RecordCodec
+from record_store import RecordStore
+from file_format import FileLayout, FormatError, read_layout
+from indexes import HashIndex, PrimaryIndex, TextIndex, index_filename
+
+# ชนิดของ field -> struct code ('id' ใช้ id_type ของ schema, 'text' ใช้ความกว้าง)
+TYPE_CODES = {'uint32': 'I', 'uint64': 'Q', 'int64': 'q', 'char': 'c'}
+
+
+class Field(NamedTuple):
+    name: str
+    type: str        # 'id', 'text', 'char', 'uint32', 'uint64' หรือ 'int64'
+    width: int = 0   # ความยาวของ text (bytes)
+
+
+def id_field(name: str) -> Field:
+    return Field(name, 'id')
+
+
+def text(name: str, width: int) -> Field:
+    return Field(name, 'text', width)
+
+
+def char(name: str) -> Field:
+    return Field(name, 'char')
+
+
+def uint32(name: str) -> Field:
+    return Field(name, 'uint32')
+
+
+def int64(name: str) -> Field:
+    return Field(name, 'int64')
+
+
+class IndexSpec(NamedTuple):
+    """นิยามดัชนีของตาราง (ไฟล์ดัชนีคือ <ไฟล์ข้อมูล>.idx สำหรับดัชนีหลัก หรือ <ไฟล์ข้อมูล>_<name>.idx)"""
+    name: str
+    kind: str                            # 'primary', 'hash' หรือ 'text'
+    fields: Tuple[str, ...]              # field ที่เป็น key (text: field ที่ค้นหาได้)
+    where: Tuple[Tuple[str, bytes], ...] = ()   # เก็บเฉพาะ record ที่ field ตรงกับค่าเหล่านี้
+
+
+def primary(field: str = 'id') -> IndexSpec:
+    return IndexSpec('id', 'primary', (field,))
+
+
+def hash_index(name: str, field: str, **where: bytes) -> IndexSpec:
+    return IndexSpec(name, 'hash', (field,), tuple(where.items()))
+
+
+def text_index(name: str, fields: Sequence[str], **where: bytes) -> IndexSpec:
+    return IndexSpec(name, 'text', tuple(fields), tuple(where.items()))
+
+
+class Schema:
+    """layout ของ record ที่ประกาศจากรายการ field
+
+    สร้าง RecordCodec (format, offset, struct ที่ compile แล้ว) และดัชนีของตารางจากนิยามเดียว
+    """
+
+    def __init__(self, name: str, fields: Sequence[Field], indexes: Sequence[IndexSpec] = (),
+                 id_type: str = 'I'):
+        self.name = name
+        self.fields = tuple(fields)
+        self.indexes = {spec.name: spec for spec in indexes}
+        self.id_type = id_type
+        self.format = '<' + ''.join(self._code(field) for field in self.fields)
+        self.codec = RecordCodec(self.format, [field.name for field in self.fields], name)
+        self.size = self.codec.size
+        self.offsets = dict(zip(self.codec.fields, self.codec.offsets))
+
+    def _code(self, field: Field) -> str:
+        if field.type == 'id':
+            return self.id_type
+        if field.type == 'text':
+            return f'{field.width}s'
+        return TYPE_CODES[field.type]
+
+    def with_id(self, id_type: str) -> 'Schema':
+        """schema เดียวกันที่เก็บ ID เป็น id_type (เช่น '3s' = ID ข้อความของไฟล์รุ่นก่อน)"""
+        return Schema(self.name, self.fields, self.indexes.values(), id_type)
+
+    def field_format(self, name: str) -> str:
+        """struct code ของ field เดียว (เช่น 'I' หรือ '10s')"""
+        i = self.codec.index(name)
+        code = self.codec.codes[i]
+        return f'{self.codec.widths[i]}s' if code == 's' else code
+
+    def where(self, **equals: bytes) -> Callable[[bytes], bool]:
+        """predicate ที่เทียบ byte ดิบของ field กับค่าที่ระบุ เช่น where(status=b'B', deleted=b'0')
+
+        field ที่อยู่ติดกันรวมเป็นการเทียบ slice เดียว record จึงไม่ต้องถูกแปลงก่อนกรอง
+        """
+        checks = []
+        for name, value in sorted(equals.items(), key=lambda item: self.offsets[item[0]]):
+            start = self.offsets[name]
+            if len(value) != self.codec.widths[self.codec.index(name)]:
+                raise ValueError(f"ค่าของ {name} ต้องยาว {self.codec.widths[self.codec.index(name)]} bytes")
+            if checks and checks[-1][1] == start:
+                first, _, expected = checks.pop()
+                checks.append((first, start + len(value), expected + value))
+            else:
+                checks.append((start, start + len(value), value))
+
+        if len(checks) == 1:
+            (start, end, expected), = checks
+            return lambda record: record[start:end] == expected
+        return lambda record: all(record[start:end] == expected for start, end, expected in checks)
+
+    def open_index(self, name: str, data_file: str, store: RecordStore):
+        """เปิดดัชนีตามนิยาม name ของไฟล์ข้อมูล data_file"""
+        spec = self.indexes[name]
+        if spec.kind == 'primary':
+            field = spec.fields[0]
+            return PrimaryIndex(index_filename(data_file), store, self.field_format(field), self.offsets[field])
+
+        filename = index_filename(data_file, '_' + spec.name)
+        include = self.where(**dict(spec.where))
+        if spec.kind == 'text':
+            return TextIndex(filename, store, self.codec, spec.fields, include)
+        field = spec.fields[0]
+        return HashIndex(filename, store, self.field_format(field), self.offsets[field], include)
+
+    def matches(self, layout: FileLayout) -> bool:
+        return layout.matches(self.codec)
+
+    @classmethod
+    def from_layout(cls, layout: FileLayout) -> 'Schema':
+        """schema ของ layout ที่อ่านจาก header (ใช้อ่านไฟล์ที่ไม่ตรงกับ schema ใดในระบบ)"""
+        codec = layout.codec()
+        types = {code: name for name, code in TYPE_CODES.items()}
+        fields = []
+        for name, code, width in zip(codec.fields, codec.codes, codec.widths):
+            if code == 's':
+                fields.append(text(name, width))
+            elif code in types:
+                fields.append(Field(name, types[code]))
+            else:
+                raise FormatError(f"ไม่รู้จักชนิด '{code}' ของ field {name}")
+        return cls(layout.name, fields)
+
+
+class Table(NamedTuple):
+    """ไฟล์ข้อมูลหนึ่งไฟล์ของโปรแกรม"""
+    filename: str
+    schema: Schema                 # layout ที่โปรแกรมใช้อยู่
+    legacy: Schema                 # layout ของไฟล์รุ่นก่อนที่ไม่มี header
+    in_wal: bool = True            # อยู่ใน WAL (ตามลำดับ store ที่โปรแกรมส่งให้ WriteAheadLog)
+
+
+class Program(NamedTuple):
+    tables: Dict[str, Table]       # เรียงตามลำดับ store ใน WAL
+    id_type: str                   # struct code ของ ID
+    id_digits: int                 # จำนวนหลักที่แสดง ID (เติม 0 ข้างหน้า)
+    wal: Optional[str] = None      # ไฟล์ WAL ของโปรแกรม
+
+    @property
+    def max_id(self) -> int:
+        """ID มากที่สุดที่เก็บได้"""
+        return (1 << 8 * struct.calcsize('<' + self.id_type)) - 1
+
+
+def detect_schema(filename: str, table: Table) -> Tuple[Schema, int]:
+    """หา schema ของข้อมูลที่อยู่ในไฟล์ตอนนี้ คืนค่า (schema, ตำแหน่ง record แรก)
+
+    ไฟล์ที่มี header ใช้ layout จาก header (ใช้ schema ของตารางถ้าตรงกัน)
+    ไฟล์รุ่นก่อนที่ไม่มี header ใช้ layout รุ่นก่อนของตาราง
+    """
+    layout = read_layout(filename)
+    if layout is None:
+        return table.legacy, 0
+    for schema in (table.schema, table.legacy):
+        if schema.matches(layout):
+            return schema, layout.header_size
+    return Schema.from_layout(layout), layout.header_size
+
+
+# ==================== schema ของทุกโปรแกรม ====================
+
+BOOK = (id_field('id'), text('title', 100), text('author', 50), text('year', 4),
+        text('status', 1), text('deleted', 1))
+BORROW = (id_field('id'), id_field('book_id'), id_field('member_id'), text('borrow_date', 10),
+          text('return_date', 10), text('status', 1), text('deleted', 1))
+BOOK_INDEXES = (primary(), text_index('text', ('title', 'author'), deleted=b'0'))
+BORROW_INDEXES = (primary(),
+                  # รายการยืมที่ยังไม่คืน (สถานะ B และยังไม่ถูกลบ) แยกตามสมาชิกและตามหนังสือ
+                  hash_index('member', 'member_id', status=b'B', deleted=b'0'),
+                  hash_index('book', 'book_id', status=b'B', deleted=b'0'))
+
+
+def _library(id_type: str, id_digits: int, member: Schema, counters: bool) -> Program:
+    """โปรแกรม SimpleLibrary (test2/test3): ไฟล์รุ่นก่อนเก็บ ID เป็นข้อความ id_digits หลัก"""
+    legacy_id = f'{id_digits}s'
+    tables = {}
+    for key, filename, schema, in_wal in (
+        ('books', 'books.dat', Schema('Book', BOOK, BOOK_INDEXES), True),
+        ('members', 'members.dat', member, True),
+        ('borrows', 'borrows.dat', Schema('Borrow', BORROW, BORROW_INDEXES), True),
+        ('counters', 'library.cnt', Schema('Counters', [int64(name) for name in (
+            'total_books', 'available_books', 'active_members', 'active_borrows')]), True),
+        ('archive', 'borrows_archive.dat', Schema('Borrow', BORROW), False),
+    ):
+        if key == 'counters' and not counters:
+            continue
+        tables[key] = Table(filename, schema.with_id(id_type), schema.with_id(legacy_id), in_wal)
+    return Program(tables, id_type, id_digits, 'library.wal')
+
+
+REPORT_BOOK = Schema('Book', (
+    uint32('id'), text('isbn', 13), text('title', 50), text('author', 30), text('year', 4),
+    text('category', 20), char('status'), char('borrowed'), char('deleted'),
+))
+
+PROGRAMS: Dict[str, Program] = {
+    'test2': _library('I', 3, Schema('Member', (
+        id_field('id'), text('name', 50), text('student_id', 10), text('phone', 15),
+        text('join_date', 10), text('status', 1), text('deleted', 1),
+    ), (primary(), hash_index('student', 'student_id', deleted=b'0'))), counters=True),
+    'test3': _library('I', 4, Schema('Member', (
+        id_field('id'), text('name', 50), text('phone', 15), text('join_date', 10),
+        text('status', 1), text('deleted', 1),
+    ), (primary(),)), counters=True),
+    'report': Program({'books': Table('books.dat', REPORT_BOOK, REPORT_BOOK, in_wal=False)}, 'I', 0),
+}
@@ -0,0 +1,125 @@
+import os
+import struct
+import threading
+from typing import Optional
+
+from record_store import RecordStore
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows ไม่มี fcntl: ใช้ได้อย่างปลอดภัยเฉพาะ process เดียว
+    fcntl = None
+
+
+def sequence_filename(data_file: str) -> str:
+    """ชื่อไฟล์ sequence ที่คู่กับไฟล์ข้อมูล เช่น books.dat -> books.seq"""
+    return os.path.splitext(data_file)[0] + '.seq'
+
+
+class IdSequence:
+    """ตัวนับ ID ถัดไปที่เก็บในไฟล์เล็กๆ คู่กับไฟล์ข้อมูล (เช่น books.seq)
+
+    ขอ ID ใหม่ได้ใน O(1) โดยไม่ต้องอ่านไฟล์ข้อมูล และจองทีละหลาย ID ได้ (reserve)
+    จองจากไฟล์ครั้งละหนึ่งก้อน (block ตัว) แล้วแจก ID จากก้อนในหน่วยความจำ
+    จึง flock + fsync ไฟล์ครั้งเดียวต่อก้อน ไม่ใช่ทุกครั้งที่ขอ ID
+    ล็อกไฟล์ระหว่างอ่าน-เขียน (flock) จึงใช้พร้อมกันหลาย process ได้ (ID จากคนละ process อาจสลับก้อนกัน)
+    release() คืน ID ที่เหลือในก้อนถ้ายังไม่มี process อื่นจองต่อ ID จึงไม่เว้นช่วงเมื่อใช้ terminal เดียว
+    ถ้าไฟล์ยังไม่มีหรือเสีย จะเริ่มจาก ID มากที่สุดในไฟล์ข้อมูล + 1 (ไม่ขึ้นกับลำดับ record)
+    id_format เป็นรหัส struct ของ field ID: 'I'/'Q' = เลขฐานสอง, '4s' = ตัวเลขแบบข้อความ
+    """
+
+    MAGIC = b'SEQ_'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHQ')  # Magic + Version + NextID
+
+    BLOCK = 64  # จำนวน ID ที่จองจากไฟล์ต่อครั้ง
+
+    def __init__(self, filename: str, data: RecordStore, id_format: str,
+                 id_offset: int = 0, start: int = 1, block: int = BLOCK):
+        self.filename = filename
+        self.data = data
+        self.id_field = struct.Struct('<' + id_format)
+        self.id_offset = id_offset
+        self.start = start
+        self.block = block
+        self._lock = threading.Lock()
+        self._next = self._end = 0  # ก้อนที่จองไว้แล้ว [_next, _end)
+
+    def _max_id(self) -> int:
+        """ID มากที่สุดในไฟล์ข้อมูล (อ่านทั้งไฟล์ ใช้เฉพาะตอนเริ่ม sequence)"""
+        highest = self.start - 1
+        for record in self.data:
+            value = self.id_field.unpack_from(record, self.id_offset)[0]
+            if isinstance(value, bytes):
+                value = value.rstrip(b'\x00')
+                if not value.isdigit():
+                    continue
+            highest = max(highest, int(value))
+        return highest
+
+    def _read(self, f) -> int:
+        header = f.read(self.HEADER.size)
+        if metrics.enabled:
+            metrics.count(files_opened=1, bytes_read=len(header))
+        if len(header) == self.HEADER.size:
+            magic, version, next_id = self.HEADER.unpack(header)
+            if magic == self.MAGIC and version == self.VERSION:
+                return next_id
+        return self._max_id() + 1
+
+    def _write(self, f, next_id: int, sync: bool):
+        f.seek(0)
+        f.write(self.HEADER.pack(self.MAGIC, self.VERSION, next_id))
+        if metrics.enabled:
+            metrics.count(bytes_written=self.HEADER.size)
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+
+    def _open(self):
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+        f = os.fdopen(fd, 'r+b')
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # ปลดล็อกเองเมื่อปิดไฟล์
+        return f
+
+    @metrics.operation()
+    def reserve(self, count: int = 1, limit: Optional[int] = None) -> int:
+        """จอง ID ต่อเนื่องกัน count ตัว คืนค่า ID แรก
+
+        ถ้าระบุ limit แล้ว ID สุดท้ายจะเกิน limit จะ raise OverflowError โดยไม่จองอะไรเลย
+        """
+        with self._lock:
+            if self._end - self._next >= count:
+                first = self._next
+            else:
+                # ก้อนในหน่วยความจำไม่พอ: จองก้อนใหม่จากไฟล์ (fsync ก่อนใช้ ID เพื่อไม่ให้ ID ซ้ำหลังระบบล่ม)
+                with self._open() as f:
+                    stored = self._read(f)
+                    # ถ้ายังไม่มี process อื่นจองต่อจากก้อนเดิม ต่อก้อนเดิมได้เลย (ID ไม่เว้นช่วง)
+                    first = self._next if stored == self._end and self._next else stored
+                    if limit is not None and first + count - 1 > limit:
+                        raise OverflowError(f"ID {first + count - 1} เกินค่าสูงสุด {limit}")
+                    end = first + count + self.block - 1
+                    if limit is not None:
+                        end = min(end, limit + 1)
+                    self._write(f, end, sync=True)
+                self._end = end
+            self._next = first + count
+            return first
+
+    def release(self):
+        """คืน ID ที่จองไว้แต่ยังไม่ได้ใช้ (ถ้าไม่มี process อื่นจองต่อไปแล้ว) เรียกตอนปิดโปรแกรม"""
+        with self._lock:
+            if self._next == self._end:
+                return
+            with self._open() as f:
+                if self._read(f) == self._end:
+                    # ไม่ fsync: ถ้าหายไป ไฟล์ยังเป็นค่าที่มากกว่า (ID เว้นช่วงได้แต่ไม่ซ้ำ)
+                    self._write(f, self._next, sync=False)
+            self._end = self._next
+
+    def next_id(self) -> int:
+        """ขอ ID ใหม่หนึ่งตัว"""
+        return self.reserve(1)
@@ -1,62 +1,24 @@
-import struct
-import os
-import datetime
+import sys
 from typing import Optional, List, Tuple
 
+from bulk_export import FORMATS, Exporter
+from bulk_import import BulkImporter, print_result
+from file_format import FormatError
+from library_service import LibraryError, LibraryService
+from metrics import metrics
+
 
 class SimpleLibrary:
-    """ระบบจัดการห้องสมุด - Binary File, Fixed-Length Records"""
-    
-    MAX_BORROW_LIMIT = 3  # จำนวนหนังสือที่ยืมได้สูงสุดต่อคน
-    
-    # การตั้งค่า ID (สามารถแก้ไขได้)
-    BOOK_ID_START = 1       # เลขเริ่มต้นสำหรับหนังสือ
-    MEMBER_ID_START = 1     # เลขเริ่มต้นสำหรับสมาชิก
-    BORROW_ID_START = 1     # เลขเริ่มต้นสำหรับรายการยืม
-    ID_LENGTH = 3           # จำนวนหลักของ ID (3 หลัก = 001, 002, 003, ...)
-    
-    def __init__(self):
-        # กำหนด format สำหรับบันทึกข้อมูล
-        self.book_format = '<3s100s50s4s1s1s'  # ID(3) + ชื่อ(100) + ผู้แต่ง(50) + ปี(4) + สถานะ(1) + ลบ(1)
-        self.member_format = '<3s50s10s15s10s1s1s'  # ID(3) + ชื่อ(50) + รหัสนักศึกษา(10) + เบอร์(15) + วันสมัคร(10) + สถานะ(1) + ลบ(1)
-        self.borrow_format = '<3s3s3s10s10s1s1s'  # ID(3) + BookID(3) + MemberID(3) + วันยืม(10) + วันคืน(10) + สถานะ(1) + ลบ(1)
-        
-        # คำนวณขนาด record
-        self.book_size = struct.calcsize(self.book_format)
-        self.member_size = struct.calcsize(self.member_format)
-        self.borrow_size = struct.calcsize(self.borrow_format)
-        
-        # ชื่อไฟล์
-        self.books_file = 'books.dat'
-        self.members_file = 'members.dat'
-        self.borrows_file = 'borrows.dat'
-        
-        self._init_files()
-    
-    def _init_files(self):
-        """สร้างไฟล์เปล่าถ้ายังไม่มี"""
-        for f in [self.books_file, self.members_file, self.borrows_file]:
-            if not os.path.exists(f):
-                open(f, 'wb').close()
-    
-    def _encode(self, text: str, length: int) -> bytes:
-        """แปลง string -> bytes ความยาวคงที่"""
-        return text.encode('utf-8')[:length].ljust(length, b'\x00')
+    """ระบบจัดการห้องสมุด - เมนูบน terminal (ตรรกะทั้งหมดอยู่ใน LibraryService)"""
     
-    def _decode(self, data: bytes) -> str:
-        """แปลง bytes -> string"""
-        return data.decode('utf-8').rstrip('\x00')
+    def __init__(self, service: Optional[LibraryService] = None):
+        self.service = service or LibraryService()
+        if self.service.recovered:
+            print(f"♻️  กู้คืน {self.service.recovered} รายการจาก {self.service.wal_file}")
     
-    def _get_next_id(self, filename: str, size: int, start_id: int = 1) -> str:
-        """สร้าง ID ใหม่ (Auto Increment)"""
-        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
-            return f"{start_id:0{self.ID_LENGTH}d}"
-        
-        with open(filename, 'rb') as f:
-            f.seek(-size, 2)
-            data = f.read(self.ID_LENGTH)
-            last_id = int(self._decode(data))
-            return f"{last_id + 1:0{self.ID_LENGTH}d}"
+    @property
+    def MAX_BORROW_LIMIT(self) -> int:
+        return self.service.MAX_BORROW_LIMIT
     
     # ========== จัดการหนังสือ ==========
     
@@ -67,87 +29,43 @@ class SimpleLibrary:
         author = input("ผู้แต่ง: ").strip()
         year = input("ปีที่พิมพ์: ").strip()
         
-        if not title or not author or not year:
-            print("❌ กรุณากรอกข้อมูลให้ครบ")
+        try:
+            book_id = self.service.add_book(title, author, year)
+        except LibraryError as e:
+            print(f"❌ {e}")
             return
         
-        book_id = self._get_next_id(self.books_file, self.book_size, self.BOOK_ID_START)
-        data = struct.pack(
-            self.book_format,
-            self._encode(book_id, 3),
-            self._encode(title, 100),
-            self._encode(author, 50),
-            self._encode(year, 4),
-            b'A',  # Available
-            b'0'   # Not deleted
-        )
-        
-        with open(self.books_file, 'ab') as f:
-            f.write(data)
-        
         print(f"✅ เพิ่มหนังสือสำเร็จ! ID: {book_id}")
     
     def list_books(self):
         """แสดงรายการหนังสือ"""
         print("\n=== รายการหนังสือ ===")
         
-        if not os.path.exists(self.books_file) or os.path.getsize(self.books_file) == 0:
+        if not self.service.has_books():
             print("ยังไม่มีหนังสือในระบบ")
             return
         
         print(f"{'ID':<5} {'ชื่อ':<35} {'ผู้แต่ง':<20} {'ปี':<6} {'สถานะ':<10}")
         print("-" * 84)
         
-        with open(self.books_file, 'rb') as f:
-            while True:
-                data = f.read(self.book_size)
-                if not data or len(data) != self.book_size:
-                    break
-                
-                try:
-                    book = struct.unpack(self.book_format, data)
-                    if book[5] == b'0':  # ไม่ถูกลบ
-                        book_id = self._decode(book[0])
-                        title = self._decode(book[1])[:33]
-                        author = self._decode(book[2])[:18]
-                        year = self._decode(book[3])
-                        status = "ว่าง" if book[4] == b'A' else "ถูกยืม"
-                        print(f"{book_id:<5} {title:<35} {author:<20} {year:<6} {status:<10}")
-                except struct.error:
-                    break
+        for book in self.service.list_books():
+            status = "ว่าง" if book.available else "ถูกยืม"
+            print(f"{book.id:<5} {book.title[:33]:<35} {book.author[:18]:<20} {book.year:<6} {status:<10}")
     
     def search_book(self):
         """ค้นหาหนังสือ"""
         print("\n=== ค้นหาหนังสือ ===")
         keyword = input("ค้นหาจากชื่อหรือผู้แต่ง: ").strip().lower()
         
-        found = False
         print(f"\n{'ID':<5} {'ชื่อ':<35} {'ผู้แต่ง':<20} {'สถานะ':<10}")
         print("-" * 74)
         
-        with open(self.books_file, 'rb') as f:
-            while True:
-                data = f.read(self.book_size)
-                if not data or len(data) != self.book_size:
-                    break
-                
-                try:
-                    book = struct.unpack(self.book_format, data)
-                    if book[5] == b'0':
-                        title = self._decode(book[1]).lower()
-                        author = self._decode(book[2]).lower()
-                        
-                        if keyword in title or keyword in author:
-                            book_id = self._decode(book[0])
-                            display_title = self._decode(book[1])[:33]
-                            display_author = self._decode(book[2])[:18]
-                            status = "ว่าง" if book[4] == b'A' else "ถูกยืม"
-                            print(f"{book_id:<5} {display_title:<35} {display_author:<20} {status:<10}")
-                            found = True
-                except struct.error:
-                    break
+        books = self.service.search_books(keyword)
+        for book in books:
+            status = "ว่าง" if book.available else "ถูกยืม"
+            print(f"{book.id:<5} {book.title[:33]:<35} {book.author[:18]:<20} {status:<10}")
         
-        if not found:
+        if not books:
             print("ไม่พบหนังสือที่ค้นหา")
     
     def update_book(self):
@@ -155,41 +73,26 @@ class SimpleLibrary:
         print("\n=== แก้ไขหนังสือ ===")
         book_id = input("ID หนังสือที่ต้องการแก้ไข: ").strip()
         
-        book_index = self._find_book_index(book_id)
-        if book_index == -1:
-            print("❌ ไม่พบหนังสือ")
-            return
-        
-        book = self._get_book_at_index(book_index)
+        book = self.service.get_book(book_id)
         if not book:
+            print("❌ ไม่พบหนังสือ")
             return
         
         print("\n--- ข้อมูลปัจจุบัน ---")
-        print(f"ชื่อ: {self._decode(book[1])}")
-        print(f"ผู้แต่ง: {self._decode(book[2])}")
-        print(f"ปี: {self._decode(book[3])}")
+        print(f"ชื่อ: {book.title}")
+        print(f"ผู้แต่ง: {book.author}")
+        print(f"ปี: {book.year}")
         
         print("\n--- กรอกข้อมูลใหม่ (Enter = ไม่เปลี่ยน) ---")
         title = input("ชื่อหนังสือ: ").strip()
         author = input("ผู้แต่ง: ").strip()
         year = input("ปีที่พิมพ์: ").strip()
         
-        if not title:
-            title = self._decode(book[1])
-        if not author:
-            author = self._decode(book[2])
-        if not year:
-            year = self._decode(book[3])
-        
-        updated_book = struct.pack(
-            self.book_format,
-            book[0], self._encode(title, 100), self._encode(author, 50),
-            self._encode(year, 4), book[4], book[5]
-        )
-        
-        with open(self.books_file, 'r+b') as f:
-            f.seek(book_index * self.book_size)
-            f.write(updated_book)
+        try:
+            self.service.update_book(book_id, title, author, year)
+        except LibraryError as e:
+            print(f"❌ {e}")
+            return
         
         print("\n✅ แก้ไขหนังสือสำเร็จ!")
     
@@ -198,74 +101,32 @@ class SimpleLibrary:
         print("\n=== ลบหนังสือ ===")
         book_id = input("ID หนังสือที่ต้องการลบ: ").strip()
         
-        book_index = self._find_book_index(book_id)
-        if book_index == -1:
-            print("❌ ไม่พบหนังสือ")
-            return
-        
-        book = self._get_book_at_index(book_index)
+        book = self.service.get_book(book_id)
         if not book:
+            print("❌ ไม่พบหนังสือ")
             return
         
-        if book[4] == b'B':
+        if not book.available:
             print("❌ หนังสือถูกยืมอยู่ ไม่สามารถลบได้")
             return
         
         print("\n--- หนังสือที่จะลบ ---")
-        print(f"ชื่อ: {self._decode(book[1])}")
-        print(f"ผู้แต่ง: {self._decode(book[2])}")
+        print(f"ชื่อ: {book.title}")
+        print(f"ผู้แต่ง: {book.author}")
         
         confirm = input("\nยืนยันการลบ? (y/n): ").strip().lower()
         if confirm != 'y':
             print("ยกเลิกการลบ")
             return
         
-        deleted_book = struct.pack(
-            self.book_format,
-            book[0], book[1], book[2], book[3], book[4], b'1'
-        )
-        
-        with open(self.books_file, 'r+b') as f:
-            f.seek(book_index * self.book_size)
-            f.write(deleted_book)
+        try:
+            self.service.delete_book(book_id)
+        except LibraryError as e:
+            print(f"❌ {e}")
+            return
         
         print("\n✅ ลบหนังสือสำเร็จ!")
     
-    def _find_book_index(self, book_id: str) -> int:
-        """หา index ของหนังสือ"""
-        if not os.path.exists(self.books_file):
-            return -1
-        
-        with open(self.books_file, 'rb') as f:
-            index = 0
-            while True:
-                data = f.read(self.book_size)
-                if not data or len(data) != self.book_size:
-                    break
-                try:
-                    book = struct.unpack(self.book_format, data)
-                    if self._decode(book[0]) == book_id and book[5] == b'0':
-                        return index
-                    index += 1
-                except struct.error:
-                    break
-        return -1
-    
-    def _get_book_at_index(self, index: int) -> Optional[Tuple]:
-        """ดึงข้อมูลหนังสือจาก index"""
-        if not os.path.exists(self.books_file):
-            return None
-        
-        with open(self.books_file, 'rb') as f:
-            f.seek(index * self.book_size)
-            data = f.read(self.book_size)
-            if not data or len(data) != self.book_size:
-                return None
-            try:
-                return struct.unpack(self.book_format, data)
-            except struct.error:
-                return None
-    
     # ========== จัดการสมาชิก ==========
     
     def add_member(self):
@@ -275,177 +136,61 @@ class SimpleLibrary:
         student_id = input("รหัสนักศึกษา: ").strip()
         phone = input("เบอร์โทร: ").strip()
         
-        if not name:
-            print("❌ กรุณากรอกชื่อ")
-            return
-        
-        if not student_id:
-            print("❌ กรุณากรอกรหัสนักศึกษา")
-            return
-        
-        # ตรวจสอบรหัสนักศึกษาซ้ำ
-        if self._check_student_id_exists(student_id):
-            print("❌ รหัสนักศึกษานี้มีในระบบแล้ว")
+        try:
+            member_id = self.service.add_member(name, student_id, phone)
+        except LibraryError as e:
+            print(f"❌ {e}")
             return
         
-        member_id = self._get_next_id(self.members_file, self.member_size, self.MEMBER_ID_START)
-        join_date = datetime.date.today().strftime("%Y-%m-%d")
-        
-        data = struct.pack(
-            self.member_format,
-            self._encode(member_id, 3),
-            self._encode(name, 50),
-            self._encode(student_id, 10),
-            self._encode(phone, 15),
-            self._encode(join_date, 10),
-            b'A', b'0'
-        )
-        
-        with open(self.members_file, 'ab') as f:
-            f.write(data)
-        
         print(f"✅ เพิ่มสมาชิกสำเร็จ! ID: {member_id}")
     
-    def _check_student_id_exists(self, student_id: str) -> bool:
-        """ตรวจสอบว่ารหัสนักศึกษามีในระบบแล้วหรือไม่"""
-        if not os.path.exists(self.members_file):
-            return False
-        
-        with open(self.members_file, 'rb') as f:
-            while True:
-                data = f.read(self.member_size)
-                if not data or len(data) != self.member_size:
-                    break
-                try:
-                    member = struct.unpack(self.member_format, data)
-                    if member[6] == b'0' and self._decode(member[2]) == student_id:
-                        return True
-                except struct.error:
-                    break
-        return False
-    
     def list_members(self):
         """แสดงรายการสมาชิก"""
         print("\n=== รายการสมาชิก ===")
         
-        if not os.path.exists(self.members_file) or os.path.getsize(self.members_file) == 0:
+        if not self.service.has_members():
             print("ยังไม่มีสมาชิกในระบบ")
             return
         
         print(f"{'ID':<5} {'ชื่อ':<25} {'รหัสนักศึกษา':<15} {'เบอร์โทร':<15} {'สถานะ':<10}")
         print("-" * 79)
         
-        with open(self.members_file, 'rb') as f:
-            while True:
-                data = f.read(self.member_size)
-                if not data or len(data) != self.member_size:
-                    break
-                try:
-                    member = struct.unpack(self.member_format, data)
-                    if member[6] == b'0':
-                        member_id = self._decode(member[0])
-                        name = self._decode(member[1])[:23]
-                        student_id = self._decode(member[2])
-                        phone = self._decode(member[3])
-                        status = "ใช้งาน" if member[5] == b'A' else "ถูกแบน"
-                        print(f"{member_id:<5} {name:<25} {student_id:<15} {phone:<15} {status:<10}")
-                except struct.error:
-                    break
+        for member in self.service.list_members():
+            status = "ใช้งาน" if member.active else "ถูกแบน"
+            print(f"{member.id:<5} {member.name[:23]:<25} {member.student_id:<15} {member.phone:<15} {status:<10}")
     
     def delete_member(self):
         """ลบสมาชิก"""
         print("\n=== ลบสมาชิก ===")
         member_id = input("ID สมาชิกที่ต้องการลบ: ").strip()
         
-        member_index = self._find_member_index(member_id)
-        if member_index == -1:
-            print("ไม่พบสมาชิก")
-            return
-        
-        member = self._get_member_at_index(member_index)
+        member = self.service.get_member(member_id)
         if not member:
+            print("ไม่พบสมาชิก")
             return
         
-        if self._count_active_borrows(member_id) > 0:
+        if self.service.count_active_borrows(member_id) > 0:
             print("❌ สมาชิกคนนี้กำลังยืมหนังสืออยู่ ไม่สามารถลบได้")
             return
         
         print("\n--- สมาชิกที่จะลบ ---")
-        print(f"ชื่อ: {self._decode(member[1])}")
-        print(f"รหัสนักศึกษา: {self._decode(member[2])}")
-        print(f"เบอร์โทร: {self._decode(member[3])}")
+        print(f"ชื่อ: {member.name}")
+        print(f"รหัสนักศึกษา: {member.student_id}")
+        print(f"เบอร์โทร: {member.phone}")
         
         confirm = input("\nยืนยันการลบ? (y/n): ").strip().lower()
         if confirm != 'y':
             print("ยกเลิกการลบ")
             return
         
-        deleted_member = struct.pack(
-            self.member_format,
-            member[0], member[1], member[2], member[3], member[4], member[5], b'1'
-        )
-        
-        with open(self.members_file, 'r+b') as f:
-            f.seek(member_index * self.member_size)
-            f.write(deleted_member)
+        try:
+            self.service.delete_member(member_id)
+        except LibraryError as e:
+            print(f"❌ {e}")
+            return
         
         print("\n✅ ลบสมาชิกสำเร็จ!")
     
-    def _find_member_index(self, member_id: str) -> int:
-        """หา index ของสมาชิก"""
-        if not os.path.exists(self.members_file):
-            return -1
-        
-        with open(self.members_file, 'rb') as f:
-            index = 0
-            while True:
-                data = f.read(self.member_size)
-                if not data or len(data) != self.member_size:
-                    break
-                try:
-                    member = struct.unpack(self.member_format, data)
-                    if self._decode(member[0]) == member_id and member[6] == b'0':
-                        return index
-                    index += 1
-                except struct.error:
-                    break
-        return -1
-    
-    def _get_member_at_index(self, index: int) -> Optional[Tuple]:
-        """ดึงข้อมูลสมาชิกจาก index"""
-        if not os.path.exists(self.members_file):
-            return None
-        
-        with open(self.members_file, 'rb') as f:
-            f.seek(index * self.member_size)
-            data = f.read(self.member_size)
-            if not data or len(data) != self.member_size:
-                return None
-            try:
-                return struct.unpack(self.member_format, data)
-            except struct.error:
-                return None
-    
-    def _count_active_borrows(self, member_id: str) -> int:
-        """นับจำนวนหนังสือที่สมาชิกกำลังยืมอยู่"""
-        if not os.path.exists(self.borrows_file):
-            return 0
-        
-        count = 0
-        with open(self.borrows_file, 'rb') as f:
-            while True:
-                data = f.read(self.borrow_size)
-                if not data or len(data) != self.borrow_size:
-                    break
-                try:
-                    borrow = struct.unpack(self.borrow_format, data)
-                    if (self._decode(borrow[2]) == member_id and 
-                        borrow[5] == b'B' and borrow[6] == b'0'):
-                        count += 1
-                except struct.error:
-                    break
-        return count
-    
     # ========== ยืม-คืนหนังสือ ==========
     
     def borrow_book(self):
@@ -454,18 +199,18 @@ class SimpleLibrary:
         member_id = input("ID สมาชิก: ").strip()
     
         # ตรวจสอบสมาชิก
-        member = self._find_member(member_id)
+        member = self.service.get_member(member_id)
         if not member:
             print("❌ ไม่พบสมาชิก")
             return
     
-        if member[5] != b'A':
+        if not member.active:
             print("❌ สมาชิกถูกระงับ ไม่สามารถยืมได้")
             return
     
         # แสดงข้อมูลสมาชิก
-        current_borrows = self._count_active_borrows(member_id)
-        print(f"\n👤 {self._decode(member[1])} (รหัส: {self._decode(member[2])})")
+        current_borrows = self.service.count_active_borrows(member_id)
+        print(f"\n👤 {member.name} (รหัส: {member.student_id})")
         print(f"📊 ยืมอยู่: {current_borrows}/{self.MAX_BORROW_LIMIT} เล่ม")
         print(f"💡 สามารถยืมได้อีก: {self.MAX_BORROW_LIMIT - current_borrows} เล่ม")
     
@@ -493,294 +238,101 @@ class SimpleLibrary:
             print(f"   สามารถยืมได้อีกเพียง {self.MAX_BORROW_LIMIT - current_borrows} เล่ม")
             return
     
-    # ตรวจสอบหนังสือทั้งหมดก่อนดำเนินการ
-        books_to_borrow = []
-        for book_id in book_ids:
-            book = self._find_book(book_id)
-            if not book:
-                print(f"❌ ไม่พบหนังสือ ID: {book_id}")
-                return
-        
-            if book[4] != b'A':
-                print(f"❌ หนังสือ '{self._decode(book[1])}' (ID: {book_id}) ถูกยืมแล้ว")
-                return
-        
-            books_to_borrow.append((book_id, book))
+        # ตรวจสอบหนังสือทั้งหมดก่อนดำเนินการ (ยังไม่เขียนอะไรจนกว่าจะผ่านทุกเล่ม)
+        try:
+            books_to_borrow = self.service.check_borrow(member_id, book_ids)
+        except LibraryError as e:
+            print(f"❌ {e}")
+            return
     
-    # แสดงรายการหนังสือที่จะยืม
+        # แสดงรายการหนังสือที่จะยืม
         print("\n--- รายการหนังสือที่จะยืม ---")
-        for i, (book_id, book) in enumerate(books_to_borrow, 1):
-            print(f"{i}. [{book_id}] {self._decode(book[1])}")
+        for i, book in enumerate(books_to_borrow, 1):
+            print(f"{i}. [{book.id}] {book.title}")
     
-    # ยืนยัน
+        # ยืนยัน
         print(f"\nรวม {len(books_to_borrow)} เล่ม")
         confirm = input("ยืนยันการยืม? (y/n): ").strip().lower()
         if confirm != 'y':
             print("ยกเลิกการยืม")
             return
     
-    # ดำเนินการยืมทั้งหมด
-        borrow_date = datetime.date.today().strftime("%Y-%m-%d")
-        due_date = (datetime.date.today() + datetime.timedelta(days=7)).strftime("%Y-%m-%d")
-    
-        success_count = 0
-        for book_id, book in books_to_borrow:
-            borrow_id = self._get_next_id(self.borrows_file, self.borrow_size, self.BORROW_ID_START)
-        
-            data = struct.pack(
-                self.borrow_format,
-                self._encode(borrow_id, 3),
-                self._encode(book_id, 3),
-                self._encode(member_id, 3),
-                self._encode(borrow_date, 10),
-                self._encode("", 10),
-                b'B', b'0'
-            )
-        
-            with open(self.borrows_file, 'ab') as f:
-                f.write(data)
-        
-            self._update_book_status(book_id, b'B')
-            success_count += 1
-    
-    # แสดงผลลัพธ์
-        print(f"\n✅ ยืมสำเร็จ {success_count} เล่ม!")
-        print(f"👤 ผู้ยืม: {self._decode(member[1])} (รหัส: {self._decode(member[2])})")
-        print(f"📅 วันยืม: {borrow_date}")
-        print(f"📅 กำหนดคืน: {due_date}")
-        print(f"📊 ยืมอยู่ทั้งหมด: {current_borrows + success_count}/{self.MAX_BORROW_LIMIT} เล่ม")
-
-
-def return_book(self):
-    """คืนหนังสือ - รองรับคืนทีละเล่มหรือหลายเล่มพร้อมกัน"""
-    print("\n=== คืนหนังสือ ===")
-    print("(สามารถคืนหลายเล่มพร้อมกัน: พิมพ์ ID คั่นด้วยเว้นวรรค)")
-    print("ตัวอย่าง: 001 หรือ 001 002 003")
-    book_ids_input = input("ID หนังสือที่ต้องการคืน: ").strip()
-    
-    if not book_ids_input:
-        print("❌ กรุณาระบุ ID หนังสือ")
-        return
-    
-    # แยก ID หนังสือ
-    book_ids = book_ids_input.split()
-    
-    # ตรวจสอบรายการยืมทั้งหมดก่อน
-    books_to_return = []
-    total_fine = 0
-    
-    for book_id in book_ids:
-        borrow_record = self._find_active_borrow(book_id)
-        if not borrow_record:
-            print(f"❌ ไม่พบรายการยืมของหนังสือ ID: {book_id} (อาจคืนแล้ว)")
+        # ดำเนินการยืมทั้งหมด
+        try:
+            loans = self.service.borrow(member_id, book_ids)
+        except LibraryError as e:
+            print(f"❌ {e}")
             return
-        
-        index, borrow = borrow_record
-        book = self._find_book(book_id)
-        member_id = self._decode(borrow[2])
-        member = self._find_member(member_id)
-        
-        # คำนวณค่าปรับ
-        borrow_date = datetime.datetime.strptime(self._decode(borrow[3]), "%Y-%m-%d").date()
-        due_date = borrow_date + datetime.timedelta(days=7)
-        days_late = (datetime.date.today() - due_date).days
-        fine = max(0, days_late * 10)
-        
-        books_to_return.append({
-            'book_id': book_id,
-            'index': index,
-            'borrow': borrow,
-            'book': book,
-            'member': member,
-            'borrow_date': borrow_date,
-            'due_date': due_date,
-            'days_late': days_late,
-            'fine': fine
-        })
-        
-        total_fine += fine
     
-    # แสดงรายละเอียดการคืน
-    print("\n--- รายการหนังสือที่จะคืน ---")
-    for i, item in enumerate(books_to_return, 1):
-        print(f"\n{i}. [{item['book_id']}] {self._decode(item['book'][1])}")
-        if item['member']:
-            print(f"   ผู้ยืม: {self._decode(item['member'][1])}")
-        print(f"   วันยืม: {item['borrow_date'].strftime('%Y-%m-%d')}")
-        print(f"   กำหนดคืน: {item['due_date'].strftime('%Y-%m-%d')}")
-        
-        if item['days_late'] > 0:
-            print(f"   ⚠️  เกินกำหนด: {item['days_late']} วัน")
-            print(f"   💰 ค่าปรับ: {item['fine']} บาท")
-        else:
-            print(f"   ✨ คืนตรงเวลา")
-    
-    print(f"\nรวม {len(books_to_return)} เล่ม")
-    if total_fine > 0:
-        print(f"💰 ค่าปรับรวม: {total_fine} บาท")
-    
-    # ยืนยันการคืน
-    confirm = input("\nยืนยันการคืนหนังสือ? (y/n): ").strip().lower()
-    if confirm != 'y':
-        print("ยกเลิกการคืน")
-        return
+        # แสดงผลลัพธ์
+        print(f"\n✅ ยืมสำเร็จ {len(loans)} เล่ม!")
+        print(f"👤 ผู้ยืม: {member.name} (รหัส: {member.student_id})")
+        print(f"📅 วันยืม: {loans[0].borrow_date.strftime('%Y-%m-%d')}")
+        print(f"📅 กำหนดคืน: {loans[0].due_date.strftime('%Y-%m-%d')}")
+        print(f"📊 ยืมอยู่ทั้งหมด: {current_borrows + len(loans)}/{self.MAX_BORROW_LIMIT} เล่ม")
     
-    # ดำเนินการคืนทั้งหมด
-    return_date = datetime.date.today().strftime("%Y-%m-%d")
-    success_count = 0
+    def return_book(self):
+        """คืนหนังสือ - รองรับคืนทีละเล่มหรือหลายเล่มพร้อมกัน"""
+        print("\n=== คืนหนังสือ ===")
+        print("(สามารถคืนหลายเล่มพร้อมกัน: พิมพ์ ID คั่นด้วยเว้นวรรค)")
+        print("ตัวอย่าง: 001 หรือ 001 002 003")
+        book_ids_input = input("ID หนังสือที่ต้องการคืน: ").strip()
     
-    for item in books_to_return:
-        updated = struct.pack(
-            self.borrow_format,
-            item['borrow'][0], item['borrow'][1], item['borrow'][2], item['borrow'][3],
-            self._encode(return_date, 10), b'R', item['borrow'][6]
-        )
-        
-        with open(self.borrows_file, 'r+b') as f:
-            f.seek(item['index'] * self.borrow_size)
-            f.write(updated)
-        
-        self._update_book_status(item['book_id'], b'A')
-        success_count += 1
+        # แยก ID หนังสือ แล้วตรวจสอบรายการยืมทั้งหมดก่อน
+        book_ids = book_ids_input.split()
+        try:
+            books_to_return = self.service.check_return(book_ids)
+        except LibraryError as e:
+            print(f"❌ {e}")
+            return
+        total_fine = sum(item.fine for item in books_to_return)
+    
+        # แสดงรายละเอียดการคืน
+        print("\n--- รายการหนังสือที่จะคืน ---")
+        for i, item in enumerate(books_to_return, 1):
+            print(f"\n{i}. [{item.loan.book_id}] {item.book.title}")
+            if item.member:
+                print(f"   ผู้ยืม: {item.member.name}")
+            print(f"   วันยืม: {item.loan.borrow_date.strftime('%Y-%m-%d')}")
+            print(f"   กำหนดคืน: {item.loan.due_date.strftime('%Y-%m-%d')}")
+        
+            if item.days_late > 0:
+                print(f"   ⚠️  เกินกำหนด: {item.days_late} วัน")
+                print(f"   💰 ค่าปรับ: {item.fine} บาท")
+            else:
+                print(f"   ✨ คืนตรงเวลา")
     
-    # แสดงผลลัพธ์
-    print(f"\n✅ คืนหนังสือสำเร็จ {success_count} เล่ม!")
+        print(f"\nรวม {len(books_to_return)} เล่ม")
+        if total_fine > 0:
+            print(f"💰 ค่าปรับรวม: {total_fine} บาท")
     
-    if total_fine > 0:
-        print(f"💰 กรุณาชำระค่าปรับ: {total_fine} บาท")
-    else:
-        print("✨ คืนตรงเวลาทุกเล่ม ไม่มีค่าปรับ")
-
-
-def _borrow_menu(self):
-    """เมนูยืม-คืนหนังสือ"""
-    while True:
-        print("\n" + "=" * 40)
-        print("📚 ยืม-คืนหนังสือ")
-        print("=" * 40)
-        print("1. ยืมหนังสือ (ยืมได้หลายเล่มพร้อมกัน)")
-        print("2. คืนหนังสือ (คืนได้ทีละเล่มหรือหลายเล่ม)")
-        print("3. ดูรายการยืมปัจจุบัน")
-        print("0. กลับ")
-        print("-" * 40)
-        
-        choice = input("เลือก: ").strip()
-        
-        if choice == '1':
-            self.borrow_book()
-            input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
-        elif choice == '2':
-            self.return_book()
-            input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
-        elif choice == '3':
-            self.list_borrows()
-            input("\n✓ กด Enter เพื่อกลับเมนู...")
-        elif choice == '0':
-            break
-        else:
-            print("❌ กรุณาเลือก 0-3 เท่านั้น")
-            input("\nกด Enter...")
-        
-        # ตรวจสอบหนังสือทั้งหมดก่อน
-        books_to_borrow = []
-        for book_id in book_ids:
-            book = self._find_book(book_id)
-            if not book:
-                print(f"❌ ไม่พบหนังสือ ID: {book_id}")
-                return
-            
-            if book[4] != b'A':
-                print(f"❌ หนังสือ '{self._decode(book[1])}' (ID: {book_id}) ถูกยืมแล้ว")
-                return
-            
-            books_to_borrow.append((book_id, book))
-        
-        # แสดงรายการหนังสือที่จะยืม
-        print("\n--- รายการหนังสือที่จะยืม ---")
-        for i, (book_id, book) in enumerate(books_to_borrow, 1):
-            print(f"{i}. [{book_id}] {self._decode(book[1])}")
-        
-        # ยืนยัน
-        print(f"\nรวม {len(books_to_borrow)} เล่ม")
-        confirm = input("ยืนยันการยืม? (y/n): ").strip().lower()
+        # ยืนยันการคืน
+        confirm = input("\nยืนยันการคืนหนังสือ? (y/n): ").strip().lower()
         if confirm != 'y':
-            print("ยกเลิกการยืม")
+            print("ยกเลิกการคืน")
             return
-        
-        # ดำเนินการยืม
-        borrow_date = datetime.date.today().strftime("%Y-%m-%d")
-        due_date = (datetime.date.today() + datetime.timedelta(days=7)).strftime("%Y-%m-%d")
-        
-        success_count = 0
-        for book_id, book in books_to_borrow:
-            borrow_id = self._get_next_id(self.borrows_file, self.borrow_size, self.BORROW_ID_START)
-            
-            data = struct.pack(
-                self.borrow_format,
-                self._encode(borrow_id, 4),
-                self._encode(book_id, 4),
-                self._encode(member_id, 4),
-                self._encode(borrow_date, 10),
-                self._encode("", 10),
-                b'B', b'0'
-            )
-            
-            with open(self.borrows_file, 'ab') as f:
-                f.write(data)
-            
-            self._update_book_status(book_id, b'B')
-            success_count += 1
-        
-        # แสดงผลลัพธ์
-        print(f"\n✅ ยืมสำเร็จ {success_count} เล่ม!")
-        print(f"👤 ผู้ยืม: {self._decode(member[1])} (รหัส: {self._decode(member[2])})")
-        print(f"📅 วันยืม: {borrow_date}")
-        print(f"📅 กำหนดคืน: {due_date}")
-        print(f"📊 ยืมอยู่ทั้งหมด: {current_borrows + success_count}/{self.MAX_BORROW_LIMIT} เล่ม")
     
-    def return_book(self):
-        """คืนหนังสือ"""
-        print("\n=== คืนหนังสือ ===")
-        book_id = input("ID หนังสือ: ").strip()
-        
-        borrow_record = self._find_active_borrow(book_id)
-        if not borrow_record:
-            print("❌ ไม่พบรายการยืม หรือคืนแล้ว")
+        # ดำเนินการคืนทั้งหมด
+        try:
+            returned = self.service.return_books(book_ids)
+        except LibraryError as e:
+            print(f"❌ {e}")
             return
-        
-        index, borrow = borrow_record
-        return_date = datetime.date.today().strftime("%Y-%m-%d")
-        
-        updated = struct.pack(
-            self.borrow_format,
-            borrow[0], borrow[1], borrow[2], borrow[3],
-            self._encode(return_date, 10), b'R', borrow[6]
-        )
-        
-        with open(self.borrows_file, 'r+b') as f:
-            f.seek(index * self.borrow_size)
-            f.write(updated)
-        
-        self._update_book_status(book_id, b'A')
-        
-        borrow_date = datetime.datetime.strptime(self._decode(borrow[3]), "%Y-%m-%d").date()
-        due_date = borrow_date + datetime.timedelta(days=7)
-        days_late = (datetime.date.today() - due_date).days
-        
-        print("✅ คืนหนังสือสำเร็จ!")
-        
-        if days_late > 0:
-            fine = days_late * 10
-            print(f"⚠️  เกินกำหนด {days_late} วัน")
-            print(f"💰 ค่าปรับ: {fine} บาท")
+        total_fine = sum(item.fine for item in returned)
+    
+        # แสดงผลลัพธ์
+        print(f"\n✅ คืนหนังสือสำเร็จ {len(returned)} เล่ม!")
+    
+        if total_fine > 0:
+            print(f"💰 กรุณาชำระค่าปรับ: {total_fine} บาท")
         else:
-            print("✨ คืนตรงเวลา")
+            print("✨ คืนตรงเวลาทุกเล่ม ไม่มีค่าปรับ")
     
     def list_borrows(self):
         """แสดงรายการยืมที่ยังไม่คืน"""
         print("\n=== รายการยืมปัจจุบัน ===")
     
-        if not os.path.exists(self.borrows_file) or os.path.getsize(self.borrows_file) == 0:
+        if not self.service.has_borrows():
             print("ไม่มีรายการยืม")
             return
     
@@ -789,159 +341,121 @@ def _borrow_menu(self):
         print("-" * 130)
     
         found = False
-        with open(self.borrows_file, 'rb') as f:
-            while True:
-                data = f.read(self.borrow_size)
-                if not data or len(data) != self.borrow_size:
-                    break
-                try:
-                    borrow = struct.unpack(self.borrow_format, data)
-                    if borrow[5] == b'B' and borrow[6] == b'0':
-                        book_id = self._decode(borrow[1])
-                        member_id = self._decode(borrow[2])
-
-                        book = self._find_book(book_id)
-                        member = self._find_member(member_id)
-
-                        if book and member:
-                            # ดึงข้อมูลที่ต้องการตามหัวตารางใหม่
-                            student_id = self._decode(member[2])
-                            member_name = self._decode(member[1])[:23]
-                            phone = self._decode(member[3])
-                            book_title = self._decode(book[1])[:33]
-                            borrow_date = self._decode(borrow[3])
-
-                                # คำนวณวันที่ต้องคืน (7 วันหลังจากยืม)
-                            borrow_dt = datetime.datetime.strptime(borrow_date, "%Y-%m-%d").date()
-                            return_date = (borrow_dt + datetime.timedelta(days=7)).strftime("%Y-%m-%d")
-                        
-                            # แสดงข้อมูลตามรูปแบบใหม่
-                            print(f"{book_id:<10} {student_id:<15} {member_name:<25} {phone:<15} {book_title:<35} {borrow_date:<15} {return_date:<15}")
-                            found = True
-                except struct.error:
-                    break
+        for loan, book, member in self.service.active_loans():
+            # return_date ในตารางคือวันที่ต้องคืน (7 วันหลังจากยืม)
+            borrow_date = loan.borrow_date.strftime("%Y-%m-%d")
+            return_date = loan.due_date.strftime("%Y-%m-%d")
+            print(f"{loan.book_id:<10} {member.student_id:<15} {member.name[:23]:<25} {member.phone:<15} {book.title[:33]:<35} {borrow_date:<15} {return_date:<15}")
+            found = True
     
         if not found:
             print("ไม่มีรายการยืมปัจจุบัน")
     
-    # ========== ฟังก์ชันช่วยเหลือ ==========
-    
-    def _find_book(self, book_id: str) -> Optional[Tuple]:
-        """หาหนังสือจาก ID"""
-        if not os.path.exists(self.books_file):
-            return None
-        
-        with open(self.books_file, 'rb') as f:
-            while True:
-                data = f.read(self.book_size)
-                if not data:
-                    break
-                book = struct.unpack(self.book_format, data)
-                if self._decode(book[0]) == book_id and book[5] == b'0':
-                    return book
-        return None
-    
-    def _find_member(self, member_id: str) -> Optional[Tuple]:
-        """หาสมาชิกจาก ID"""
-        if not os.path.exists(self.members_file):
-            return None
-        
-        with open(self.members_file, 'rb') as f:
-            while True:
-                data = f.read(self.member_size)
-                if not data:
-                    break
-                member = struct.unpack(self.member_format, data)
-                if self._decode(member[0]) == member_id and member[6] == b'0':
-                    return member
-        return None
-    
-    def _find_active_borrow(self, book_id: str) -> Optional[Tuple[int, Tuple]]:
-        """หารายการยืมที่ยังไม่คืน"""
-        if not os.path.exists(self.borrows_file):
-            return None
-        
-        with open(self.borrows_file, 'rb') as f:
-            index = 0
-            while True:
-                data = f.read(self.borrow_size)
-                if not data:
-                    break
-                borrow = struct.unpack(self.borrow_format, data)
-                if self._decode(borrow[1]) == book_id and borrow[5] == b'B' and borrow[6] == b'0':
-                    return (index, borrow)
-                index += 1
-        return None
-    
-    def _update_book_status(self, book_id: str, status: bytes):
-        """อัปเดตสถานะหนังสือ"""
-        if not os.path.exists(self.books_file):
-            return
-        
-        with open(self.books_file, 'r+b') as f:
-            index = 0
-            while True:
-                data = f.read(self.book_size)
-                if not data:
-                    break
-                book = struct.unpack(self.book_format, data)
-                if self._decode(book[0]) == book_id and book[5] == b'0':
-                    updated = struct.pack(
-                        self.book_format,
-                        book[0], book[1], book[2], book[3], status, book[5]
-                    )
-                    f.seek(index * self.book_size)
-                    f.write(updated)
-                    break
-                index += 1
-    
     def show_stats(self):
         """แสดงสถิติระบบ"""
         print("\n=== สถิติระบบ ===")
         
-        total_books = 0
-        available_books = 0
-        
-        if os.path.exists(self.books_file):
-            with open(self.books_file, 'rb') as f:
-                while True:
-                    data = f.read(self.book_size)
-                    if not data:
-                        break
-                    book = struct.unpack(self.book_format, data)
-                    if book[5] == b'0':
-                        total_books += 1
-                        if book[4] == b'A':
-                            available_books += 1
-        
-        total_members = 0
-        if os.path.exists(self.members_file):
-            with open(self.members_file, 'rb') as f:
-                while True:
-                    data = f.read(self.member_size)
-                    if not data:
-                        break
-                    member = struct.unpack(self.member_format, data)
-                    if member[6] == b'0' and member[5] == b'A':
-                        total_members += 1
+        # อ่านจากตัวนับที่อัปเดตทุกครั้งที่เพิ่ม/ลบ/ยืม/คืน (ไม่ต้องอ่านไฟล์ข้อมูลทั้งหมด)
+        stats = self.service.stats()
+        print(f"📚 หนังสือทั้งหมด: {stats.total_books} เล่ม")
+        print(f"   - ว่าง: {stats.available_books} เล่ม")
+        print(f"   - ถูกยืม: {stats.total_books - stats.available_books} เล่ม")
+        print(f"\n👥 สมาชิก: {stats.active_members} คน")
+        print(f"\n📋 กำลังยืม: {stats.active_borrows} รายการ")
+        print(f"\n⚙️  ยืมได้สูงสุด: {self.MAX_BORROW_LIMIT} เล่ม/คน")
+    
+    def verify_stats(self):
+        """ตรวจตัวนับสถิติกับการนับใหม่จากไฟล์ข้อมูลทั้งหมด (และแก้ให้ตรงถ้าไม่ตรง)"""
+        print("\n=== ตรวจสอบตัวนับสถิติ ===")
+        stored, actual = self.service.verify_stats()
+        labels = ["หนังสือทั้งหมด", "หนังสือว่าง", "สมาชิก", "กำลังยืม"]
+        for label, counted, recounted in zip(labels, stored, actual):
+            mark = "✅" if counted == recounted else "❌"
+            print(f"{mark} {label}: ตัวนับ {counted} / นับใหม่ {recounted}")
+        if stored != actual:
+            print("\n🔧 แก้ตัวนับให้ตรงกับการนับใหม่แล้ว")
+    
+    def show_metrics(self):
+        """เปิดการเก็บสถิติการทำงานภายใน หรือแสดงผลที่เก็บได้แล้วหยุดเก็บ"""
+        print("\n=== สถิติการทำงานภายใน ===")
+        if not metrics.enabled:
+            trace_file = input("บันทึก trace ลงไฟล์ JSONL (Enter = ไม่บันทึก): ").strip() or None
+            metrics.reset()
+            metrics.enable(trace_file)
+            print("✅ เริ่มเก็บสถิติแล้ว เลือกเมนูนี้อีกครั้งเพื่อดูผลและหยุดเก็บ")
+            return
         
-        active_borrows = 0
-        if os.path.exists(self.borrows_file):
-            with open(self.borrows_file, 'rb') as f:
-                while True:
-                    data = f.read(self.borrow_size)
-                    if not data:
-                        break
-                    borrow = struct.unpack(self.borrow_format, data)
-                    if borrow[5] == b'B' and borrow[6] == b'0':
-                        active_borrows += 1
+        metrics.disable()
+        snapshot = metrics.snapshot()
+        if not snapshot:
+            print("ยังไม่มีข้อมูล")
+            return
+        print(f"{'operation':<40} {'ครั้ง':>7} {'เวลารวม ms':>11} {'records':>10} {'อ่าน B':>12} {'เขียน B':>12} {'เปิดไฟล์':>8}")
+        print("-" * 106)
+        for name, stats in snapshot.items():
+            print(f"{name[:40]:<40} {stats['calls']:>7,} {stats['wall_time'] * 1000:>11.1f} {stats['records']:>10,} "
+                  f"{stats['bytes_read']:>12,} {stats['bytes_written']:>12,} {stats['files_opened']:>8,}")
+        print("\n(เวลาและ I/O ของแต่ละ operation รวมของ helper ที่ถูกเรียกข้างในด้วย)")
+    
+    def _print_indexes(self, indexes: List[Tuple[str, int]]):
+        print("\n=== สร้างดัชนีใหม่ ===")
+        for filename, count in indexes:
+            print(f"✅ {filename}: {count} รายการ")
+    
+    def rebuild_indexes(self):
+        """สร้างไฟล์ดัชนีใหม่ทั้งหมดจากไฟล์ข้อมูล"""
+        self._print_indexes(self.service.rebuild_indexes())
+    
+    def compact_files(self):
+        """บีบอัดไฟล์ข้อมูล: ตัด record ที่ถูกลบออก แล้วสร้างดัชนีใหม่"""
+        print("\n=== บีบอัดไฟล์ข้อมูล ===")
+        archive = input(f"ย้ายรายการยืมที่คืนแล้วไป {self.service.archive_file}? (y/n): ").strip().lower() == 'y'
+        
+        try:
+            report = self.service.compact(archive)
+        except (FormatError, LibraryError) as e:
+            print(f"❌ {e}")
+            return
+        for result in report.files:
+            print(f"✅ {result.filename}: ตัดออก {result.removed} รายการ, คืนพื้นที่ {result.reclaimed:,} bytes, "
+                  f"เวลาอ่านทั้งไฟล์ {result.scan_before * 1000:.2f} -> {result.scan_after * 1000:.2f} ms")
+        
+        print(f"\n💾 คืนพื้นที่ทั้งหมด: {sum(result.reclaimed for result in report.files):,} bytes")
+        self._print_indexes(report.indexes)
+    
+    def import_data(self):
+        """นำเข้าหนังสือ/สมาชิกจำนวนมากจากไฟล์ CSV หรือ JSONL"""
+        print("\n=== นำเข้าข้อมูล (CSV/JSONL) ===")
+        print("หนังสือ: คอลัมน์ title, author, year")
+        print("สมาชิก: คอลัมน์ name, student_id, phone")
+        kind = input("นำเข้า 1. หนังสือ  2. สมาชิก: ").strip()
+        if kind not in ('1', '2'):
+            print("❌ กรุณาเลือก 1 หรือ 2")
+            return
+        path = input("ไฟล์ (.csv หรือ .jsonl): ").strip()
         
-        print(f"📚 หนังสือทั้งหมด: {total_books} เล่ม")
-        print(f"   - ว่าง: {available_books} เล่ม")
-        print(f"   - ถูกยืม: {total_books - available_books} เล่ม")
-        print(f"\n👥 สมาชิก: {total_members} คน")
-        print(f"\n📋 กำลังยืม: {active_borrows} รายการ")
-        print(f"\n⚙️  ยืมได้สูงสุด: {self.MAX_BORROW_LIMIT} เล่ม/คน")
+        importer = BulkImporter(self.service)
+        try:
+            result = importer.import_books(path) if kind == '1' else importer.import_members(path)
+        except (LibraryError, OSError) as e:
+            print(f"❌ {e}")
+            return
+        print_result(result)
+    
+    def export_data(self):
+        """ส่งออกหนังสือ สมาชิก และรายการยืม เป็นไฟล์สำหรับงานวิเคราะห์"""
+        print("\n=== ส่งออกข้อมูล ===")
+        fmt = input(f"รูปแบบ ({'/'.join(FORMATS)}): ").strip().lower() or 'csv'
+        directory = input("โฟลเดอร์ปลายทาง (Enter = export): ").strip() or 'export'
+        since = input("รายการยืมตั้งแต่วันที่ YYYY-MM-DD (Enter = ทั้งหมด): ").strip() or None
+        
+        try:
+            results = Exporter(self.service).export_all(fmt, directory, since)
+        except (ValueError, OSError) as e:
+            print(f"❌ {e}")
+            return
+        for result in results:
+            print(f"✅ {result.table}: {result.rows:,} แถว -> {result.filename}")
     
     # ========== เมนูหลัก ==========
     
@@ -955,6 +469,7 @@ def _borrow_menu(self):
             print("2. จัดการสมาชิก")
             print("3. ยืม-คืนหนังสือ")
             print("4. ดูสถิติ")
+            print("5. บำรุงรักษาระบบ")
             print("0. ออก")
             print("-" * 50)
             
@@ -969,7 +484,10 @@ def _borrow_menu(self):
             elif choice == '4':
                 self.show_stats()
                 input("\nกด Enter...")
+            elif choice == '5':
+                self._maintenance_menu()
             elif choice == '0':
+                self.service.close()
                 print("\n👋 ขอบคุณที่ใช้บริการ!")
                 break
     
@@ -1042,25 +560,78 @@ def _borrow_menu(self):
     def _borrow_menu(self):
         """เมนูยืม-คืนหนังสือ"""
         while True:
-            print("\n--- ยืม-คืนหนังสือ ---")
-            print("1. ยืมหนังสือ")
-            print("2. คืนหนังสือ")
-            print("3. ดูรายการยืม")
+            print("\n" + "=" * 40)
+            print("📚 ยืม-คืนหนังสือ")
+            print("=" * 40)
+            print("1. ยืมหนังสือ (ยืมได้หลายเล่มพร้อมกัน)")
+            print("2. คืนหนังสือ (คืนได้ทีละเล่มหรือหลายเล่ม)")
+            print("3. ดูรายการยืมปัจจุบัน")
             print("0. กลับ")
-            
+            print("-" * 40)
+        
             choice = input("เลือก: ").strip()
-            
+        
             if choice == '1':
                 self.borrow_book()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
             elif choice == '2':
                 self.return_book()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
             elif choice == '3':
                 self.list_borrows()
+                input("\n✓ กด Enter เพื่อกลับเมนู...")
+            elif choice == '0':
+                break
+            else:
+                print("❌ กรุณาเลือก 0-3 เท่านั้น")
                 input("\nกด Enter...")
+    
+    def _maintenance_menu(self):
+        """เมนูบำรุงรักษาระบบ"""
+        while True:
+            print("\n" + "=" * 40)
+            print("🛠️  บำรุงรักษาระบบ")
+            print("=" * 40)
+            print("1. สร้างดัชนีใหม่ (Rebuild Index)")
+            print("2. บีบอัดไฟล์ข้อมูล (Compact)")
+            print("3. นำเข้าข้อมูล (CSV/JSONL)")
+            print("4. ส่งออกข้อมูล (CSV/JSONL/Columnar)")
+            print("5. ตรวจสอบตัวนับสถิติ")
+            print("6. สถิติการทำงานภายใน (เวลา/I/O)")
+            print("0. กลับ")
+            print("-" * 40)
+            
+            choice = input("เลือกเมนู (0-6): ").strip()
+            
+            if choice == '1':
+                self.rebuild_indexes()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
+            elif choice == '2':
+                self.compact_files()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
+            elif choice == '3':
+                self.import_data()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
+            elif choice == '4':
+                self.export_data()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
+            elif choice == '5':
+                self.verify_stats()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
+            elif choice == '6':
+                self.show_metrics()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
             elif choice == '0':
                 break
+            else:
+                print("❌ กรุณาเลือก 0-6 เท่านั้น")
+                input("\nกด Enter...")
 
 
 if __name__ == "__main__":
-    lib = SimpleLibrary()
+    try:
+        lib = SimpleLibrary()
+    except FormatError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
     lib.run()
\ No newline at end of file
@@ -1,34 +1,97 @@
-import struct
-import os
+import sys
 import datetime
 from typing import Optional, List, Tuple
 
+from compaction import compact_library
+from file_format import FormatError, open_store
+from locks import InUseError, UsageLock
+from scanner import count_by, scan_views
+from indexes import index_join
+from schema import PROGRAMS
+from sequence import IdSequence, sequence_filename
+from wal import Transaction, WriteAheadLog
+from metrics import metrics
+
 
 class SimpleLibrary:
     """ระบบจัดการห้องสมุดแบบง่าย"""
     
     def __init__(self):
-        # โครงสร้างข้อมูล
-        self.book_format = '<4s100s50s4s1s1s'  # ID, Title, Author, Year, Status, Deleted
-        self.member_format = '<4s50s15s10s1s1s'  # ID, Name, Phone, JoinDate, Status, Deleted
-        self.borrow_format = '<4s4s4s10s10s1s1s'  # ID, BookID, MemberID, BorrowDate, ReturnDate, Status, Deleted
-        
-        self.book_size = struct.calcsize(self.book_format)
-        self.member_size = struct.calcsize(self.member_format)
-        self.borrow_size = struct.calcsize(self.borrow_format)
+        # โครงสร้างข้อมูลประกาศไว้ใน schema.py (ID เก็บเป็นเลขฐานสอง uint32 แสดงผลเป็นเลข 4 หลัก)
+        self.program = PROGRAMS['test3']
+        tables = self.program.tables
+        self.book_schema = tables['books'].schema  # ID, Title, Author, Year, Status, Deleted
+        self.member_schema = tables['members'].schema  # ID, Name, Phone, JoinDate, Status, Deleted
+        self.borrow_schema = tables['borrows'].schema  # ID, BookID, MemberID, BorrowDate, ReturnDate, Status, Deleted
+        
+        # codec ที่ compile format ไว้ครั้งเดียว (struct.Struct)
+        self.book_codec = self.book_schema.codec
+        self.member_codec = self.member_schema.codec
+        self.borrow_codec = self.borrow_schema.codec
+        self.book_format = self.book_codec.format
+        self.member_format = self.member_codec.format
+        self.borrow_format = self.borrow_codec.format
+        # ตัวนับสถิติ (record เดียว int64 x 4: หนังสือทั้งหมด, ว่าง, สมาชิก, กำลังยืม)
+        self.stats_codec = tables['counters'].schema.codec
+        
+        self.book_size = self.book_codec.size
+        self.member_size = self.member_codec.size
+        self.borrow_size = self.borrow_codec.size
         
         # ชื่อไฟล์
-        self.books_file = 'books.dat'
-        self.members_file = 'members.dat'
-        self.borrows_file = 'borrows.dat'
-        
-        self._init_files()
-    
-    def _init_files(self):
-        """สร้างไฟล์ถ้ายังไม่มี"""
-        for f in [self.books_file, self.members_file, self.borrows_file]:
-            if not os.path.exists(f):
-                open(f, 'wb').close()
+        self.books_file = tables['books'].filename
+        self.members_file = tables['members'].filename
+        self.borrows_file = tables['borrows'].filename
+        self.archive_file = tables['archive'].filename
+        self.counters_file = tables['counters'].filename
+        self.wal_file = self.program.wal
+        
+        # ถือล็อกการเปิดใช้ไว้ก่อนเปิดไฟล์ข้อมูล (รอถ้า process อื่นกำลังบีบอัดไฟล์อยู่)
+        self.usage = UsageLock(self.wal_file)
+        
+        # เปิดไฟล์ข้อมูลผ่าน mmap ครั้งเดียวต่อ instance (สร้างไฟล์พร้อม header ถ้ายังไม่มี)
+        self.books = open_store(self.books_file, self.book_codec)
+        self.members = open_store(self.members_file, self.member_codec)
+        self.borrows = open_store(self.borrows_file, self.borrow_codec)
+        self.counters = open_store(self.counters_file, self.stats_codec)
+        
+        # ทุกการเขียนผ่าน WAL ก่อน (เขียนซ้ำ transaction ที่ค้างอยู่ก่อนสร้างดัชนี)
+        # ตัวนับสถิติอยู่ใน WAL เดียวกัน จึงเปลี่ยนพร้อมข้อมูลใน transaction เดียว
+        self.wal = WriteAheadLog(self.wal_file, [self.books, self.members, self.borrows, self.counters])
+        replayed = self.wal.replay()
+        if replayed:
+            print(f"♻️  กู้คืน {replayed} รายการจาก {self.wal_file}")
+        
+        # ตัวนับ ID ถัดไป (books.seq, members.seq, borrows.seq)
+        id_type = self.program.id_type
+        self.book_ids = IdSequence(sequence_filename(self.books_file), self.books, id_type)
+        self.member_ids = IdSequence(sequence_filename(self.members_file), self.members, id_type)
+        self.borrow_ids = IdSequence(sequence_filename(self.borrows_file), self.borrows, id_type)
+        
+        # ดัชนีหลัก ID -> ตำแหน่ง record (books.idx, members.idx, borrows.idx)
+        self.book_index = self.book_schema.open_index('id', self.books_file, self.books)
+        self.member_index = self.member_schema.open_index('id', self.members_file, self.members)
+        self.borrow_index = self.borrow_schema.open_index('id', self.borrows_file, self.borrows)
+        
+        # ดัชนีค้นหาข้อความ ชื่อหนังสือ/ผู้แต่ง (books_text.seg + journal books_text.idx)
+        self.text_index = self.book_schema.open_index('text', self.books_file, self.books)
+        
+        # ดัชนีรอง รายการยืมที่ยังไม่คืน แยกตามสมาชิกและตามหนังสือ
+        self.active_by_member = self.borrow_schema.open_index('member', self.borrows_file, self.borrows)
+        self.active_by_book = self.borrow_schema.open_index('book', self.borrows_file, self.borrows)
+        
+        self._init_stats()
+    
+    def _init_stats(self):
+        """นับสถิติจากไฟล์ข้อมูลครั้งแรก (หรือเมื่อไฟล์ library.cnt หาย)"""
+        with self.counters.locks.append():
+            if len(self.counters) == 0:
+                self.wal.write(self.counters, 0, self.stats_codec.pack(*self._scan_stats()))
+    
+    def _count(self, txn: Transaction, total_books: int = 0, available_books: int = 0,
+               active_members: int = 0, active_borrows: int = 0):
+        """ปรับตัวนับสถิติใน transaction เดียวกับการเปลี่ยนข้อมูล"""
+        txn.add(self.counters, 0, (total_books, available_books, active_members, active_borrows))
     
     def _encode(self, text: str, length: int) -> bytes:
         """แปลงข้อความเป็น bytes"""
@@ -38,16 +101,20 @@ class SimpleLibrary:
         """แปลง bytes เป็นข้อความ"""
         return data.decode('utf-8').rstrip('\x00')
     
-    def _get_next_id(self, filename: str, size: int) -> str:
-        """สร้าง ID ใหม่"""
-        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
-            return "0001"
-        
-        with open(filename, 'rb') as f:
-            f.seek(-size, 2)
-            data = f.read(4)
-            last_id = int(self._decode(data))
-            return f"{last_id + 1:04d}"
+    def _format_id(self, number: int) -> str:
+        """แปลงเลข ID เป็นข้อความ id_digits หลัก (1 -> 0001)"""
+        return f"{number:0{self.program.id_digits}d}"
+    
+    def _parse_id(self, text: str) -> Optional[int]:
+        """แปลง ID ที่พิมพ์ (0001 หรือ 1) เป็นเลข (None ถ้าไม่ใช่ ID ที่เก็บได้)"""
+        text = text.strip()
+        if not (text.isascii() and text.isdigit()) or int(text) > self.program.max_id:
+            return None
+        return int(text)
+    
+    def _get_next_id(self, sequence: IdSequence) -> int:
+        """สร้าง ID ใหม่ (จากไฟล์ .seq)"""
+        return sequence.next_id()
     
     # ==================== หนังสือ ====================
     
@@ -62,11 +129,10 @@ class SimpleLibrary:
             print("❌ กรุณากรอกข้อมูลให้ครบ")
             return
         
-        book_id = self._get_next_id(self.books_file, self.book_size)
+        book_id = self._get_next_id(self.book_ids)
         
-        data = struct.pack(
-            self.book_format,
-            self._encode(book_id, 4),
+        data = self.book_codec.pack(
+            book_id,
             self._encode(title, 100),
             self._encode(author, 50),
             self._encode(year, 4),
@@ -74,46 +140,41 @@ class SimpleLibrary:
             b'0'   # Not deleted
         )
         
-        with open(self.books_file, 'ab') as f:
-            f.write(data)
+        with self.wal.transaction() as txn:
+            txn.append(self.books, data)
+            self._count(txn, total_books=1, available_books=1)
+        index = txn.first_index(self.books)
+        self.book_index.add(book_id, index)
+        self.text_index.add(index, data)
         
-        print(f"✅ เพิ่มหนังสือสำเร็จ! ID: {book_id}")
+        print(f"✅ เพิ่มหนังสือสำเร็จ! ID: {self._format_id(book_id)}")
     
+    @metrics.operation()
     def list_books(self):
         """แสดงรายการหนังสือทั้งหมด"""
         print("\n=== รายการหนังสือ ===")
         
-        if not os.path.exists(self.books_file) or os.path.getsize(self.books_file) == 0:
+        if len(self.books) == 0:
             print("ยังไม่มีหนังสือในระบบ")
             return
         
         print(f"{'ID':<6} {'ชื่อ':<35} {'ผู้แต่ง':<20} {'ปี':<6} {'สถานะ':<10}")
         print("-" * 85)
         
-        with open(self.books_file, 'rb') as f:
-            while True:
-                data = f.read(self.book_size)
-                if not data:
-                    break
-                
-                # ตรวจสอบขนาดข้อมูล
-                if len(data) != self.book_size:
-                    print(f"ข้อมูลไฟล์เสียหาย (ขนาดไม่ตรง: {len(data)} != {self.book_size})")
-                    break
-                
-                try:
-                    book = struct.unpack(self.book_format, data)
-                    if book[5] == b'0':  # ไม่ถูกลบ
-                        book_id = self._decode(book[0])
-                        title = self._decode(book[1])[:33]
-                        author = self._decode(book[2])[:18]
-                        year = self._decode(book[3])
-                        status = "ว่าง" if book[4] == b'A' else "ถูกยืม"
-                        
-                        print(f"{book_id:<6} {title:<35} {author:<20} {year:<6} {status:<10}")
-                except struct.error as e:
-                    print(f"ข้อผิดพลาดในการอ่านข้อมูล: {e}")
-                    break
+        # กรองเฉพาะที่ไม่ถูกลบจาก byte ดิบ แล้วแปลงเฉพาะ field ที่แสดง
+        for book in scan_views(self.books, self.book_codec, deleted=b'0'):
+            book_id = self._format_id(book[0])
+            title = book.text(1)[:33]
+            author = book.text(2)[:18]
+            year = book.text(3)
+            status = "ว่าง" if book[4] == b'A' else "ถูกยืม"
+            
+            print(f"{book_id:<6} {title:<35} {author:<20} {year:<6} {status:<10}")
+        
+        # ตรวจสอบขนาดข้อมูล (record สุดท้ายไม่ครบ)
+        leftover = self.books.trailing_bytes()
+        if leftover:
+            print(f"ข้อมูลไฟล์เสียหาย (ขนาดไม่ตรง: {leftover} != {self.book_size})")
     
     def search_book(self):
         """ค้นหาหนังสือ"""
@@ -124,28 +185,24 @@ class SimpleLibrary:
         print(f"\n{'ID':<6} {'ชื่อ':<35} {'ผู้แต่ง':<20} {'สถานะ':<10}")
         print("-" * 75)
         
-        with open(self.books_file, 'rb') as f:
-            while True:
-                data = f.read(self.book_size)
-                if not data or len(data) != self.book_size:
-                    break
-                
-                try:
-                    book = struct.unpack(self.book_format, data)
-                    if book[5] == b'0':
-                        title = self._decode(book[1]).lower()
-                        author = self._decode(book[2]).lower()
-                        
-                        if keyword in title or keyword in author:
-                            book_id = self._decode(book[0])
-                            display_title = self._decode(book[1])[:33]
-                            display_author = self._decode(book[2])[:18]
-                            status = "ว่าง" if book[4] == b'A' else "ถูกยืม"
-                            
-                            print(f"{book_id:<6} {display_title:<35} {display_author:<20} {status:<10}")
-                            found = True
-                except struct.error:
-                    break
+        # ใช้ดัชนีข้อความ (เรียงตามความเกี่ยวข้อง) ถ้า keyword สั้นเกินไปจึงไล่ทั้งไฟล์
+        matches = self.text_index.search(keyword)
+        if matches is not None:
+            books = [self.book_codec.view(self.books.get(index)) for index in matches]
+        else:
+            books = [
+                book for book in scan_views(self.books, self.book_codec, deleted=b'0')
+                if keyword in book.text(1).lower() or keyword in book.text(2).lower()
+            ]
+        
+        for book in books:
+            book_id = self._format_id(book[0])
+            display_title = book.text(1)[:33]
+            display_author = book.text(2)[:18]
+            status = "ว่าง" if book[4] == b'A' else "ถูกยืม"
+            
+            print(f"{book_id:<6} {display_title:<35} {display_author:<20} {status:<10}")
+            found = True
         
         if not found:
             print("ไม่พบหนังสือที่ค้นหา")
@@ -185,20 +242,26 @@ class SimpleLibrary:
         if not year:
             year = self._decode(book[3])
         
-        # บันทึกข้อมูลใหม่
-        updated_book = struct.pack(
-            self.book_format,
-            book[0],  # ID เดิม
-            self._encode(title, 100),
-            self._encode(author, 50),
-            self._encode(year, 4),
-            book[4],  # สถานะเดิม
-            book[5]   # deleted flag เดิม
-        )
-        
-        with open(self.books_file, 'r+b') as f:
-            f.seek(book_index * self.book_size)
-            f.write(updated_book)
+        with self.books.locks.records([book_index]):
+            # อ่านใหม่ภายใต้ล็อก ระหว่างกรอกข้อมูล terminal อื่นอาจยืมหรือลบเล่มนี้ไปแล้ว
+            book = self._get_book_at_index(book_index)
+            if book[5] != b'0':
+                print("❌ หนังสือถูกลบไปแล้ว")
+                return
+            
+            # บันทึกข้อมูลใหม่
+            updated_book = self.book_codec.pack(
+                book[0],  # ID เดิม
+                self._encode(title, 100),
+                self._encode(author, 50),
+                self._encode(year, 4),
+                book[4],  # สถานะเดิม
+                book[5]   # deleted flag เดิม
+            )
+            
+            self.text_index.remove(book_index, self.books.get(book_index))
+            self.wal.write(self.books, book_index, updated_book)
+            self.text_index.add(book_index, updated_book)
         
         print("\n✅ แก้ไขหนังสือสำเร็จ!")
     
@@ -232,57 +295,46 @@ class SimpleLibrary:
             print("ยกเลิกการลบ")
             return
         
-        # ทำ soft delete (เปลี่ยน flag เป็น '1')
-        deleted_book = struct.pack(
-            self.book_format,
-            book[0], book[1], book[2], book[3], book[4],
-            b'1'  # ตั้งค่า deleted = 1
-        )
-        
-        with open(self.books_file, 'r+b') as f:
-            f.seek(book_index * self.book_size)
-            f.write(deleted_book)
+        with self.books.locks.records([book_index]):
+            # ตรวจซ้ำภายใต้ล็อก
+            book = self._get_book_at_index(book_index)
+            if book[4] == b'B' or book[5] != b'0':
+                print("❌ หนังสือถูกยืมหรือถูกลบไปแล้ว ไม่สามารถลบได้")
+                return
+            
+            # ทำ soft delete (เปลี่ยน flag เป็น '1')
+            deleted_book = self.book_codec.pack(
+                book[0], book[1], book[2], book[3], book[4],
+                b'1'  # ตั้งค่า deleted = 1
+            )
+            
+            with self.wal.transaction() as txn:
+                txn.write(self.books, book_index, deleted_book)
+                self._count(txn, total_books=-1, available_books=-1 if book[4] == b'A' else 0)
+            self.text_index.remove(book_index, deleted_book)
         
         print("\n✅ ลบหนังสือสำเร็จ!")
     
+    @metrics.operation()
     def _find_book_index(self, book_id: str) -> int:
-        """หา index ของหนังสือ"""
-        if not os.path.exists(self.books_file):
+        """หา index ของหนังสือ (ผ่านดัชนี books.idx)"""
+        number = self._parse_id(book_id)
+        if number is None:
             return -1
-        
-        with open(self.books_file, 'rb') as f:
-            index = 0
-            while True:
-                data = f.read(self.book_size)
-                if not data or len(data) != self.book_size:
-                    break
-                
-                try:
-                    book = struct.unpack(self.book_format, data)
-                    if self._decode(book[0]) == book_id and book[5] == b'0':
-                        return index
-                    index += 1
-                except struct.error:
-                    break
+        index = self.book_index.lookup(number)
+        book = self._get_book_at_index(index)
+        if book and book[0] == number and book[5] == b'0':
+            return index
         
         return -1
     
     def _get_book_at_index(self, index: int) -> Optional[Tuple]:
         """ดึงข้อมูลหนังสือจาก index"""
-        if not os.path.exists(self.books_file):
+        data = self.books.get(index)
+        if data is None:
             return None
         
-        with open(self.books_file, 'rb') as f:
-            f.seek(index * self.book_size)
-            data = f.read(self.book_size)
-            
-            if not data or len(data) != self.book_size:
-                return None
-            
-            try:
-                return struct.unpack(self.book_format, data)
-            except struct.error:
-                return None
+        return self.book_codec.unpack(data)
     
     # ==================== สมาชิก ====================
     
@@ -296,12 +348,11 @@ class SimpleLibrary:
             print("❌ กรุณากรอกชื่อ")
             return
         
-        member_id = self._get_next_id(self.members_file, self.member_size)
+        member_id = self._get_next_id(self.member_ids)
         join_date = datetime.date.today().strftime("%Y-%m-%d")
         
-        data = struct.pack(
-            self.member_format,
-            self._encode(member_id, 4),
+        data = self.member_codec.pack(
+            member_id,
             self._encode(name, 50),
             self._encode(phone, 15),
             self._encode(join_date, 10),
@@ -309,39 +360,33 @@ class SimpleLibrary:
             b'0'   # Not deleted
         )
         
-        with open(self.members_file, 'ab') as f:
-            f.write(data)
+        with self.wal.transaction() as txn:
+            txn.append(self.members, data)
+            self._count(txn, active_members=1)
+        index = txn.first_index(self.members)
+        self.member_index.add(member_id, index)
         
-        print(f"✅ เพิ่มสมาชิกสำเร็จ! ID: {member_id}")
+        print(f"✅ เพิ่มสมาชิกสำเร็จ! ID: {self._format_id(member_id)}")
     
+    @metrics.operation()
     def list_members(self):
         """แสดงรายการสมาชิก"""
         print("\n=== รายการสมาชิก ===")
         
-        if not os.path.exists(self.members_file) or os.path.getsize(self.members_file) == 0:
+        if len(self.members) == 0:
             print("ยังไม่มีสมาชิกในระบบ")
             return
         
         print(f"{'ID':<6} {'ชื่อ':<30} {'เบอร์โทร':<15} {'สถานะ':<10}")
         print("-" * 65)
         
-        with open(self.members_file, 'rb') as f:
-            while True:
-                data = f.read(self.member_size)
-                if not data or len(data) != self.member_size:
-                    break
-                
-                try:
-                    member = struct.unpack(self.member_format, data)
-                    if member[5] == b'0':
-                        member_id = self._decode(member[0])
-                        name = self._decode(member[1])[:28]
-                        phone = self._decode(member[2])
-                        status = "ใช้งาน" if member[4] == b'A' else "ถูกแบน"
-                        
-                        print(f"{member_id:<6} {name:<30} {phone:<15} {status:<10}")
-                except struct.error:
-                    break
+        for member in scan_views(self.members, self.member_codec, deleted=b'0'):
+            member_id = self._format_id(member[0])
+            name = member.text(1)[:28]
+            phone = member.text(2)
+            status = "ใช้งาน" if member[4] == b'A' else "ถูกแบน"
+            
+            print(f"{member_id:<6} {name:<30} {phone:<15} {status:<10}")
     
     def delete_member(self):
         """ลบสมาชิก"""
@@ -375,76 +420,60 @@ class SimpleLibrary:
             print("ยกเลิกการลบ")
             return
         
-        # ทำ soft delete
-        deleted_member = struct.pack(
-            self.member_format,
-            member[0], member[1], member[2], member[3], member[4],
-            b'1'  # ตั้งค่า deleted = 1
-        )
-        
-        with open(self.members_file, 'r+b') as f:
-            f.seek(member_index * self.member_size)
-            f.write(deleted_member)
+        with self.members.locks.records([member_index]):
+            # ตรวจซ้ำภายใต้ล็อก
+            member = self._get_member_at_index(member_index)
+            if member[5] != b'0':
+                print("ไม่พบสมาชิก")  # ถูกลบไปแล้วระหว่างรอล็อก
+                return
+            if self._has_active_borrow_by_member(member_id):
+                print("สมาชิกคนนี้กำลังยืมหนังสืออยู่ ไม่สามารถลบได้")
+                return
+            
+            # ทำ soft delete
+            deleted_member = self.member_codec.pack(
+                member[0], member[1], member[2], member[3], member[4],
+                b'1'  # ตั้งค่า deleted = 1
+            )
+            
+            with self.wal.transaction() as txn:
+                txn.write(self.members, member_index, deleted_member)
+                if member[4] == b'A':
+                    self._count(txn, active_members=-1)
         
         print("\nลบสมาชิกสำเร็จ!")
     
+    @metrics.operation()
     def _find_member_index(self, member_id: str) -> int:
-        """หา index ของสมาชิก"""
-        if not os.path.exists(self.members_file):
+        """หา index ของสมาชิก (ผ่านดัชนี members.idx)"""
+        number = self._parse_id(member_id)
+        if number is None:
             return -1
-        
-        with open(self.members_file, 'rb') as f:
-            index = 0
-            while True:
-                data = f.read(self.member_size)
-                if not data or len(data) != self.member_size:
-                    break
-                
-                try:
-                    member = struct.unpack(self.member_format, data)
-                    if self._decode(member[0]) == member_id and member[5] == b'0':
-                        return index
-                    index += 1
-                except struct.error:
-                    break
+        index = self.member_index.lookup(number)
+        member = self._get_member_at_index(index)
+        if member and member[0] == number and member[5] == b'0':
+            return index
         
         return -1
     
     def _get_member_at_index(self, index: int) -> Optional[Tuple]:
         """ดึงข้อมูลสมาชิกจาก index"""
-        if not os.path.exists(self.members_file):
+        data = self.members.get(index)
+        if data is None:
             return None
         
-        with open(self.members_file, 'rb') as f:
-            f.seek(index * self.member_size)
-            data = f.read(self.member_size)
-            
-            if not data or len(data) != self.member_size:
-                return None
-            
-            try:
-                return struct.unpack(self.member_format, data)
-            except struct.error:
-                return None
+        return self.member_codec.unpack(data)
     
+    @metrics.operation()
     def _has_active_borrow_by_member(self, member_id: str) -> bool:
-        """ตรวจสอบว่าสมาชิกมีหนังสือยืมอยู่หรือไม่"""
-        if not os.path.exists(self.borrows_file):
+        """ตรวจสอบว่าสมาชิกมีหนังสือยืมอยู่หรือไม่ (ผ่านดัชนี borrows_member.idx)"""
+        number = self._parse_id(member_id)
+        if number is None:
             return False
-        
-        with open(self.borrows_file, 'rb') as f:
-            while True:
-                data = f.read(self.borrow_size)
-                if not data or len(data) != self.borrow_size:
-                    break
-                
-                try:
-                    borrow = struct.unpack(self.borrow_format, data)
-                    if (self._decode(borrow[2]) == member_id and 
-                        borrow[5] == b'B' and borrow[6] == b'0'):
-                        return True
-                except struct.error:
-                    break
+        for index in self.active_by_member.lookup(number):
+            borrow = self.borrow_codec.unpack(self.borrows.get(index))
+            if borrow[2] == number and borrow[5] == b'B' and borrow[6] == b'0':
+                return True
         
         return False
     
@@ -467,35 +496,56 @@ class SimpleLibrary:
             return
         
         # ตรวจสอบหนังสือ
-        book = self._find_book(book_id)
-        if not book:
+        book_index = self._find_book_index(book_id)
+        if book_index == -1:
             print("❌ ไม่พบหนังสือ")
             return
         
-        if book[4] != b'A':
-            print("❌ หนังสือถูกยืมแล้ว")
+        member_index = self._find_member_index(member_id)
+        if member_index == -1:
+            print("❌ ไม่พบสมาชิก")
             return
         
-        # บันทึกการยืม
-        borrow_id = self._get_next_id(self.borrows_file, self.borrow_size)
-        borrow_date = datetime.date.today().strftime("%Y-%m-%d")
-        
-        data = struct.pack(
-            self.borrow_format,
-            self._encode(borrow_id, 4),
-            self._encode(book_id, 4),
-            self._encode(member_id, 4),
-            self._encode(borrow_date, 10),
-            self._encode("", 10),  # ยังไม่คืน
-            b'B',  # Borrowed
-            b'0'
-        )
-        
-        with open(self.borrows_file, 'ab') as f:
-            f.write(data)
+        with self.books.locks.records([book_index]), self.members.locks.records([member_index]):
+            # อ่านสถานะภายใต้ล็อก terminal อื่นจึงยืมเล่มเดียวกันซ้อนไม่ได้
+            book = self._get_book_at_index(book_index)
+            if book[4] != b'A' or book[5] != b'0':
+                print("❌ หนังสือถูกยืมแล้ว")
+                return
+            
+            # สมาชิกอาจถูกลบหรือระงับระหว่างรอล็อก (delete_member ถือล็อกเดียวกันนี้)
+            member = self._get_member_at_index(member_index)
+            if member[5] != b'0':
+                print("❌ ไม่พบสมาชิก")
+                return
+            if member[4] != b'A':
+                print("❌ สมาชิกถูกระงับ ไม่สามารถยืมได้")
+                return
+            
+            # บันทึกการยืม
+            borrow_id = self._get_next_id(self.borrow_ids)
+            borrow_date = datetime.date.today().strftime("%Y-%m-%d")
+            
+            data = self.borrow_codec.pack(
+                borrow_id,
+                book[0],
+                member[0],
+                self._encode(borrow_date, 10),
+                self._encode("", 10),  # ยังไม่คืน
+                b'B',  # Borrowed
+                b'0'
+            )
+            
+            # รายการยืมและสถานะหนังสืออยู่ใน transaction เดียว
+            with self.wal.transaction() as txn:
+                txn.append(self.borrows, data)
+                self._update_book_status(book_id, b'B', txn)
+                self._count(txn, available_books=-1, active_borrows=1)
         
-        # อัปเดตสถานะหนังสือ
-        self._update_book_status(book_id, b'B')
+        index = txn.first_index(self.borrows)
+        self.borrow_index.add(borrow_id, index)
+        self.active_by_member.add(member[0], index)
+        self.active_by_book.add(book[0], index)
         
         due_date = (datetime.date.today() + datetime.timedelta(days=7)).strftime("%Y-%m-%d")
         print(f"✅ ยืมสำเร็จ!")
@@ -518,20 +568,29 @@ class SimpleLibrary:
         return_date = datetime.date.today().strftime("%Y-%m-%d")
         
         # อัปเดตรายการยืม
-        updated = struct.pack(
-            self.borrow_format,
+        updated = self.borrow_codec.pack(
             borrow[0], borrow[1], borrow[2], borrow[3],
             self._encode(return_date, 10),
             b'R',  # Returned
             borrow[6]
         )
         
-        with open(self.borrows_file, 'r+b') as f:
-            f.seek(index * self.borrow_size)
-            f.write(updated)
+        book_index = self._find_book_index(book_id)
+        with self.books.locks.records([book_index] if book_index != -1 else []), \
+                self.borrows.locks.records([index]):
+            # terminal อื่นอาจคืนเล่มนี้ไปก่อนแล้ว
+            if self.borrows.get(index)[-2:] != b'B0':
+                print("❌ ไม่พบรายการยืม หรือคืนแล้ว")
+                return
+            
+            # รายการยืมและสถานะหนังสืออยู่ใน transaction เดียว
+            with self.wal.transaction() as txn:
+                txn.write(self.borrows, index, updated)
+                available = self._update_book_status(book_id, b'A', txn)
+                self._count(txn, available_books=int(available), active_borrows=-1)
         
-        # อัปเดตสถานะหนังสือ
-        self._update_book_status(book_id, b'A')
+        self.active_by_member.remove(borrow[2], index)
+        self.active_by_book.remove(borrow[1], index)
         
         # คำนวณค่าปรับ (ถ้ามี)
         borrow_date = datetime.datetime.strptime(self._decode(borrow[3]), "%Y-%m-%d").date()
@@ -547,11 +606,12 @@ class SimpleLibrary:
         else:
             print("✨ คืนตรงเวลา")
     
+    @metrics.operation()
     def list_borrows(self):
         """แสดงรายการยืมที่ยังไม่คืน"""
         print("\n=== รายการยืมปัจจุบัน ===")
         
-        if not os.path.exists(self.borrows_file) or os.path.getsize(self.borrows_file) == 0:
+        if len(self.borrows) == 0:
             print("ไม่มีรายการยืม")
             return
         
@@ -559,154 +619,94 @@ class SimpleLibrary:
         print("-" * 90)
         
         found = False
-        with open(self.borrows_file, 'rb') as f:
-            while True:
-                data = f.read(self.borrow_size)
-                if not data or len(data) != self.borrow_size:
-                    break
-                
-                try:
-                    borrow = struct.unpack(self.borrow_format, data)
-                    if borrow[5] == b'B' and borrow[6] == b'0':  # ยืมอยู่
-                        book_id = self._decode(borrow[1])
-                        member_id = self._decode(borrow[2])
-                        
-                        book = self._find_book(book_id)
-                        member = self._find_member(member_id)
-                        
-                        if book and member:
-                            book_title = self._decode(book[1])[:33]
-                            member_name = self._decode(member[1])[:23]
-                            borrow_date = self._decode(borrow[3])
-                            
-                            borrow_dt = datetime.datetime.strptime(borrow_date, "%Y-%m-%d").date()
-                            due_date = (borrow_dt + datetime.timedelta(days=7)).strftime("%Y-%m-%d")
-                            
-                            print(f"{book_title:<35} {member_name:<25} {borrow_date:<12} {due_date:<12}")
-                            found = True
-                except struct.error:
-                    break
+        # ยืมอยู่ = สถานะ B และยังไม่ถูกลบ (กรองจาก byte ดิบ)
+        borrows = scan_views(self.borrows, self.borrow_codec, status=b'B', deleted=b'0')
+        # join กับหนังสือ/สมาชิกทีละก้อนผ่านดัชนีหลัก แทนการค้นทีละรายการ (ข้ามที่ถูกลบแล้ว)
+        rows = index_join(borrows, [
+            (lambda borrow: borrow[1], self.book_index,
+             lambda data: self.book_codec.view(data).text(1)[:33] if data[-1:] == b'0' else None),
+            (lambda borrow: borrow[2], self.member_index,
+             lambda data: self.member_codec.view(data).text(1)[:23] if data[-1:] == b'0' else None),
+        ])
+        for borrow, book_title, member_name in rows:
+            borrow_date = borrow.text(3)
+            
+            borrow_dt = datetime.datetime.strptime(borrow_date, "%Y-%m-%d").date()
+            due_date = (borrow_dt + datetime.timedelta(days=7)).strftime("%Y-%m-%d")
+            
+            print(f"{book_title:<35} {member_name:<25} {borrow_date:<12} {due_date:<12}")
+            found = True
         
         if not found:
             print("ไม่มีรายการยืมปัจจุบัน")
     
     # ==================== ฟังก์ชันช่วย ====================
     
+    @metrics.operation()
     def _find_book(self, book_id: str) -> Optional[Tuple]:
         """หาหนังสือจาก ID"""
-        if not os.path.exists(self.books_file):
+        index = self._find_book_index(book_id)
+        if index == -1:
             return None
-        
-        with open(self.books_file, 'rb') as f:
-            while True:
-                data = f.read(self.book_size)
-                if not data:
-                    break
-                book = struct.unpack(self.book_format, data)
-                if self._decode(book[0]) == book_id and book[5] == b'0':
-                    return book
-        return None
+        return self._get_book_at_index(index)
     
+    @metrics.operation()
     def _find_member(self, member_id: str) -> Optional[Tuple]:
         """หาสมาชิกจาก ID"""
-        if not os.path.exists(self.members_file):
+        index = self._find_member_index(member_id)
+        if index == -1:
             return None
-        
-        with open(self.members_file, 'rb') as f:
-            while True:
-                data = f.read(self.member_size)
-                if not data:
-                    break
-                member = struct.unpack(self.member_format, data)
-                if self._decode(member[0]) == member_id and member[5] == b'0':
-                    return member
-        return None
+        return self._get_member_at_index(index)
     
+    @metrics.operation()
     def _find_active_borrow(self, book_id: str) -> Optional[Tuple[int, Tuple]]:
-        """หารายการยืมที่ยังไม่คืน"""
-        if not os.path.exists(self.borrows_file):
+        """หารายการยืมที่ยังไม่คืน (ผ่านดัชนี borrows_book.idx)"""
+        number = self._parse_id(book_id)
+        if number is None:
             return None
-        
-        with open(self.borrows_file, 'rb') as f:
-            index = 0
-            while True:
-                data = f.read(self.borrow_size)
-                if not data:
-                    break
-                borrow = struct.unpack(self.borrow_format, data)
-                if self._decode(borrow[1]) == book_id and borrow[5] == b'B' and borrow[6] == b'0':
-                    return (index, borrow)
-                index += 1
+        for index in self.active_by_book.lookup(number):
+            borrow = self.borrow_codec.unpack(self.borrows.get(index))
+            if borrow[1] == number and borrow[5] == b'B' and borrow[6] == b'0':
+                return (index, borrow)
         return None
     
-    def _update_book_status(self, book_id: str, status: bytes):
-        """อัปเดตสถานะหนังสือ"""
-        if not os.path.exists(self.books_file):
-            return
+    @metrics.operation()
+    def _update_book_status(self, book_id: str, status: bytes, txn: Optional[Transaction] = None) -> bool:
+        """อัปเดตสถานะหนังสือ (ถ้าระบุ txn จะเขียนใน transaction นั้น) คืนค่า False ถ้าไม่พบหนังสือ"""
+        index = self._find_book_index(book_id)
+        if index == -1:
+            return False
         
-        with open(self.books_file, 'r+b') as f:
-            index = 0
-            while True:
-                data = f.read(self.book_size)
-                if not data:
-                    break
-                
-                book = struct.unpack(self.book_format, data)
-                if self._decode(book[0]) == book_id and book[5] == b'0':
-                    updated = struct.pack(
-                        self.book_format,
-                        book[0], book[1], book[2], book[3],
-                        status,
-                        book[5]
-                    )
-                    f.seek(index * self.book_size)
-                    f.write(updated)
-                    break
-                index += 1
+        book = self._get_book_at_index(index)
+        updated = self.book_codec.pack(
+            book[0], book[1], book[2], book[3],
+            status,
+            book[5]
+        )
+        if txn is not None:
+            txn.write(self.books, index, updated)
+        else:
+            self.wal.write(self.books, index, updated)
+        return True
     
+    def _scan_stats(self) -> Tuple[int, int, int, int]:
+        """นับสถิติใหม่จากไฟล์ข้อมูลทั้งหมด (ลำดับเดียวกับตัวนับใน library.cnt)
+
+        อ่านเฉพาะ byte ของสถานะและการลบของแต่ละ record (key = สถานะต่อด้วยลบ เช่น b'A0')
+        """
+        books = count_by(self.books, self.book_codec, 'status', 'deleted')
+        total_books = sum(n for key, n in books.items() if key[1:] == b'0')
+        total_members = count_by(self.members, self.member_codec, 'status', 'deleted')[b'A0']
+        active_borrows = count_by(self.borrows, self.borrow_codec, 'status', 'deleted')[b'B0']
+        return total_books, books[b'A0'], total_members, active_borrows
+    
+    @metrics.operation()
     def show_stats(self):
-        """แสดงสถิติสรุป"""
+        """แสดงสถิติสรุปจากตัวนับที่เก็บไว้ (ไม่อ่านไฟล์ข้อมูล)"""
         print("\n=== สถิติระบบ ===")
         
-        # นับหนังสือ
-        total_books = 0
-        available_books = 0
-        
-        if os.path.exists(self.books_file):
-            with open(self.books_file, 'rb') as f:
-                while True:
-                    data = f.read(self.book_size)
-                    if not data:
-                        break
-                    book = struct.unpack(self.book_format, data)
-                    if book[5] == b'0':
-                        total_books += 1
-                        if book[4] == b'A':
-                            available_books += 1
-        
-        # นับสมาชิก
-        total_members = 0
-        if os.path.exists(self.members_file):
-            with open(self.members_file, 'rb') as f:
-                while True:
-                    data = f.read(self.member_size)
-                    if not data:
-                        break
-                    member = struct.unpack(self.member_format, data)
-                    if member[5] == b'0' and member[4] == b'A':
-                        total_members += 1
-        
-        # นับรายการยืม
-        active_borrows = 0
-        if os.path.exists(self.borrows_file):
-            with open(self.borrows_file, 'rb') as f:
-                while True:
-                    data = f.read(self.borrow_size)
-                    if not data:
-                        break
-                    borrow = struct.unpack(self.borrow_format, data)
-                    if borrow[5] == b'B' and borrow[6] == b'0':
-                        active_borrows += 1
+        total_books, available_books, total_members, active_borrows = \
+            self.stats_codec.unpack(self.counters.get(0))
         
         print(f"📚 หนังสือทั้งหมด: {total_books} เล่ม")
         print(f"   - ว่าง: {available_books} เล่ม")
@@ -714,6 +714,65 @@ class SimpleLibrary:
         print(f"\n👥 สมาชิก: {total_members} คน")
         print(f"\n📋 กำลังยืม: {active_borrows} รายการ")
     
+    @metrics.operation()
+    def rebuild_indexes(self):
+        """สร้างไฟล์ดัชนีใหม่ทั้งหมดจากไฟล์ข้อมูล"""
+        self._print_indexes(self._rebuild_indexes())
+    
+    def _rebuild_indexes(self) -> List[Tuple[str, int]]:
+        return [(index.filename, index.rebuild())
+                for index in [self.book_index, self.member_index, self.borrow_index,
+                              self.active_by_member, self.active_by_book, self.text_index]]
+    
+    def _print_indexes(self, indexes: List[Tuple[str, int]]):
+        print("\n=== สร้างดัชนีใหม่ ===")
+        for filename, count in indexes:
+            print(f"✅ {filename}: {count} รายการ")
+    
+    def compact_files(self):
+        """บีบอัดไฟล์ข้อมูล: ตัด record ที่ถูกลบออก แล้วสร้างดัชนีใหม่"""
+        print("\n=== บีบอัดไฟล์ข้อมูล ===")
+        archive = input(f"ย้ายรายการยืมที่คืนแล้วไป {self.archive_file}? (y/n): ").strip().lower() == 'y'
+        
+        try:
+            results, indexes = compact_library(
+                self.usage, self.wal,
+                [(self.books, self.book_codec), (self.members, self.member_codec),
+                 (self.borrows, self.borrow_codec)],
+                self.borrows, self.borrow_schema, self.archive_file if archive else None,
+                self._rebuild_indexes)
+        except (FormatError, InUseError) as e:
+            print(f"❌ {e}")
+            return
+        for result in results:
+            print(f"✅ {result.filename}: ตัดออก {result.removed} รายการ, คืนพื้นที่ {result.reclaimed:,} bytes, "
+                  f"เวลาอ่านทั้งไฟล์ {result.scan_before * 1000:.2f} -> {result.scan_after * 1000:.2f} ms")
+        
+        print(f"\n💾 คืนพื้นที่ทั้งหมด: {sum(result.reclaimed for result in results):,} bytes")
+        self._print_indexes(indexes)
+    
+    def show_metrics(self):
+        """เปิดการเก็บสถิติการทำงานภายใน หรือแสดงผลที่เก็บได้แล้วหยุดเก็บ"""
+        print("\n=== สถิติการทำงานภายใน ===")
+        if not metrics.enabled:
+            trace_file = input("บันทึก trace ลงไฟล์ JSONL (Enter = ไม่บันทึก): ").strip() or None
+            metrics.reset()
+            metrics.enable(trace_file)
+            print("✅ เริ่มเก็บสถิติแล้ว เลือกเมนูนี้อีกครั้งเพื่อดูผลและหยุดเก็บ")
+            return
+        
+        metrics.disable()
+        snapshot = metrics.snapshot()
+        if not snapshot:
+            print("ยังไม่มีข้อมูล")
+            return
+        print(f"{'operation':<40} {'ครั้ง':>7} {'เวลารวม ms':>11} {'records':>10} {'อ่าน B':>12} {'เขียน B':>12} {'เปิดไฟล์':>8}")
+        print("-" * 106)
+        for name, stats in snapshot.items():
+            print(f"{name[:40]:<40} {stats['calls']:>7,} {stats['wall_time'] * 1000:>11.1f} {stats['records']:>10,} "
+                  f"{stats['bytes_read']:>12,} {stats['bytes_written']:>12,} {stats['files_opened']:>8,}")
+        print("\n(เวลาและ I/O ของแต่ละ operation รวมของ helper ที่ถูกเรียกข้างในด้วย)")
+    
     # ==================== เมนู ====================
     
     def run(self):
@@ -726,6 +785,7 @@ class SimpleLibrary:
             print("2. จัดการสมาชิก")
             print("3. ยืม-คืนหนังสือ")
             print("4. ดูสถิติ")
+            print("5. บำรุงรักษาระบบ")
             print("0. ออก")
             print("-" * 50)
             
@@ -740,7 +800,13 @@ class SimpleLibrary:
             elif choice == '4':
                 self.show_stats()
                 input("\nกด Enter...")
+            elif choice == '5':
+                self._maintenance_menu()
             elif choice == '0':
+                self.wal.checkpoint()
+                for sequence in (self.book_ids, self.member_ids, self.borrow_ids):
+                    sequence.release()  # คืน ID ที่จองไว้แต่ยังไม่ได้ใช้
+                self.usage.close()
                 print("\n👋 ขอบคุณที่ใช้บริการ!")
                 break
     
@@ -832,7 +898,41 @@ class SimpleLibrary:
             elif choice == '0':
                 break
 
+    
+    def _maintenance_menu(self):
+        """เมนูบำรุงรักษา"""
+        while True:
+            print("\n" + "=" * 40)
+            print("🛠️  บำรุงรักษาระบบ")
+            print("=" * 40)
+            print("1. สร้างดัชนีใหม่ (Rebuild Index)")
+            print("2. บีบอัดไฟล์ข้อมูล (Compact)")
+            print("3. สถิติการทำงานภายใน (เวลา/I/O)")
+            print("0. กลับ")
+            print("-" * 40)
+            
+            choice = input("เลือกเมนู (0-3): ").strip()
+            
+            if choice == '1':
+                self.rebuild_indexes()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
+            elif choice == '2':
+                self.compact_files()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
+            elif choice == '3':
+                self.show_metrics()
+                input("\n✓ กด Enter เพื่อดำเนินการต่อ...")
+            elif choice == '0':
+                break
+            else:
+                print("❌ กรุณาเลือก 0-3 เท่านั้น")
+                input("\nกด Enter...")
+
 
 if __name__ == "__main__":
-    lib = SimpleLibrary()
+    try:
+        lib = SimpleLibrary()
+    except FormatError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
     lib.run()
\ No newline at end of file
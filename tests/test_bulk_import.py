@@ -0,0 +1,116 @@
+import datetime
+import random
+import struct
+
+import pytest
+
+import indexes
+from bulk_export import Exporter, read_columnar
+from bulk_import import BulkImporter
+from library_service import ConflictError, LibraryService
+
+
+def open_service(directory):
+    directory.mkdir()
+    return LibraryService(str(directory))
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = open_service(tmp_path / 'source')
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def target(tmp_path):
+    service = open_service(tmp_path / 'target')
+    yield service
+    service.close()
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def test_export_then_import_round_trip(tmp_path, service, target, fmt):
+    for i in range(20):
+        service.add_book(f'Title {i}, "quoted"', f'Author {i % 3}', str(1990 + i))
+    for i in range(10):
+        service.add_member(f'Member {i}', f'65{i:08d}', f'08{i:08d}')
+    service.delete_book('005')
+
+    results = Exporter(service).export_all(fmt, str(tmp_path / 'export'), tables=('books', 'members'))
+    importer = BulkImporter(target)
+    books = importer.import_books(results[0].filename)
+    members = importer.import_members(results[1].filename)
+
+    assert (books.imported, books.rejected) == (19, 0)
+    assert (members.imported, members.rejected) == (10, 0)
+    assert [(b.title, b.author, b.year) for b in target.list_books()] == \
+        [(b.title, b.author, b.year) for b in service.list_books()]
+    assert [(m.name, m.student_id, m.phone) for m in target.list_members()] == \
+        [(m.name, m.student_id, m.phone) for m in service.list_members()]
+    assert [b.title for b in target.search_books('title 12')] == ['Title 12, "quoted"']
+    stored, actual = target.verify_stats(repair=False)
+    assert stored == actual
+
+    # นำเข้าซ้ำ: รหัสนักศึกษาทุกแถวมีอยู่แล้ว
+    again = importer.import_members(results[1].filename)
+    assert (again.imported, again.rejected) == (0, 10)
+    with pytest.raises(ConflictError):
+        target.add_member('Someone', '6500000003')
+
+
+def test_columnar_export_and_since_filter(tmp_path, service, monkeypatch):
+    monkeypatch.setattr(Exporter, 'CHUNK_RECORDS', 4)
+    for i in range(10):
+        service.add_book(f'หนังสือ {i}', 'Author', '2000')
+    member = service.add_member('Reader', '6500000001')
+    service.borrow(member, ['001', '002'], borrow_date=datetime.date(2024, 1, 5))
+    service.borrow(member, ['003'], borrow_date=datetime.date(2024, 3, 1))
+    service.delete_book('010')
+
+    exporter = Exporter(service)
+    books = exporter.export_table('books', 'columnar', str(tmp_path))
+    rows = list(read_columnar(books.filename))
+    assert books.rows == len(rows) == 9   # row group ละ 4 แถว ไม่รวมเล่มที่ถูกลบ
+    assert [row['title'] for row in rows] == [f'หนังสือ {i}' for i in range(9)]
+    assert [row['status'] for row in rows[:4]] == ['B', 'B', 'B', 'A']
+    assert 'deleted' not in rows[0]
+
+    borrows = exporter.export_table('borrows', 'columnar', str(tmp_path), since='2024-02-01')
+    assert [row['book_id'] for row in read_columnar(borrows.filename)] == [3]
+    assert exporter.export_table('borrows', 'csv', str(tmp_path), since='2024-01-05').rows == 3
+    with pytest.raises(ValueError):
+        exporter.export_table('borrows', 'csv', str(tmp_path), since='05/01/2024')
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['books.col', 'borrows.col', 'borrows.csv', 'source']
+
+
+def test_import_members_rejects_existing_and_repeated_ids(tmp_path, service):
+    service.add_member('Existing', '6500000001')
+    path = tmp_path / 'members.csv'
+    path.write_text('name,student_id,phone\n'
+                    'A,6500000001,\n'
+                    'B,6500000002,\n'
+                    'C,6500000002,\n'
+                    ',6500000004,\n'
+                    'D,6500000005,\n', encoding='utf-8')
+
+    result = BulkImporter(service).import_members(str(path))
+    assert (result.imported, result.rejected) == (2, 3)
+    assert [line for line, _ in result.errors] == [2, 4, 5]
+    assert sorted(m.student_id for m in service.list_members()) == ['6500000001', '6500000002', '6500000005']
+
+
+def test_index_builds_spill_sorted_runs(tmp_path, service, monkeypatch):
+    monkeypatch.setattr(indexes, 'RUN_ENTRIES', 8)
+    path = tmp_path / 'books.jsonl'
+    path.write_text(''.join(f'{{"title": "Book {i}", "author": "A", "year": "2000"}}\n' for i in range(50)),
+                    encoding='utf-8')
+    assert BulkImporter(service).import_books(str(path)).imported == 50
+    assert service.get_book('037').title == 'Book 36'
+    assert [b.id for b in service.search_books('book 49')] == ['050']
+
+    # key ที่ไม่เรียง (เช่น ID ที่สองเครื่องจองคนละช่วง) ต้อง merge ทุก run
+    entry = struct.Struct('<IQ')
+    items = [(key, index) for index, key in enumerate(random.Random(5).sample(range(1000), 100))]
+    data = b''.join(indexes.sorted_entries(entry, items, str(tmp_path)))
+    assert list(entry.iter_unpack(data)) == sorted(items)
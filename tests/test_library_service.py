@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+from library_service import ConflictError, LibraryService, NotFoundError, ValidationError
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = LibraryService(str(tmp_path))
+    yield service
+    service.close()
+
+
+def test_listings_include_records_just_added(service):
+    for i in range(3):
+        service.add_book(f'Book {i}', 'Author', '2000')
+    assert [book.id for book in service.list_books()] == ['001', '002', '003']
+
+    member = service.add_member('Member', '6500000001')
+    assert [m.id for m in service.list_members()] == [member]
+
+    service.borrow(member, ['001', '002'])
+    assert sorted(loan.book.id for loan in service.active_loans()) == ['001', '002']
+    stored, actual = service.verify_stats(repair=False)
+    assert stored == actual
+
+
+def test_compact_refuses_while_another_instance_is_open(tmp_path, service):
+    for i in range(3):
+        service.add_book(f'Book {i}', 'Author', '2000')
+    service.delete_book('002')
+
+    other = LibraryService(str(tmp_path))
+    with pytest.raises(ConflictError):
+        service.compact()
+    other.close()
+
+    report = service.compact()
+    assert [result.removed for result in report.files] == [1, 0, 0]
+    assert [book.id for book in service.list_books()] == ['001', '003']
+    assert service.get_book('003').title == 'Book 2'
+
+
+def test_return_rejects_duplicate_book_ids(service):
+    service.add_book('Book', 'Author', '2000')
+    member = service.add_member('Member', '6500000001')
+    service.borrow(member, ['001'])
+
+    with pytest.raises(ValidationError):
+        service.return_books(['001', '1'])
+    assert len(list(service.active_loans())) == 1
+
+    service.return_books(['001'])
+    stored, actual = service.verify_stats(repair=False)
+    assert stored == actual
+    assert stored.available_books == 1 and stored.active_borrows == 0
+
+
+def test_borrow_rechecks_member_under_lock(tmp_path, service, monkeypatch):
+    service.add_book('Book', 'Author', '2000')
+    member = service.add_member('Member', '6500000001')
+    other = LibraryService(str(tmp_path))
+
+    # terminal อื่นลบสมาชิกหลัง borrow ตรวจแล้ว แต่ก่อนได้ล็อกสมาชิก
+    records = service.members.locks.records
+
+    def delete_then_lock(indexes):
+        other.delete_member(member)
+        return records(indexes)
+
+    monkeypatch.setattr(service.members.locks, 'records', delete_then_lock)
+    with pytest.raises(NotFoundError):
+        service.borrow(member, ['001'])
+    other.close()
+    assert service.get_book('001').available
+    assert list(service.active_loans()) == []
+
+
+def test_close_releases_every_file_and_can_be_called_twice(tmp_path):
+    fd_dir = '/proc/self/fd'
+    if not os.path.isdir(fd_dir):
+        pytest.skip("ต้องใช้ /proc/self/fd")
+    before = set(os.listdir(fd_dir))
+
+    service = LibraryService(str(tmp_path))
+    service.add_book('Book', 'Author', '2000')
+    member = service.add_member('Member', '6500000001')
+    service.borrow(member, ['001'])
+    assert service.search_books('book')
+    service.close()
+    service.close()
+
+    leaked = {os.readlink(os.path.join(fd_dir, fd)) for fd in set(os.listdir(fd_dir)) - before
+              if os.path.exists(os.path.join(fd_dir, fd))}
+    assert not {path for path in leaked if path.startswith(str(tmp_path))}
+
+    # ปิดแล้ว instance ใหม่ได้ล็อกการเปิดใช้แต่เพียงผู้เดียว จึงบีบอัดไฟล์ได้
+    reopened = LibraryService(str(tmp_path))
+    assert reopened.recovered == 0
+    assert not reopened.get_book('001').available
+    reopened.compact()
+    reopened.close()
+
+
+def test_terminal_menu_runs_on_the_service(service, monkeypatch, capsys):
+    from test2 import SimpleLibrary
+
+    answers = iter(['Learning Python', 'Author', '2001', 'python'])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    library = SimpleLibrary(service)
+    library.add_book()
+    library.search_book()
+
+    out = capsys.readouterr().out
+    assert 'ID: 001' in out and 'Learning Python' in out.split('ค้นหาหนังสือ')[1]
+    assert service.get_book('001').title == 'Learning Python'
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import migrate
+from library_service import LibraryService
+from schema import PROGRAMS
+
+TABLES = PROGRAMS['test2'].tables
+
+
+def _write_legacy(tmp_path, books: int):
+    # ไฟล์รุ่นก่อน: ไม่มี header และ ID เป็นข้อความ 3 หลัก
+    codec = TABLES['books'].legacy.codec
+    with open(tmp_path / 'books.dat', 'wb') as f:
+        for i in range(1, books + 1):
+            f.write(codec.pack(b'%03d' % i, f'Legacy book {i}'.encode(), b'Author', b'1999', b'A', b'0'))
+    codec = TABLES['members'].legacy.codec
+    with open(tmp_path / 'members.dat', 'wb') as f:
+        f.write(codec.pack(b'001', 'สมชาย'.encode(), b'6500000001', b'0812345678', b'2020-01-01', b'A', b'0'))
+    # ดัชนีตาม layout เดิมต้องถูกลบให้สร้างใหม่
+    (tmp_path / 'books.idx').write_bytes(b'stale')
+    (tmp_path / 'books_text.seg').write_bytes(b'stale')
+
+
+def test_migrates_legacy_files_and_drops_old_indexes(tmp_path):
+    _write_legacy(tmp_path, 25)
+    assert migrate.migrate('test2', str(tmp_path), chunk_size=200) == 2
+    assert not (tmp_path / 'books.idx').exists() and not (tmp_path / 'books_text.seg').exists()
+
+    service = LibraryService(str(tmp_path))
+    assert [book.title for book in service.list_books()] == [f'Legacy book {i}' for i in range(1, 26)]
+    assert service.get_book('017').title == 'Legacy book 17'
+    assert [book.id for book in service.search_books('book 25')] == ['025']
+    assert [member.name for member in service.list_members()] == ['สมชาย']
+    assert service.add_book('New', 'Author', '2024') == '026'
+    service.close()
+
+    # รันซ้ำ: ทุกไฟล์เป็นรุ่นล่าสุดแล้ว
+    assert migrate.migrate('test2', str(tmp_path)) == 0
+
+
+def test_interrupted_migration_resumes_from_journal(tmp_path, monkeypatch):
+    _write_legacy(tmp_path, 40)
+    filename = str(tmp_path / 'books.dat')
+    source, target = TABLES['books'].legacy.codec, TABLES['books'].schema.codec
+    writes = []
+    real_pwrite = os.pwrite
+
+    def crash_after_three(fd, data, offset):
+        if len(writes) == 3:
+            raise KeyboardInterrupt   # เหมือนโปรแกรมถูกหยุดกลางทาง
+        writes.append(offset)
+        return real_pwrite(fd, data, offset)
+
+    monkeypatch.setattr(migrate.os, 'pwrite', crash_after_three)
+    with pytest.raises(KeyboardInterrupt):
+        migrate.migrate_file(filename, source, 0, target, chunk_size=5 * target.size)
+    monkeypatch.undo()
+    assert os.path.exists(migrate.journal_filename(filename))
+
+    assert migrate.migrate('test2', str(tmp_path), chunk_size=5 * target.size) == 2
+    assert not os.path.exists(migrate.journal_filename(filename))
+    service = LibraryService(str(tmp_path))
+    assert [book.title for book in service.list_books()] == [f'Legacy book {i}' for i in range(1, 41)]
+    service.close()
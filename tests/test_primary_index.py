@@ -0,0 +1,60 @@
+import random
+import struct
+
+from indexes import PrimaryIndex
+from record_store import RecordStore
+
+RECORD = struct.Struct('<I4s')
+
+
+def _open(tmp_path):
+    filename = tmp_path / 'data.dat'
+    if not filename.exists():
+        filename.write_bytes(b'')
+    data = RecordStore(str(filename), RECORD.size)
+    return data, PrimaryIndex(str(tmp_path / 'data.idx'), data, 'I')
+
+
+def _append(data, index, key):
+    record_index = data.append(RECORD.pack(key, b'rec_'))
+    index.add(key, record_index)
+    return record_index
+
+
+def test_out_of_order_ids_go_to_overflow_without_rewriting(tmp_path):
+    data, index = _open(tmp_path)
+    for key in (1, 2, 3, 10, 11):
+        _append(data, index, key)
+    sorted_part = (tmp_path / 'data.idx').read_bytes()[index.HEADER.size:]
+
+    # terminal อื่นจองช่วง 4-9 ไว้แต่เขียนทีหลัง
+    for key in (4, 12, 5):
+        _append(data, index, key)
+    assert (tmp_path / 'data.idx').read_bytes()[index.HEADER.size:].startswith(sorted_part)
+    assert [index.lookup(key) for key in (1, 4, 5, 10, 12, 6)] == [0, 5, 7, 3, 6, -1]
+    assert index.lookup_many([12, 1, 5, 99]) == {12: 6, 1: 0, 5: 7}
+
+    # อีก instance (เช่นอีก process) โหลดส่วน overflow จากไฟล์ได้เหมือนกัน
+    other_data, other = _open(tmp_path)
+    assert [other.lookup(key) for key in (4, 5, 12)] == [5, 7, 6]
+    other.close()
+    other_data.close()
+    index.close()
+    data.close()
+
+
+def test_overflow_merges_back_into_sorted_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(PrimaryIndex, 'OVERFLOW_ENTRIES', 16)
+    data, index = _open(tmp_path)
+    keys = random.Random(11).sample(range(1, 10000), 200)
+    positions = {key: _append(data, index, key) for key in keys}
+
+    assert len(index._overflow) < 16
+    assert all(index.lookup(key) == position for key, position in positions.items())
+    assert index.lookup_many(keys[:50] + [0]) == {key: positions[key] for key in keys[:50]}
+
+    assert index.rebuild() == 200
+    assert index._overflow == {} and index._sorted_count == 200
+    assert all(index.lookup(key) == position for key, position in positions.items())
+    index.close()
+    data.close()
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+import locks
+from file_format import HEADER_SIZE
+from record_store import RecordStore
+
+SIZE = 8
+
+
+def _record(i: int) -> bytes:
+    return b'%08d' % i
+
+
+def _store(tmp_path, count: int = 0, header_size: int = 0) -> RecordStore:
+    filename = tmp_path / 'data.dat'
+    filename.write_bytes(b'H' * header_size + b''.join(_record(i) for i in range(count)))
+    return RecordStore(str(filename), SIZE, header_size)
+
+
+def test_scan_sees_records_appended_by_this_store(tmp_path):
+    store = _store(tmp_path, 2, HEADER_SIZE)
+    assert len(list(store.scan())) == 2
+    store.append(_record(2))
+    assert [bytes(data) for data in store] == [_record(i) for i in range(3)]
+    store.close()
+
+
+def test_scan_sees_records_appended_by_another_writer(tmp_path):
+    store = _store(tmp_path, 1)
+    assert len(list(store.chunks())) == 1
+    with open(store.filename, 'ab') as f:   # เหมือน process อื่นต่อท้ายไฟล์
+        f.write(_record(1) + _record(2))
+    chunks = list(store.chunks())
+    assert [(first, bytes(chunk)) for first, chunk in chunks] == [(0, _record(0) + _record(1) + _record(2))]
+    store.close()
+
+
+def test_project_sees_appended_records(tmp_path):
+    store = _store(tmp_path)
+    assert list(store.project([7])) == []
+    store.append(_record(1))
+    store.append(_record(2))
+    (first, (column,)), = store.project([7])
+    assert first == 0 and bytes(column) == b'12'
+    store.close()
+
+
+@pytest.mark.skipif(not locks._OFD, reason="ต้องใช้ open file description lock (Linux)")
+def test_record_lock_survives_remap_and_blocks_other_opens(tmp_path):
+    store = _store(tmp_path, 3)
+    other = RecordStore(store.filename, SIZE)   # เปิดแยก = เหมือนอีก process สำหรับ OFD lock
+    acquired = threading.Event()
+
+    def lock_record(index):
+        with other.locks.records([index]):
+            acquired.set()
+
+    with store.locks.records([1]):
+        # ต่อท้ายจน mmap ถูก remap (mmap เดิมถูกปิด) ล็อกต้องยังอยู่
+        store.append(b''.join(_record(i) for i in range(3, 5000)))
+        threading.Thread(target=lock_record, args=(2,)).start()
+        assert acquired.wait(5)           # คนละ record ไม่ต้องรอ
+        acquired.clear()
+        waiter = threading.Thread(target=lock_record, args=(1,))
+        waiter.start()
+        assert not acquired.wait(0.2)     # record เดียวกันต้องรอ
+    waiter.join(5)
+    assert acquired.is_set()
+    other.close()
+    store.close()
@@ -0,0 +1,31 @@
+import pytest
+
+import report_analytics
+from report import LibrarySystem
+
+pytest.importorskip('numpy')
+
+
+def _report(system: LibrarySystem) -> str:
+    system.generate_summary_report()
+    with open(system.report_file, encoding='utf-8') as f:
+        return ''.join(line for line in f if not line.startswith('Generated At'))
+
+
+def test_report_is_the_same_with_and_without_numpy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    system = LibrarySystem()
+    system.add_sample_data()
+    codec = system.book_codec
+    with open(system.books_file, 'ab') as f:
+        for i in range(300):
+            f.write(codec.pack(2000 + i, system._encode(f'978-1-{i:06d}', 13),
+                               system._encode(f'หนังสือ {i}', 50), system._encode('ผู้แต่ง', 30),
+                               b'2024', system._encode(['นิยาย', 'Fiction', 'สารคดี'][i % 3], 20),
+                               b'1', b'1' if i % 2 else b'0', b'1' if i % 7 == 0 else b'0'))
+
+    with_numpy = _report(system)
+    with monkeypatch.context() as m:
+        m.setattr(report_analytics, 'np', None)
+        assert _report(system) == with_numpy
+    assert 'สารคดี' in with_numpy
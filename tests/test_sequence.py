@@ -0,0 +1,69 @@
+import multiprocessing
+import struct
+import sys
+
+import pytest
+
+from record_store import RecordStore
+from sequence import IdSequence
+
+RECORD = struct.Struct('<I4s')
+
+
+def _sequence(tmp_path, block: int = IdSequence.BLOCK):
+    filename = tmp_path / 'data.dat'
+    filename.touch()
+    data = RecordStore(str(filename), RECORD.size)
+    return data, IdSequence(str(tmp_path / 'data.seq'), data, 'I', block=block)
+
+
+def _reserve_many(tmp_path, results):
+    data, sequence = _sequence(tmp_path, block=8)
+    ids = []
+    for i in range(200):
+        count = 1 + i % 3
+        first = sequence.reserve(count)
+        ids.extend(range(first, first + count))
+    sequence.release()
+    data.close()
+    results.put(ids)
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="ต้องใช้ flock ระหว่าง process")
+def test_processes_never_receive_the_same_id(tmp_path):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=_reserve_many, args=(tmp_path, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    ids = [i for _ in workers for i in results.get(timeout=30)]
+    for worker in workers:
+        worker.join(30)
+
+    assert len(ids) == len(set(ids)) == 4 * sum(1 + i % 3 for i in range(200))
+    # หลังทุก process คืนก้อนที่เหลือ ID ถัดไปต้องไม่ซ้ำกับที่แจกไปแล้ว
+    data, sequence = _sequence(tmp_path)
+    assert sequence.reserve() > max(ids)
+    data.close()
+
+
+def test_single_terminal_gets_contiguous_ids_across_reopen(tmp_path):
+    data, sequence = _sequence(tmp_path, block=4)
+    assert [sequence.next_id() for _ in range(6)] == [1, 2, 3, 4, 5, 6]
+    assert sequence.reserve(10) == 7
+    sequence.release()
+    data.close()
+
+    data, reopened = _sequence(tmp_path, block=4)
+    assert reopened.next_id() == 17
+    data.close()
+
+
+def test_missing_sequence_file_restarts_after_highest_stored_id(tmp_path):
+    data, sequence = _sequence(tmp_path)
+    for key in (5, 42, 7):
+        data.append(RECORD.pack(key, b'rec_'))
+    assert sequence.reserve(2, limit=50) == 43
+    with pytest.raises(OverflowError):
+        sequence.reserve(60, limit=100)
+    data.close()
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from indexes import TextIndex
+from library_service import LibraryService
+from postings import BLOCK, PostingList, Segment, build_segment, encode_postings
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = LibraryService(str(tmp_path))
+    yield service
+    service.close()
+
+
+def brute_force(service, keyword):
+    return {book.id for book in service.list_books()
+            if keyword in book.title.lower() or keyword in book.author.lower()}
+
+
+def test_title_matches_rank_before_author_matches(service):
+    service.add_book('Cooking at home', 'Python Jones', '2000')
+    service.add_book('Learning Python', 'Someone', '2001')
+    service.add_book('Pythonic recipes', 'Other', '2002')
+
+    assert [book.id for book in service.search_books('python')] == ['002', '001', '003']
+    assert service.search_books('jav') == []
+
+
+def test_search_follows_update_and_delete(tmp_path, service):
+    service.add_book('Unique Zebra Title', 'Author', '2000')
+    service.update_book('001', 'Other Name', '', '')
+    assert service.search_books('zebra') == []
+    assert [book.id for book in service.search_books('other name')] == ['001']
+
+    # อีก instance (เช่นอีก terminal) เห็นการเปลี่ยนแปลงผ่าน journal
+    other = LibraryService(str(tmp_path))
+    other.add_book('Zebra again', 'Author', '2001')
+    other.close()
+    assert [book.title for book in service.search_books('zebra')] == ['Zebra again']
+
+    service.delete_book('001')
+    assert service.search_books('other name') == []
+
+
+def test_journal_merges_into_segment(tmp_path, service, monkeypatch):
+    monkeypatch.setattr(TextIndex, 'MERGE_ENTRIES', 200)
+    words = ['alpha', 'beta', 'gamma', 'delta', 'omega']
+    rng = random.Random(7)
+    for i in range(60):
+        service.add_book(f'{rng.choice(words)} {rng.choice(words)} {i}', rng.choice(words), '2000')
+    for i in range(1, 61, 3):
+        service.update_book(f'{i:03d}', f'{rng.choice(words)} renamed', '', '')
+    for i in range(2, 61, 7):
+        service.delete_book(f'{i:03d}')
+    assert service.text_index._entry_count < 200
+
+    for keyword in words + ['renamed', 'ta ', 'mega']:
+        assert {book.id for book in service.search_books(keyword)} == brute_force(service, keyword.strip())
+
+    # เปิดใหม่จาก segment + journal ที่อยู่บนดิสก์ได้ผลเดียวกัน
+    reopened = LibraryService(str(tmp_path))
+    for keyword in words + ['renamed']:
+        assert {book.id for book in reopened.search_books(keyword)} == brute_force(service, keyword)
+    reopened.close()
+
+
+def test_build_merges_runs_in_term_order(tmp_path):
+    rng = random.Random(3)
+    terms = [f'{i:02d}'.encode().ljust(4, b'\x00') for i in range(20)]
+    documents = [(index, set(rng.sample(terms, 5))) for index in range(0, 3000, 2)]
+    filename = str(tmp_path / 'text.seg')
+    build_segment(filename, 4, documents, run_postings=500)
+
+    segment = Segment(filename, 4)
+    for term in terms:
+        expected = [index for index, found in documents if term in found]
+        assert segment.find(term).values() == expected
+    assert segment.find(b'zz\x00\x00') is None
+    segment.close()
+    assert [path.name for path in tmp_path.iterdir()] == ['text.seg']
+
+
+def test_posting_list_intersect_skips_blocks():
+    values = list(range(0, 10 * BLOCK, 3)) + [1 << 31, (1 << 32) - 1]
+    region, blocks = encode_postings(values)
+    postings = PostingList(memoryview(region), len(values), blocks)
+    assert postings.values() == values
+
+    candidates = [-1, 2, 3, 300, 301, 3 * BLOCK, 1 << 31, (1 << 32) - 1]
+    assert postings.intersect(candidates) == [3, 300, 3 * BLOCK, 1 << 31, (1 << 32) - 1]
+    assert postings.intersect([]) == []
@@ -0,0 +1,74 @@
+import threading
+
+from library_service import LibraryService
+from record_store import RecordStore
+from wal import WriteAheadLog
+
+SIZE = 8
+
+
+def _store(tmp_path) -> RecordStore:
+    filename = tmp_path / 'data.dat'
+    filename.touch()
+    return RecordStore(str(filename), SIZE)
+
+
+def test_reopen_replays_transactions_that_never_reached_the_data_file(tmp_path, monkeypatch):
+    service = LibraryService(str(tmp_path))
+    service.add_book('Before crash', 'Author', '2000')
+    # เหมือนโปรแกรมหยุดหลัง WAL ถูก fsync แต่ก่อนเขียนลงไฟล์ข้อมูล (ไม่ได้ close)
+    monkeypatch.setattr(service.books, 'write', lambda index, data: None)
+    service.add_book('Lost in crash', 'Author', '2001')
+    monkeypatch.undo()
+    assert len(service.books) == 1
+
+    reopened = LibraryService(str(tmp_path))
+    assert reopened.recovered >= 1
+    assert [book.title for book in reopened.list_books()] == ['Before crash', 'Lost in crash']
+    assert [book.id for book in reopened.search_books('crash')] == ['001', '002']
+    stored, actual = reopened.verify_stats(repair=False)
+    assert stored == actual and stored.total_books == 2
+    reopened.close()
+    service.close()
+
+
+def test_replay_drops_a_torn_last_entry(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    wal = WriteAheadLog(str(tmp_path / 'data.wal'), [store])
+    monkeypatch.setattr(store, 'write', lambda index, data: None)
+    with wal.transaction() as txn:
+        txn.append(store, b'record_0' + b'record_1')
+    monkeypatch.undo()
+    with open(wal.filename, 'ab') as f:
+        f.write(b'\x40\x00\x00\x00torn')   # entry ที่เขียนไม่ครบตอนไฟดับ
+
+    other = RecordStore(store.filename, SIZE)
+    replayed = WriteAheadLog(wal.filename, [other])
+    assert replayed.replay() == 1
+    assert [bytes(record) for record in other] == [b'record_0', b'record_1']
+    replayed.close()
+    other.close()
+    store.close()
+
+
+def test_concurrent_commits_share_fsyncs(tmp_path):
+    store = _store(tmp_path)
+    wal = WriteAheadLog(str(tmp_path / 'data.wal'), [store], group_delay=0.005)
+    threads, per_thread = 8, 20
+
+    def writer(n):
+        for i in range(per_thread):
+            with wal.transaction() as txn:
+                txn.append(store, b'%02d-%05d' % (n, i))
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    records = sorted(bytes(record) for record in store)
+    assert records == sorted(b'%02d-%05d' % (n, i) for n in range(threads) for i in range(per_thread))
+    assert wal.fsync_count < threads * per_thread
+    wal.close()
+    store.close()
@@ -0,0 +1,338 @@
+import os
+import struct
+import threading
+import zlib
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from record_store import RecordStore
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows ไม่มี fcntl: ใช้ WAL ได้เฉพาะ process เดียว
+    fcntl = None
+
+
+class Transaction:
+    """ชุดการเขียนที่ลง WAL เป็น entry เดียว (ลงทั้งหมดหรือไม่ลงเลย)
+
+    การเขียนจะถูกพักไว้จนกว่า commit แล้วจึงเขียนลงไฟล์ข้อมูลจริง
+    ระหว่าง transaction การอ่านจากไฟล์ข้อมูลจึงยังเห็นข้อมูลเดิม
+    ตำแหน่งของ record ที่ต่อท้าย (append) จะรู้หลัง commit ผ่าน first_index()
+    """
+
+    def __init__(self, wal: 'WriteAheadLog'):
+        self.wal = wal
+        self.writes: List[Tuple[RecordStore, Optional[int], bytes]] = []
+        self.counters: List[Tuple[RecordStore, int, Tuple[int, ...]]] = []
+        self._first: Dict[int, int] = {}  # id(store) -> index ของ record แรกที่ต่อท้ายใน transaction นี้
+
+    def write(self, store: RecordStore, index: int, data: bytes):
+        """เขียนทับ record ที่ index (data อาจยาวหลาย record ติดกัน)"""
+        self.writes.append((store, index, bytes(data)))
+
+    def append(self, store: RecordStore, data: bytes):
+        """ต่อท้าย record ใหม่ (record ที่ต่อท้ายไฟล์เดียวกันใน transaction เดียวจะอยู่ติดกัน)"""
+        self.writes.append((store, None, bytes(data)))
+
+    def add(self, store: RecordStore, index: int, deltas: Sequence[int]):
+        """บวกตัวนับที่ index ด้วย deltas (record ของตัวนับคือ int64 เรียงกัน len(deltas) ตัว)
+
+        ค่าใหม่ถูกคำนวณตอน commit จึงไม่ทับกับ transaction อื่นที่ commit พร้อมกัน
+        """
+        self.counters.append((store, index, tuple(deltas)))
+
+    def first_index(self, store: RecordStore) -> int:
+        """index ของ record แรกที่ transaction นี้ต่อท้าย store (ใช้ได้หลัง commit)"""
+        return self._first[id(store)]
+
+    def __enter__(self) -> 'Transaction':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.wal.commit(self)
+
+
+class WriteAheadLog:
+    """Write-ahead log ที่ใช้ร่วมกันของไฟล์ข้อมูลทุกไฟล์ (library.wal)
+
+    ทุก transaction ถูกต่อท้าย WAL ก่อน แล้วรอ fsync ของ WAL จึงเขียนลงไฟล์ข้อมูล
+    (ไม่ fsync ไฟล์ข้อมูลทุกครั้ง) transaction ที่ commit พร้อมกันหลาย thread
+    จะรอ fsync ครั้งเดียวกัน (group commit)
+    เมื่อ WAL ใหญ่เกิน checkpoint_size จะ fsync ไฟล์ข้อมูลแล้วล้าง WAL
+    ตอนเปิดโปรแกรม replay() จะเขียน transaction ที่สมบูรณ์ใน WAL ลงไฟล์ข้อมูลซ้ำ
+
+    หลาย process ใช้ WAL เดียวกันได้: ระหว่างมี transaction ค้างจะถือ flock แบบ shared
+    ส่วน checkpoint/replay ต้องได้ flock แบบ exclusive (รอจน process อื่นเขียนเสร็จ)
+    transaction ที่ต่อท้าย record จะถือล็อกการต่อท้ายของไฟล์นั้นจนเขียนลงไฟล์ข้อมูลเสร็จ
+    """
+
+    MAGIC = b'WAL_'
+    VERSION = 1
+    HEADER = struct.Struct('<4sH')     # Magic + Version
+    ENTRY = struct.Struct('<II')       # ความยาว payload + CRC32 ของ payload
+    OP = struct.Struct('<BQI')         # ลำดับไฟล์ + index ของ record + ความยาวข้อมูล
+
+    def __init__(self, filename: str, stores: Sequence[RecordStore],
+                 checkpoint_size: int = 1 << 20, group_delay: float = 0.0):
+        self.filename = filename
+        self.stores = list(stores)
+        self.checkpoint_size = checkpoint_size
+        self.group_delay = group_delay  # เวลารอให้ transaction อื่นเข้ากลุ่มก่อน fsync (วินาที)
+        self.fsync_count = 0
+
+        self._fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        if metrics.enabled:
+            metrics.count(files_opened=1)
+        if os.fstat(self._fd).st_size < self.HEADER.size:
+            os.ftruncate(self._fd, 0)
+            os.write(self._fd, self.HEADER.pack(self.MAGIC, self.VERSION))
+            os.fsync(self._fd)
+
+        self._cond = threading.Condition()
+        self._written = 0     # จำนวน transaction ที่ต่อท้าย WAL แล้ว
+        self._durable = 0     # จำนวน transaction ที่ fsync แล้ว
+        self._pending = 0     # transaction ที่อยู่ใน WAL แต่ยังเขียนลงไฟล์ข้อมูลไม่เสร็จ
+        self._tails: Dict[int, int] = {}  # id(store) -> จำนวน record รวมที่ลง WAL แล้ว
+        # (id(store), index) -> (ค่าล่าสุดของตัวนับ, จำนวน transaction ที่ยังเขียนลงไฟล์ไม่เสร็จ)
+        self._counters: Dict[Tuple[int, int], Tuple[Tuple[int, ...], int]] = {}
+        self._flushing = False
+
+    # ---------- ล็อกระหว่าง process ----------
+
+    def _lock_shared(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+
+    def _lock_exclusive(self, blocking: bool = True) -> bool:
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # ---------- เข้ารหัส ----------
+
+    def _encode(self, txn: Transaction) -> bytes:
+        parts = []
+        for store, index, data in txn.writes:
+            parts.append(self.OP.pack(self.stores.index(store), index, len(data)))
+            parts.append(data)
+        payload = b''.join(parts)
+        return self.ENTRY.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def _decode(self, payload: bytes) -> List[Tuple[RecordStore, int, bytes]]:
+        writes = []
+        position = 0
+        while position < len(payload):
+            store_no, index, length = self.OP.unpack_from(payload, position)
+            position += self.OP.size
+            writes.append((self.stores[store_no], index, payload[position:position + length]))
+            position += length
+        return writes
+
+    # ---------- Transaction ----------
+
+    def transaction(self) -> Transaction:
+        """เริ่ม transaction ใหม่ (ใช้กับ with แล้วจะ commit เองเมื่อจบ block)"""
+        return Transaction(self)
+
+    def write(self, store: RecordStore, index: int, data: bytes):
+        """เขียนทับ record เดียวเป็นหนึ่ง transaction"""
+        with self.transaction() as txn:
+            txn.write(store, index, data)
+
+    def append(self, store: RecordStore, data: bytes) -> int:
+        """ต่อท้าย record เป็นหนึ่ง transaction คืนค่า index ของ record"""
+        with self.transaction() as txn:
+            txn.append(store, data)
+        return txn.first_index(store)
+
+    def _resolve_appends(self, txn: Transaction):
+        """กำหนดตำแหน่งจริงของ record ที่ต่อท้าย (เรียกขณะถือ lock)
+
+        นับรวม record ที่ลง WAL แล้วแต่ยังไม่ได้เขียนลงไฟล์ข้อมูล
+        transaction ที่ commit พร้อมกันจึงไม่ได้ตำแหน่งซ้ำกัน
+        """
+        for i, (store, index, data) in enumerate(txn.writes):
+            if index is not None:
+                continue
+            key = id(store)
+            index = max(len(store), self._tails.get(key, 0))
+            self._tails[key] = index + len(data) // store.record_size
+            txn._first.setdefault(key, index)
+            txn.writes[i] = (store, index, data)
+
+    def _resolve_counters(self, txn: Transaction):
+        """แปลง deltas ของตัวนับเป็นค่าใหม่ที่เขียนทับได้ (เรียกขณะถือ lock)
+
+        ตั้งต้นจากค่าที่ transaction ก่อนหน้าใน process นี้กำหนดไว้ (อาจยังไม่ลงไฟล์)
+        ถ้าไม่มีจึงอ่านจากไฟล์ process อื่นแก้ไฟล์ไม่ได้ระหว่างนี้เพราะ commit ถือล็อกของไฟล์ตัวนับไว้
+        WAL เก็บค่าใหม่ (ไม่ใช่ deltas) การ replay ซ้ำจึงได้ค่าเดิม
+        """
+        for store, index, deltas in txn.counters:
+            key = (id(store), index)
+            counter = struct.Struct(f'<{len(deltas)}q')
+            if key in self._counters:
+                values, users = self._counters[key]
+            else:
+                data = store.get(index)
+                values, users = (counter.unpack(data) if data is not None else (0,) * len(deltas)), 0
+            values = tuple(value + delta for value, delta in zip(values, deltas))
+            self._counters[key] = (values, users + 1)
+            txn.writes.append((store, index, counter.pack(*values)))
+
+    def _release_counters(self, txn: Transaction):
+        """เขียนตัวนับลงไฟล์ข้อมูลแล้วลืมค่าที่ทุก transaction เขียนแล้ว (เรียกขณะถือ lock)
+
+        เขียนค่าล่าสุดของตัวนับเสมอ (ไม่ใช่ค่าของ transaction นี้) เพราะ thread ที่ fsync
+        พร้อมกันอาจมาถึงไม่ตรงลำดับ ถ้าเขียนค่าของตัวเองค่าที่เก่ากว่าอาจทับค่าใหม่
+        """
+        for store, index, deltas in txn.counters:
+            key = (id(store), index)
+            values, users = self._counters[key]
+            store.write(index, struct.pack(f'<{len(deltas)}q', *values))
+            if users == 1:
+                del self._counters[key]
+            else:
+                self._counters[key] = (values, users - 1)
+
+    @metrics.operation()
+    def commit(self, txn: Transaction):
+        """ลง WAL, รอ fsync (ร่วมกับ transaction อื่น) แล้วเขียนลงไฟล์ข้อมูล"""
+        if not txn.writes and not txn.counters:
+            return
+
+        with ExitStack() as stack:
+            # ถือล็อกการต่อท้าย (และล็อกของไฟล์ตัวนับ) ตั้งแต่กำหนดตำแหน่ง/ค่าจนเขียนลงไฟล์ข้อมูลเสร็จ
+            # (เรียงตามลำดับไฟล์)
+            for store in self.stores:
+                if (any(s is store and index is None for s, index, _ in txn.writes)
+                        or any(s is store for s, _, _ in txn.counters)):
+                    stack.enter_context(store.locks.append())
+
+            with self._cond:
+                if self._pending == 0:
+                    self._lock_shared()
+                self._resolve_appends(txn)
+                self._resolve_counters(txn)
+                entry = self._encode(txn)
+                os.write(self._fd, entry)
+                if metrics.enabled:
+                    metrics.count(bytes_written=len(entry))
+                self._written += 1
+                self._pending += 1
+                sequence = self._written
+
+            self._wait_durable(sequence)
+
+            # ตัวนับ (ต่อท้าย txn.writes) เขียนใน _release_counters แทน
+            for store, index, data in txn.writes[:len(txn.writes) - len(txn.counters)]:
+                store.write(index, data)
+
+            with self._cond:
+                self._release_counters(txn)
+                self._pending -= 1
+                self._cond.notify_all()
+                if self._pending == 0:
+                    self._tails.clear()  # ทุกอย่างลงไฟล์ข้อมูลแล้ว ใช้ขนาดไฟล์จริงได้
+                    if (os.fstat(self._fd).st_size > self.checkpoint_size
+                            and self._lock_exclusive(blocking=False)):
+                        self._checkpoint()
+                    self._unlock()
+
+    @metrics.operation()
+    def _wait_durable(self, sequence: int):
+        """รอจน transaction ที่ sequence ถูก fsync แล้ว
+
+        thread แรกที่รอจะเป็นผู้ fsync ให้ทุก transaction ที่ต่อท้ายไว้แล้ว
+        thread ที่มาระหว่าง fsync จะรอรอบถัดไปซึ่ง fsync ครั้งเดียวให้ทั้งกลุ่ม
+        """
+        with self._cond:
+            while self._durable < sequence:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+
+                self._flushing = True
+                if self.group_delay:
+                    self._cond.wait(self.group_delay)
+                target = self._written
+                self._cond.release()
+                try:
+                    os.fsync(self._fd)
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                self._durable = max(self._durable, target)
+                self.fsync_count += 1
+                self._cond.notify_all()
+
+    # ---------- Checkpoint / Replay ----------
+
+    def _checkpoint(self):
+        for store in self.stores:
+            store.sync()
+        os.ftruncate(self._fd, self.HEADER.size)
+        os.fsync(self._fd)
+
+    @metrics.operation()
+    def checkpoint(self):
+        """fsync ไฟล์ข้อมูลทั้งหมดแล้วล้าง WAL (ต้องทำก่อนจัดเรียงไฟล์ข้อมูลใหม่)"""
+        with self._cond:
+            while self._pending:
+                self._cond.wait()
+            self._lock_exclusive()
+            try:
+                self._checkpoint()
+            finally:
+                self._unlock()
+
+    @metrics.operation()
+    def replay(self) -> int:
+        """เขียน transaction ที่สมบูรณ์ใน WAL ลงไฟล์ข้อมูลซ้ำ คืนค่าจำนวน transaction
+
+        entry ท้ายไฟล์ที่เขียนไม่ครบหรือ checksum ไม่ตรงถือว่ายังไม่ commit และถูกทิ้ง
+        """
+        self._lock_exclusive()
+        try:
+            return self._replay()
+        finally:
+            self._unlock()
+
+    def _replay(self) -> int:
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        if metrics.enabled:
+            metrics.count(files_opened=1, bytes_read=len(data))
+        if data[:self.HEADER.size] != self.HEADER.pack(self.MAGIC, self.VERSION):
+            return 0
+
+        count = 0
+        position = self.HEADER.size
+        while position + self.ENTRY.size <= len(data):
+            length, crc = self.ENTRY.unpack_from(data, position)
+            start = position + self.ENTRY.size
+            payload = data[start:start + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            for store, index, record in self._decode(payload):
+                store.write(index, record)
+            count += 1
+            position = start + length
+
+        with self._cond:
+            self._checkpoint()
+        return count
+
+    def close(self):
+        self.checkpoint()
+        os.close(self._fd)